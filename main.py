@@ -4,10 +4,11 @@ import sys
 import argparse
 import antlr4
 from pathlib import Path
-from typing import List, Callable, Optional
+from typing import Optional
 from dataclasses import dataclass
 
 from mxc.backend.asm_builder import ASMBuilder
+from mxc.backend.linear_scan import linear_scan_allocation
 from mxc.frontend.parser.MxLexer import MxLexer
 from mxc.frontend.parser.MxParser import MxParser
 from mxc.frontend.semantic.syntax_checker import SyntaxChecker
@@ -18,11 +19,22 @@ from mxc.middle_end.gvn_pre import gvn_pre
 from mxc.middle_end.mem2reg import mem2reg
 from mxc.middle_end.mir import mir_builder
 from mxc.middle_end.liveness_analysis import liveness_analysis
-from mxc.middle_end.dce import naive_dce
+from mxc.middle_end.dce import naive_dce, aggressive_dce
 from mxc.middle_end.globalvar import inline_global_variables
-from mxc.middle_end.cfg_transform import remove_unreachable, copy_propagation, remove_critical_edge
+from mxc.middle_end.cfg_transform import remove_unreachable, copy_propagation, remove_critical_edge, jump_threading, \
+    simplify_cfg
 from mxc.middle_end.sccp import sparse_conditional_constant_propagation
+from mxc.middle_end.purity import infer_function_effects
+from mxc.middle_end.memoize import memoize_pure_functions
+from mxc.middle_end.global_dce import global_dead_code_elimination
+from mxc.middle_end.sra import scalar_replacement_of_aggregates
+from mxc.middle_end.memory_opt import memory_access_elimination
+from mxc.middle_end.licm import loop_invariant_code_motion
+from mxc.middle_end.tail_recursion import accumulator_introduction
 from mxc.middle_end.utils import rearrange_in_rpo
+from mxc.middle_end.analysis import CFG_ANALYSES, INSTRUCTION_ANALYSES, ALL_ANALYSES, DEFS, TYPE_MAP, USES, \
+    BLOCK_INDEX, CFG, DOMINATOR_TREE, POST_DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED, DEF_SITES
+from mxc.middle_end.pass_manager import OptimizationPass, PassManager
 
 @dataclass
 class CompilerOptions:
@@ -35,70 +47,124 @@ class CompilerOptions:
     syntax_only: bool
     emit_llvm: bool
     judge_mode: bool
-
-
-class OptimizationPass:
-    def __init__(self, func: Callable, name: str, scope: str = "function"):
-        self.func = func
-        self.name = name
-        self.scope = scope  # "function", "block", or "module"
-
-    def apply(self, ir: IRModule):
-        if self.scope == "function":
-            ir.for_each_function_definition(self.func)
-        elif self.scope == "block":
-            ir.for_each_block(self.func)
-        else:
-            self.func(ir)
+    time_passes: bool
+    memoize: bool
 
 
 # Predefined optimization sequences
+# Each pass declares the analyses it requires and the analyses that are still valid after it has run
 OPTIMIZATION_PRESETS = {
     "O0": [
-        OptimizationPass(naive_dce, "Dead Code Elimination (initial)"),
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)"),
-        OptimizationPass(rearrange_in_rpo, "Reverse Post-Order Block Rearrangement"),
+        OptimizationPass(naive_dce, "Dead Code Elimination (initial)", preserves=CFG_ANALYSES),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)", preserves=CFG_ANALYSES),
+        OptimizationPass(rearrange_in_rpo, "Reverse Post-Order Block Rearrangement",
+                         requires=[BLOCK_INDEX], preserves=INSTRUCTION_ANALYSES),
         OptimizationPass(mir_builder, "MIR Construction"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post MIR)"),
-        OptimizationPass(liveness_analysis, "Liveness Analysis"),
+        OptimizationPass(naive_dce, "Dead Code Elimination (post MIR)", preserves=CFG_ANALYSES),
+        OptimizationPass(liveness_analysis, "Liveness Analysis",
+                         requires=[BLOCK_INDEX, USES], preserves=ALL_ANALYSES),
     ], # These optimizations are mandatory because the backend relies on them
     "O1": [
-        OptimizationPass(naive_dce, "Dead Code Elimination (initial)"),
-        OptimizationPass(inline_global_variables, "Global Variable Inlining"),
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)"),
-        OptimizationPass(rearrange_in_rpo, "Reverse Post-Order Block Rearrangement"),
+        OptimizationPass(naive_dce, "Dead Code Elimination (initial)", preserves=CFG_ANALYSES),
+        OptimizationPass(inline_global_variables, "Global Variable Inlining", "module", preserves=CFG_ANALYSES),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(scalar_replacement_of_aggregates, "Scalar Replacement of Aggregates",
+                         preserves=CFG_ANALYSES),
+        OptimizationPass(infer_function_effects, "Interprocedural Side Effect Inference", "module",
+                         preserves=ALL_ANALYSES),
+        OptimizationPass(memory_access_elimination, "Redundant Load and Dead Store Elimination",
+                         requires=[DOMINATOR_TREE, POST_DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED],
+                         preserves=CFG_ANALYSES),
+        OptimizationPass(loop_invariant_code_motion, "Loop Invariant Code Motion"),
+        OptimizationPass(sparse_conditional_constant_propagation, "Sparse Conditional Constant Propagation",
+                         requires=[BLOCK_INDEX, DEFS, TYPE_MAP, USES], preserves=CFG_ANALYSES),
+        OptimizationPass(remove_unreachable, "Remove Unreachable Blocks"),
+        OptimizationPass(aggressive_dce, "Aggressive Dead Code Elimination (post SCCP)",
+                         requires=[DEF_SITES, POST_DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(jump_threading, "Jump Threading"),
+        OptimizationPass(simplify_cfg, "Control Flow Graph Simplification"),
+        OptimizationPass(accumulator_introduction, "Accumulator Introduction", "module"),
+        OptimizationPass(global_dead_code_elimination, "Global Dead Code Elimination", "module",
+                         preserves=CFG_ANALYSES),
+        OptimizationPass(rearrange_in_rpo, "Reverse Post-Order Block Rearrangement",
+                         requires=[BLOCK_INDEX], preserves=INSTRUCTION_ANALYSES),
+        OptimizationPass(mir_builder, "MIR Construction"),
+        OptimizationPass(naive_dce, "Dead Code Elimination (post MIR)", preserves=CFG_ANALYSES),
+        OptimizationPass(liveness_analysis, "Liveness Analysis",
+                         requires=[BLOCK_INDEX, USES], preserves=ALL_ANALYSES),
+    ],
+    # O0 with a linear scan register allocator instead of the liveness analysis, for very large inputs
+    "fast": [
+        OptimizationPass(naive_dce, "Dead Code Elimination (initial)", preserves=CFG_ANALYSES),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)", preserves=CFG_ANALYSES),
+        OptimizationPass(rearrange_in_rpo, "Reverse Post-Order Block Rearrangement",
+                         requires=[BLOCK_INDEX], preserves=INSTRUCTION_ANALYSES),
         OptimizationPass(mir_builder, "MIR Construction"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post MIR)"),
-        OptimizationPass(liveness_analysis, "Liveness Analysis"),
+        OptimizationPass(naive_dce, "Dead Code Elimination (post MIR)", preserves=CFG_ANALYSES),
+        OptimizationPass(linear_scan_allocation, "Linear Scan Register Allocation",
+                         requires=[CFG], preserves=ALL_ANALYSES),
     ],
     # These presets are for debugging purposes and may not be compatible with the backend
     "ir_only": [],
     "mem2reg": [
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
     ],
     "unreachable": [
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
         OptimizationPass(remove_unreachable, "Remove Unreachable Blocks"),
     ],
     "sccp": [
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)"),
-        OptimizationPass(sparse_conditional_constant_propagation, "Sparse Conditional Constant Propagation"),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(aggressive_dce, "Aggressive Dead Code Elimination (post mem2reg)",
+                         requires=[DEF_SITES, POST_DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(sparse_conditional_constant_propagation, "Sparse Conditional Constant Propagation",
+                         requires=[BLOCK_INDEX, DEFS, TYPE_MAP, USES], preserves=CFG_ANALYSES),
         OptimizationPass(remove_unreachable, "Remove Unreachable Blocks"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post SCCP)"),
+        OptimizationPass(aggressive_dce, "Aggressive Dead Code Elimination (post SCCP)",
+                         requires=[DEF_SITES, POST_DOMINATOR_TREE], preserves=CFG_ANALYSES),
     ],
     "gvn_pre": [
-        OptimizationPass(mem2reg, "Memory-to-Register Promotion"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post mem2reg)"),
-        OptimizationPass(remove_critical_edge, "Remove Critical Edges"),
-        OptimizationPass(gvn_pre, "Global Value Numbering - Partial Redundancy Elimination"),
-        OptimizationPass(copy_propagation, "Copy Propagation"),
-        OptimizationPass(naive_dce, "Dead Code Elimination (post GVN)"),
+        OptimizationPass(mem2reg, "Memory-to-Register Promotion",
+                         requires=[DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(aggressive_dce, "Aggressive Dead Code Elimination (post mem2reg)",
+                         requires=[DEF_SITES, POST_DOMINATOR_TREE], preserves=CFG_ANALYSES),
+        OptimizationPass(remove_critical_edge, "Remove Critical Edges",
+                         preserves=[BLOCK_INDEX, DEFS, TYPE_MAP, DOMINATOR_TREE, POST_DOMINATOR_TREE]),
+        OptimizationPass(gvn_pre, "Global Value Numbering - Partial Redundancy Elimination",
+                         requires=[DOMINATOR_TREE, POST_DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED], preserves=CFG_ANALYSES),
+        OptimizationPass(copy_propagation, "Copy Propagation", preserves=CFG_ANALYSES),
+        OptimizationPass(aggressive_dce, "Aggressive Dead Code Elimination (post GVN)",
+                         requires=[DEF_SITES, POST_DOMINATOR_TREE], preserves=CFG_ANALYSES),
     ]
 }
 
+# Opt-in passes, inserted right after the pass they depend on
+OPTIONAL_PASSES = {
+    "memoize": (infer_function_effects,
+                OptimizationPass(memoize_pure_functions, "Memoization of Pure Recursive Functions", "module")),
+}
+
+
+def build_pass_list(options: CompilerOptions) -> list[OptimizationPass]:
+    passes = list(OPTIMIZATION_PRESETS[options.optimization_level])
+    for option, (dependency, opt_pass) in OPTIONAL_PASSES.items():
+        if not getattr(options, option):
+            continue
+        index = next((i for i, p in enumerate(passes) if p.func is dependency), None)
+        if index is None:
+            print(f"Warning: --{option} is ignored by -O {options.optimization_level}", file=sys.stderr)
+            continue
+        passes.insert(index + 1, opt_pass)
+    return passes
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Mx* Compiler")
@@ -115,6 +181,10 @@ def parse_args():
                         help='Emit LLVM IR after optimization passes')
     parser.add_argument('--judge-mode', action='store_true',
                         help='Run in online judge mode')
+    parser.add_argument('--time-passes', action='store_true',
+                        help='Report the time spent in each pass and analysis cache statistics')
+    parser.add_argument('--memoize', action='store_true',
+                        help='Memoize pure recursive functions with int parameters')
 
     args = parser.parse_args()
 
@@ -127,7 +197,9 @@ def parse_args():
         optimization_level=args.optimize,
         syntax_only=args.syntax_only,
         emit_llvm=args.emit_llvm,
-        judge_mode=args.judge_mode
+        judge_mode=args.judge_mode,
+        time_passes=args.time_passes,
+        memoize=args.memoize
     )
 
 
@@ -168,23 +240,26 @@ def compile(options: CompilerOptions):
         return 1
 
     # Optimizations
+    pass_manager = PassManager(build_pass_list(options))
     try:
+        callback = None
         if options.dump_ir:
             Path("dumps").mkdir(exist_ok=True)
             counter = 0
             with open(f"dumps/ir-{counter}-initial.ll", "w") as f:
                 print(ir.llvm(), file=f)
-        for opt_pass in OPTIMIZATION_PRESETS[options.optimization_level]:
-            print(f"Running {opt_pass.name}...", file=sys.stderr)
-            opt_pass.apply(ir)
 
             # Dump intermediate results if requested
-            if options.dump_ir:
-                # noinspection PyUnboundLocalVariable
+            def callback(opt_pass: OptimizationPass):
+                nonlocal counter
                 counter += 1
                 with open(f"dumps/ir-{counter}-after-{opt_pass.name}.ll", "w") as f:
                     print(ir.llvm(), file=f)
+
+        pass_manager.run(ir, callback)
         if options.emit_llvm:
+            if options.time_passes:
+                print(pass_manager.report(), file=sys.stderr)
             print(ir.llvm())
             return 0
     except Exception as e:
@@ -215,6 +290,9 @@ def compile(options: CompilerOptions):
         print(f"Assembly generation failed: {e}", file=sys.stderr)
         return 1
 
+    if options.time_passes:
+        # Analyses requested by the backend are included in the statistics
+        print(pass_manager.report(), file=sys.stderr)
     return 0
 
 
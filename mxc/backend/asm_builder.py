@@ -55,7 +55,9 @@ class ASMBuilder(ASMBuilderUtils):
     def build_function(self, ir_func: IRFunction) -> ASMFunction:
         name = ir_func.info.ir_name.lstrip("@")
         func = ASMFunction(name, ir_func)
-        allocation_table = allocate_registers(ir_func)
+        allocation_table = ir_func.allocation_table
+        if allocation_table is None:
+            allocation_table = allocate_registers(ir_func)
         self.allocation_table = allocation_table
         self.max_saved_reg = 0
         self.block_namer = BlockNamer(name)
@@ -103,12 +105,10 @@ class ASMBuilder(ASMBuilderUtils):
 
         callee_reg_sorted = list(self.callee_reg)
         callee_reg_sorted.sort()
-        func.stack_size += self.max_saved_reg * 4
+        save_register_offset = func.stack_size + self.max_saved_reg * 4
         save_register_from = [OperandReg(reg) for reg in callee_reg_sorted]
-        save_register_to = [OperandStack(func.stack_size + i * 4) for i in range(len(callee_reg_sorted))]
-        func.stack_size += len(callee_reg_sorted) * 4
-
-        func.stack_size = (func.stack_size + 15) // 16 * 16
+        save_register_to = [OperandStack(save_register_offset + i * 4) for i in range(len(callee_reg_sorted))]
+        func.stack_size = self.get_frame_size()
 
         if func.stack_size > 0:
             if func.stack_size <= 2048:
@@ -158,6 +158,11 @@ class ASMBuilder(ASMBuilderUtils):
                 if branch.true_dest.idx == 0:
                     asm_block.successors = [asm_block.successors[1], asm_block.successors[0]]
 
+    def get_frame_size(self) -> int:
+        """The final stack size of the current function, once the saved registers are known"""
+        size = self.current_function.stack_size + self.max_saved_reg * 4 + len(self.callee_reg) * 4
+        return (size + 15) // 16 * 16
+
     def build_block(self, ir_block: IRBlock) -> ASMBlock:
         block = ASMBlock(self.block_namer.get(), ir_block)
         for cmd in ir_block.cmds:
@@ -336,7 +341,11 @@ class ASMBuilder(ASMBuilderUtils):
 
                 param_count = len(cmd.func.param_types)
 
+                # stack arguments go to the incoming argument area, which is above the frame released before `tail`
                 param_to = [OperandReg("ra")] + self.prepare_params(param_count)
+                for to in param_to:
+                    if isinstance(to, OperandStack):
+                        to.offset += self.get_frame_size()
                 param_from = self.prepare_var_from(cmd.var_use)
                 block.add_cmd(*self.rearrange_operands(param_from, param_to, ("t0", "t1")))
 
@@ -7,6 +7,7 @@ from .asm_repr import ASMBlock, ASMMemOp, ASMCmdBase, ASMFunction
 from mxc.common.ir_repr import IRBlock, IRCall
 from mxc.middle_end.mem2reg import IRUndefinedValue
 from mxc.middle_end.mir import is_zero
+from mxc.middle_end.utils import reverse_post_order
 
 
 class BlockNamer:
@@ -50,20 +51,9 @@ class ASMBuilderUtils:
     @staticmethod
     def rearrange_blocks(blocks: list[ASMBlock]):
         """Rearrange blocks in reverse post order"""
-        header_block = blocks[0]
-        visited: set[str] = set()
-        result = []
-
-        def dfs(block: ASMBlock):
-            visited.add(block.label)
-            for succ in block.successors:
-                if succ.label not in visited:
-                    dfs(succ)
-            result.append(block)
-
-        dfs(header_block)
+        result = reverse_post_order(blocks[0], lambda block: block.successors)
         assert len(result) == len(blocks)
-        return result[::-1]
+        return result
 
     def save_registers(self, regs: list[str], start_offset: int) -> list[ASMMemOp]:
         self.max_saved_reg = max(self.max_saved_reg, len(regs))
@@ -170,12 +160,12 @@ class ASMBuilderUtils:
 
     @staticmethod
     def get_max_call_param(blocks: list[IRBlock]):
-        """Get the maximum number of parameters in a function call"""
+        """Get the maximum number of parameters in a function call, tail calls excluded"""
         return max(
             (len(cmd.func.param_types)
             for block in blocks
             for cmd in block.cmds
-            if isinstance(cmd, IRCall)
+            if isinstance(cmd, IRCall) and not cmd.tail_call
         ), default=0)
 
 
@@ -0,0 +1,132 @@
+"""Linear scan register allocation, for the fast compile mode.
+
+The instructions are numbered along the blocks in reverse post-order, and every variable gets a live interval
+from its definition to its last use, widened to the blocks it is live into or out of. Liveness is only computed
+per block, instead of per instruction as in `liveness_analysis`. The intervals are then allocated by increasing
+start, and when the registers run out, the interval ending last is spilled.
+
+An interval is never split, since the allocation table gives a single location to every variable.
+"""
+from bisect import insort
+from heapq import heappop, heappush
+
+from mxc.backend.regalloc import K, AllocationBase, AllocationRegister, AllocationStack
+from mxc.common.ir_repr import IRCall, IRFunction, IRPhi
+from mxc.middle_end.analysis import get_analysis, CFG
+
+
+def build_intervals(function: IRFunction) -> tuple[dict[str, list[int]], list[tuple[int, IRCall]]]:
+    """The live interval [start, end] of every variable, and the calls with their positions.
+    Phis are defined at the start of their block, and their operands are used at the end of the predecessors."""
+    blocks = function.blocks
+    order = [blocks[ind] for ind in reversed(get_analysis(function, CFG).postorder())]
+    reached = set(order)
+    order += [block for block in blocks if block not in reached]  # numbered last, to give every variable a range
+
+    block_start, block_end = [0] * len(blocks), [0] * len(blocks)
+    def_block: dict[str, int] = {}
+    intervals: dict[str, list[int]] = {}
+    for var in ["ret_addr"] + [param + ".param" for param in function.info.param_ir_names]:
+        def_block[var] = 0
+        intervals[var] = [-1, -1]
+    calls: list[tuple[int, IRCall]] = []
+    position = 0
+    for block in order:
+        block_start[block.index] = position
+        for cmd in block.cmds:
+            position += 1
+            for var in cmd.var_def:
+                def_block[var] = block.index
+                start = block_start[block.index] if isinstance(cmd, IRPhi) else position
+                intervals[var] = [start, start]
+            if isinstance(cmd, IRCall):
+                calls.append((position, cmd))
+        position += 1
+        block_end[block.index] = position
+        position += 1
+
+    # the blocks every variable is live into and out of, only for the variables living across blocks
+    live_in: dict[str, set[int]] = {}
+    live_out: dict[str, set[int]] = {}
+
+    def mark_live_out(var: str, worklist: list[int]):
+        """Marks `var` live at the end of the blocks, and of every block it flows from"""
+        interval = intervals[var]
+        var_live_in, var_live_out = live_in.setdefault(var, set()), live_out.setdefault(var, set())
+        while worklist:
+            ind = worklist.pop()
+            if ind in var_live_out:
+                continue
+            var_live_out.add(ind)
+            interval[1] = max(interval[1], block_end[ind])
+            if def_block[var] != ind and ind not in var_live_in:
+                var_live_in.add(ind)
+                interval[0] = min(interval[0], block_start[ind])
+                worklist.extend(pred.index for pred in blocks[ind].predecessors)
+
+    position = 0
+    for block in order:
+        ind = block.index
+        for cmd in block.cmds:
+            position += 1
+            if isinstance(cmd, IRPhi):
+                for var, source in zip(cmd.var_use, cmd.sources):
+                    if var in def_block:
+                        mark_live_out(var, [source.index])
+                continue
+            for var in cmd.var_use:
+                if var not in def_block:
+                    continue
+                interval = intervals[var]
+                interval[1] = max(interval[1], position)
+                if (def_block[var] != ind or interval[0] > position) and ind not in live_in.get(var, ()):
+                    live_in.setdefault(var, set()).add(ind)
+                    interval[0] = min(interval[0], block_start[ind])
+                    mark_live_out(var, [pred.index for pred in block.predecessors])
+        position += 2
+    return intervals, calls
+
+
+def linear_scan_allocation(function: IRFunction):
+    """Allocates registers like `allocate_registers` without needing `liveness_analysis`, and fills the
+    `live_out` of the calls, which the assembly builder uses to save the caller-saved registers"""
+    intervals, calls = build_intervals(function)
+    # stable sort: the return address and the parameters come first, like in `allocate_registers`
+    order = sorted(intervals, key=lambda var: intervals[var][0])
+
+    allocation_table: dict[str, AllocationBase] = {}
+    vacant = list(range(K))  # a heap, so that the lowest register is taken first
+    active: list[tuple[int, str]] = []  # (end, variable) of the intervals in registers, sorted
+    for var in order:
+        start, end = intervals[var]
+        if end < 0 or var == "ret_addr" and not function.is_leaf:
+            # unused parameters must not take up a register, and calls overwrite the return address
+            allocation_table[var] = AllocationStack(var)
+            continue
+        while active and active[0][0] < start:
+            heappush(vacant, allocation_table[active.pop(0)[1]].logical_id)
+        if vacant:
+            allocation_table[var] = AllocationRegister(heappop(vacant))
+        elif active[-1][0] > end:
+            _, spilled = active.pop()
+            allocation_table[var] = AllocationRegister(allocation_table[spilled].logical_id)
+            allocation_table[spilled] = AllocationStack(spilled)
+        else:
+            allocation_table[var] = AllocationStack(var)
+            continue
+        insort(active, (end, var))
+
+    # the variables live after a call are those defined before it whose interval ends after it
+    live: list[tuple[int, str]] = []
+    next_var = 0
+    for position, cmd in calls:
+        while next_var < len(order) and intervals[order[next_var]][0] < position:
+            var = order[next_var]
+            heappush(live, (intervals[var][1], var))
+            next_var += 1
+        while live and live[0][0] <= position:
+            heappop(live)
+        cmd.live_out = {var for _, var in live}
+
+    function.allocation_table = allocation_table
+    return allocation_table
@@ -1,6 +1,5 @@
-from mxc.common import dominator
 from mxc.common.ir_repr import IRFunction, IRPhi
-from mxc.middle_end.utils import build_control_flow_graph
+from mxc.middle_end.analysis import get_analysis, DOMINATOR_TREE
 
 K = 26  # ra, a0-a7, s0-s11, t2-t6
 # K = 1   # for debugging, spill everything to stack
@@ -101,8 +100,7 @@ def spill(function: IRFunction):
 def allocate_registers(function: IRFunction):
     blocks = function.blocks
 
-    cfg = build_control_flow_graph(blocks)
-    dfs_order = dominator.get_dominator_tree_dfs_order(cfg)
+    dfs_order = get_analysis(function, DOMINATOR_TREE).get_dominator_tree_dfs_order()
 
     unassigned, allocation_table = spill(function)
 
@@ -120,10 +118,10 @@ def allocate_registers(function: IRFunction):
     for param in function.info.param_ir_names:
         if param + ".param" in function.blocks[0].live_in:
             allocate(param + ".param")
-        else:
-            # spill unused param to stack (temporary, will be resolved after global DCE)
-            # spill_to_stack(param + ".param", unassigned, allocation_table)
-            allocate(param + ".param")  # WRONG if there is > K unused params
+        elif param + ".param" in unassigned:
+            # unused params of internal functions are removed by global DCE,
+            # the remaining ones (e.g. at O0) must not take up a register
+            spill_to_stack(param + ".param", unassigned, allocation_table)
 
     for ind in dfs_order:
         vacant = set(range(K))
@@ -1,2 +1,28 @@
 from .dominator import *
 graph_type = list[list[int]]
+
+
+def rows(graph: CSRGraph) -> list[memoryview]:
+    """Splits a CSR graph into one zero-copy view of the targets per node"""
+    offsets, targets = memoryview(graph.offsets), memoryview(graph.targets)
+    return [targets[offsets[ind]:offsets[ind + 1]] for ind in range(len(offsets) - 1)]
+
+
+class DominatorTreeView:
+    """A (post) dominator tree computed by CFGAnalysis, with the read-only interface of DominatorTree"""
+
+    def __init__(self, tree: tuple[IntArray, IntArray], children: CSRGraph | None = None):
+        self.immediate_dominators = memoryview(tree[0])
+        self.dfs_order = memoryview(tree[1])
+        self.children = rows(children) if children is not None else None
+
+    def get_immediate_dominators(self) -> memoryview:
+        return self.immediate_dominators
+
+    def get_dominator_tree_dfs_order(self) -> memoryview:
+        return self.dfs_order
+
+    def get_children(self) -> list[memoryview]:
+        if self.children is None:
+            raise ValueError("Children are only available for the dominator tree")
+        return self.children
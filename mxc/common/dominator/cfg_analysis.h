@@ -0,0 +1,388 @@
+//
+// All the analyses of a control flow graph, computed lazily from a single CSR copy of the graph.
+//
+
+#pragma once
+#include <vector>
+#include <memory>
+#include <algorithm>
+#include <stdexcept>
+#include "dominator_tree.h"
+#include "predecessor_set.h"
+
+using int_array = std::shared_ptr<const std::vector<int>>;
+
+/// A graph in compressed sparse row format: the successors of node i are targets[offsets[i] .. offsets[i + 1]).
+struct CSRGraph {
+    int_array offsets, targets;
+
+    CSRGraph() = default;
+
+    explicit CSRGraph(const graph_type& graph) {
+        auto offsets_ = std::make_shared<std::vector<int>>(graph.size() + 1);
+        auto targets_ = std::make_shared<std::vector<int>>();
+        for (int i = 0; i < graph.size(); ++i) {
+            (*offsets_)[i + 1] = (*offsets_)[i] + static_cast<int>(graph[i].size());
+            targets_->insert(targets_->end(), graph[i].begin(), graph[i].end());
+        }
+        offsets = std::move(offsets_);
+        targets = std::move(targets_);
+    }
+
+    CSRGraph(int_array offsets, int_array targets) : offsets(std::move(offsets)), targets(std::move(targets)) {}
+
+    [[nodiscard]] int num_nodes() const { return static_cast<int>(offsets->size()) - 1; }
+
+    [[nodiscard]] const int* begin(int node) const { return targets->data() + (*offsets)[node]; }
+
+    [[nodiscard]] const int* end(int node) const { return targets->data() + (*offsets)[node + 1]; }
+
+    [[nodiscard]] graph_type to_lists() const {
+        graph_type graph(num_nodes());
+        for (int i = 0; i < num_nodes(); ++i) graph[i].assign(begin(i), end(i));
+        return graph;
+    }
+};
+
+/// Immediate dominators and the preorder of the dominator tree, the root having -1 as immediate dominator.
+/// Unreachable nodes also have -1, and are not in the preorder.
+struct TreeResult {
+    int_array immediate_dominators, preorder;
+};
+
+class CFGAnalysis {
+private:
+    int num_nodes, entry;
+    CSRGraph successors, predecessors;
+
+    // lazily computed results
+    int_array preorder_, postorder_;
+    std::unique_ptr<TreeResult> dominator_tree_, post_dominator_tree_;
+    std::unique_ptr<CSRGraph> dominator_tree_children_, dominance_frontiers_, dominance_frontier_predecessors_;
+    int_array loop_headers_, loop_parents_, loop_depths_;
+
+    static std::shared_ptr<std::vector<int>> make_array(int size, int value) {
+        return std::make_shared<std::vector<int>>(size, value);
+    }
+
+    void compute_orders() {
+        auto preorder = std::make_shared<std::vector<int>>();
+        auto postorder = std::make_shared<std::vector<int>>();
+        std::vector<bool> visited(num_nodes, false);
+        std::vector<std::pair<int, const int*>> stack{{entry, successors.begin(entry)}};
+        visited[entry] = true;
+        preorder->push_back(entry);
+        while (!stack.empty()) {
+            auto& [node, next] = stack.back();
+            if (next == successors.end(node)) {
+                postorder->push_back(node);
+                stack.pop_back();
+                continue;
+            }
+            int succ = *next++;
+            if (!visited[succ]) {
+                visited[succ] = true;
+                preorder->push_back(succ);
+                stack.emplace_back(succ, successors.begin(succ));
+            }
+        }
+        preorder_ = std::move(preorder);
+        postorder_ = std::move(postorder);
+    }
+
+    static TreeResult compute_tree(const graph_type& graph, int root) {
+        DominatorTree tree(graph);
+        tree.compute(root);
+        return {
+            std::make_shared<std::vector<int>>(tree.get_immediate_dominators()),
+            std::make_shared<std::vector<int>>(tree.get_dominator_tree_dfs_order())
+        };
+    }
+
+    void compute_loops() {
+        // natural loops: the body of the loop of header h is the set of nodes reaching a back edge u -> h
+        // without going through h; inner loops are found first, as their headers come later in the preorder
+        const auto& idom = immediate_dominators();
+        const auto& order = dominator_tree_preorder();
+        auto headers = make_array(num_nodes, -1), parents = make_array(num_nodes, -1),
+             depths = make_array(num_nodes, 0);
+        std::vector<int> visited(num_nodes, -1), worklist;
+
+        auto dominates = [&](int a, int b) {
+            for (; b >= 0; b = idom[b]) {
+                if (b == a) return true;
+            }
+            return false;
+        };
+        auto outermost = [&](int node) {  // the header of the outermost loop found so far containing node
+            int header = (*headers)[node];
+            while ((*parents)[header] != -1) header = (*parents)[header];
+            return header;
+        };
+
+        for (auto it = order.rbegin(); it != order.rend(); ++it) {
+            int header = *it;
+            worklist.clear();
+            for (const int* pred = predecessors.begin(header); pred != predecessors.end(header); ++pred) {
+                if (idom[*pred] != -1 || *pred == entry) {
+                    if (dominates(header, *pred)) worklist.push_back(*pred);
+                }
+            }
+            if (worklist.empty()) continue;
+            (*headers)[header] = header;
+            visited[header] = header;
+            while (!worklist.empty()) {
+                int node = worklist.back();
+                worklist.pop_back();
+                if ((*headers)[node] != -1) {
+                    node = outermost(node);  // skip over an inner loop
+                    if (node == header) continue;
+                    (*parents)[node] = header;
+                } else {
+                    (*headers)[node] = header;
+                }
+                if (visited[node] == header) continue;
+                visited[node] = header;
+                for (const int* pred = predecessors.begin(node); pred != predecessors.end(node); ++pred) {
+                    if (visited[*pred] != header && (idom[*pred] != -1 || *pred == entry)) {
+                        worklist.push_back(*pred);
+                    }
+                }
+            }
+        }
+
+        // outer loops come first in the preorder, so their depth is known before the depth of inner ones
+        std::vector<int> loop_depth(num_nodes, 0);
+        for (int node : order) {
+            if ((*headers)[node] == node) {
+                int parent = (*parents)[node];
+                loop_depth[node] = parent == -1 ? 1 : loop_depth[parent] + 1;
+            }
+        }
+        for (int node = 0; node < num_nodes; ++node) {
+            if ((*headers)[node] != -1) (*depths)[node] = loop_depth[(*headers)[node]];
+        }
+        loop_headers_ = std::move(headers);
+        loop_parents_ = std::move(parents);
+        loop_depths_ = std::move(depths);
+    }
+
+public:
+    /**
+     * @brief Builds the analysis from a 0-indexed graph in CSR format.
+     * @param offsets Array of num_nodes + 1 offsets into targets, starting from 0.
+     * @param targets Array of the successors of every node, in order.
+     * @param entry The entry node of the graph.
+     */
+    CFGAnalysis(std::vector<int> offsets, std::vector<int> targets, int entry = 0)
+        : num_nodes(static_cast<int>(offsets.size()) - 1), entry(entry) {
+        if (num_nodes < 1 || offsets[0] != 0 || offsets.back() != targets.size())
+            throw std::invalid_argument("Invalid CSR graph");
+        if (entry < 0 || entry >= num_nodes)
+            throw std::invalid_argument("Invalid entry node");
+        for (int i = 0; i < num_nodes; ++i) {
+            if (offsets[i] > offsets[i + 1]) throw std::invalid_argument("Invalid CSR graph");
+        }
+        for (int target : targets) {
+            if (target < 0 || target >= num_nodes) throw std::invalid_argument("Invalid CSR graph");
+        }
+
+        graph_type reverse(num_nodes);
+        for (int i = 0; i < num_nodes; ++i) {
+            for (int j = offsets[i]; j < offsets[i + 1]; ++j) reverse[targets[j]].push_back(i);
+        }
+        successors = CSRGraph(std::make_shared<std::vector<int>>(std::move(offsets)),
+                              std::make_shared<std::vector<int>>(std::move(targets)));
+        predecessors = CSRGraph(reverse);
+    }
+
+    [[nodiscard]] int size() const { return num_nodes; }
+
+    [[nodiscard]] int get_entry() const { return entry; }
+
+    const CSRGraph& get_successors() const { return successors; }
+
+    const CSRGraph& get_predecessors() const { return predecessors; }
+
+    /// Nodes reachable from the entry, in the preorder of a depth-first search visiting successors in order
+    const std::vector<int>& preorder() {
+        if (!preorder_) compute_orders();
+        return *preorder_;
+    }
+
+    const std::vector<int>& postorder() {
+        if (!postorder_) compute_orders();
+        return *postorder_;
+    }
+
+    int_array preorder_array() { return preorder(), preorder_; }
+
+    int_array postorder_array() { return postorder(), postorder_; }
+
+    const TreeResult& dominator_tree() {
+        if (!dominator_tree_) {
+            dominator_tree_ = std::make_unique<TreeResult>(compute_tree(successors.to_lists(), entry));
+        }
+        return *dominator_tree_;
+    }
+
+    const std::vector<int>& immediate_dominators() { return *dominator_tree().immediate_dominators; }
+
+    const std::vector<int>& dominator_tree_preorder() { return *dominator_tree().preorder; }
+
+    /**
+     * @brief The post dominator tree, computed on the reverse graph from a virtual end node.
+     * @details The end node has index num_nodes, and its successors in the reverse graph are the nodes without
+     *      successors. The arrays have num_nodes + 1 entries.
+     */
+    const TreeResult& post_dominator_tree() {
+        if (!post_dominator_tree_) {
+            graph_type reverse = predecessors.to_lists();
+            reverse.emplace_back();
+            for (int i = 0; i < num_nodes; ++i) {
+                if (successors.begin(i) == successors.end(i)) reverse.back().push_back(i);
+            }
+            post_dominator_tree_ = std::make_unique<TreeResult>(compute_tree(reverse, num_nodes));
+        }
+        return *post_dominator_tree_;
+    }
+
+    const CSRGraph& dominator_tree_children() {
+        if (!dominator_tree_children_) {
+            const auto& idom = immediate_dominators();
+            graph_type children(num_nodes);
+            for (int node = 0; node < num_nodes; ++node) {
+                if (idom[node] >= 0) children[idom[node]].push_back(node);
+            }
+            dominator_tree_children_ = std::make_unique<CSRGraph>(children);
+        }
+        return *dominator_tree_children_;
+    }
+
+    /// The dominance frontier of every node, sorted
+    const CSRGraph& dominance_frontiers() {
+        if (!dominance_frontiers_) {
+            // for a join node b, the frontier of every node from a predecessor of b up to idom(b) contains b
+            const auto& idom = immediate_dominators();
+            graph_type frontiers(num_nodes);
+            for (int node = 0; node < num_nodes; ++node) {
+                if (idom[node] == -1 && node != entry) continue;
+                for (const int* pred = predecessors.begin(node); pred != predecessors.end(node); ++pred) {
+                    if (idom[*pred] == -1 && *pred != entry) continue;
+                    for (int runner = *pred; runner != idom[node] && runner != -1; runner = idom[runner]) {
+                        auto& frontier = frontiers[runner];
+                        if (frontier.empty() || frontier.back() != node) frontier.push_back(node);
+                    }
+                }
+            }
+            for (auto& frontier : frontiers) {
+                std::ranges::sort(frontier);
+                frontier.erase(std::ranges::unique(frontier).begin(), frontier.end());
+            }
+            dominance_frontiers_ = std::make_unique<CSRGraph>(frontiers);
+        }
+        return *dominance_frontiers_;
+    }
+
+    /// For every node, the nodes in whose iterated dominance frontier it is,
+    /// the same as get_indirect_predecessor_set_of_dominator_frontier
+    const CSRGraph& dominance_frontier_predecessors() {
+        if (!dominance_frontier_predecessors_) {
+            const auto& frontiers = dominance_frontiers();
+            graph_type reverse_frontiers(num_nodes);
+            for (int node = 0; node < num_nodes; ++node) {
+                for (const int* it = frontiers.begin(node); it != frontiers.end(node); ++it) {
+                    reverse_frontiers[*it].push_back(node);
+                }
+            }
+            dominance_frontier_predecessors_ = std::make_unique<CSRGraph>(
+                get_indirect_predecessor_set(reverse_frontiers));
+        }
+        return *dominance_frontier_predecessors_;
+    }
+
+    /**
+     * @brief Places the phis of the pruned SSA form of a set of variables.
+     * @details The phis of a variable are placed in the iterated dominance frontier of the nodes defining it,
+     *      found with a worklist per variable, and only kept where the variable is live on entry. Its liveness is
+     *      found with a backward worklist from its uses, which stops at the nodes defining it.
+     * @param defs The nodes defining every variable.
+     * @param uses The nodes using every variable before defining it.
+     * @return The nodes needing a phi for every variable, sorted.
+     */
+    CSRGraph place_phis(const CSRGraph& defs, const CSRGraph& uses) {
+        int num_variables = defs.num_nodes();
+        if (uses.num_nodes() != num_variables) throw std::invalid_argument("Mismatched number of variables");
+        for (const auto& sets : {defs, uses}) {
+            for (int node : *sets.targets) {
+                if (node < 0 || node >= num_nodes) throw std::invalid_argument("Invalid node");
+            }
+        }
+        const auto& frontiers = dominance_frontiers();
+        // every mark is the last variable that set it, so that the marks never have to be cleared
+        std::vector<int> defined(num_nodes, -1), live(num_nodes, -1), visited(num_nodes, -1), queued(num_nodes, -1);
+        std::vector<int> worklist;
+        graph_type phis(num_variables);
+        for (int var = 0; var < num_variables; ++var) {
+            for (const int* node = defs.begin(var); node != defs.end(var); ++node) defined[*node] = var;
+            for (const int* node = uses.begin(var); node != uses.end(var); ++node) {
+                if (live[*node] != var) {
+                    live[*node] = var;
+                    worklist.push_back(*node);
+                }
+            }
+            while (!worklist.empty()) {
+                int node = worklist.back();
+                worklist.pop_back();
+                for (const int* pred = predecessors.begin(node); pred != predecessors.end(node); ++pred) {
+                    if (live[*pred] != var && defined[*pred] != var) {
+                        live[*pred] = var;
+                        worklist.push_back(*pred);
+                    }
+                }
+            }
+
+            // a phi defines the variable as well, even where it is dead
+            for (const int* node = defs.begin(var); node != defs.end(var); ++node) {
+                if (queued[*node] != var) {
+                    queued[*node] = var;
+                    worklist.push_back(*node);
+                }
+            }
+            while (!worklist.empty()) {
+                int node = worklist.back();
+                worklist.pop_back();
+                for (const int* it = frontiers.begin(node); it != frontiers.end(node); ++it) {
+                    int frontier = *it;
+                    if (visited[frontier] == var) continue;
+                    visited[frontier] = var;
+                    if (live[frontier] == var) phis[var].push_back(frontier);
+                    if (queued[frontier] != var) {
+                        queued[frontier] = var;
+                        worklist.push_back(frontier);
+                    }
+                }
+            }
+            std::ranges::sort(phis[var]);
+        }
+        return CSRGraph(phis);
+    }
+
+    /// The header of the innermost natural loop containing every node, -1 if it is not in a loop
+    int_array loop_headers() {
+        if (!loop_headers_) compute_loops();
+        return loop_headers_;
+    }
+
+    /// For every loop header, the header of the loop directly containing its loop, -1 for the other nodes
+    int_array loop_parents() {
+        if (!loop_parents_) compute_loops();
+        return loop_parents_;
+    }
+
+    /// The number of loops containing every node
+    int_array loop_depths() {
+        if (!loop_depths_) compute_loops();
+        return loop_depths_;
+    }
+};
@@ -0,0 +1,138 @@
+//
+// Checks CFGAnalysis against the standalone functions on random graphs.
+//
+#include <cassert>
+#include <iostream>
+#include <random>
+#include "cfg_analysis.h"
+#include "dominance_frontier.h"
+
+static CFGAnalysis make_analysis(const graph_type& graph) {
+    CSRGraph csr(graph);
+    return {*csr.offsets, *csr.targets};
+}
+
+static void print(const char* name, const std::vector<int>& values) {
+    std::cout << name << ":";
+    for (int value : values) std::cout << " " << value;
+    std::cout << std::endl;
+}
+
+static void check(const graph_type& graph) {
+    auto analysis = make_analysis(graph);
+    int  n        = graph.size();
+
+    DominatorTree tree(graph);
+    tree.compute();
+    assert(analysis.immediate_dominators() == tree.get_immediate_dominators());
+    assert(analysis.dominator_tree_preorder() == tree.get_dominator_tree_dfs_order());
+
+    auto reverse = reverse_graph(graph);
+    reverse.emplace_back();
+    for (int i = 0; i < n; ++i) {
+        if (graph[i].empty()) reverse.back().push_back(i);
+    }
+    DominatorTree post_tree(reverse);
+    post_tree.compute(n);
+    assert(*analysis.post_dominator_tree().immediate_dominators == post_tree.get_immediate_dominators());
+
+    auto reverse_frontier = get_reverse_dominance_frontier(graph);
+    const auto& frontiers = analysis.dominance_frontiers();
+    graph_type  expected(n);
+    for (int x = 0; x < n; ++x) {
+        for (int y : reverse_frontier[x]) expected[y].push_back(x);
+    }
+    for (int y = 0; y < n; ++y) {
+        std::ranges::sort(expected[y]);
+        assert(std::vector<int>(frontiers.begin(y), frontiers.end(y)) == expected[y]);
+    }
+
+    auto expected_pred = get_indirect_predecessor_set_of_dominator_frontier(graph);
+    const auto& pred   = analysis.dominance_frontier_predecessors();
+    for (int i = 0; i < n; ++i) {
+        std::vector<int> actual(pred.begin(i), pred.end(i));
+        std::ranges::sort(actual);
+        std::ranges::sort(expected_pred[i]);
+        assert(actual == expected_pred[i]);
+    }
+
+    // pruned phis: the nodes in the iterated dominance frontier of a definition where the variable is live
+    std::mt19937 rng(n);
+    graph_type defs(3), uses(3);
+    for (int var = 0; var < 3; ++var) {
+        for (int i = 0; i < n; ++i) {
+            if (rng() % 4 == 0) defs[var].push_back(i);
+            if (rng() % 4 == 0) uses[var].push_back(i);
+        }
+    }
+    auto phis = analysis.place_phis(CSRGraph(defs), CSRGraph(uses));
+    for (int var = 0; var < 3; ++var) {
+        std::vector<bool> defined(n, false), live(n, false);
+        for (int i : defs[var]) defined[i] = true;
+        for (int i : uses[var]) live[i] = true;
+        for (bool changed = true; changed;) {
+            changed = false;
+            for (int i = 0; i < n; ++i) {
+                if (live[i] || defined[i]) continue;
+                for (int succ : graph[i]) {
+                    if (live[succ]) {
+                        live[i] = changed = true;
+                        break;
+                    }
+                }
+            }
+        }
+        std::vector<int> expected_phis;
+        for (int i = 0; i < n; ++i) {
+            if (live[i] && std::ranges::any_of(expected_pred[i], [&](int d) { return defined[d]; }))
+                expected_phis.push_back(i);
+        }
+        assert(std::vector<int>(phis.begin(var), phis.end(var)) == expected_phis);
+    }
+
+    // every node in a loop is reachable from its header and reaches it without leaving the loop
+    const auto& idom    = analysis.immediate_dominators();
+    auto        headers = analysis.loop_headers();
+    for (int i = 0; i < n; ++i) {
+        int header = (*headers)[i];
+        if (header == -1) continue;
+        for (int node = i; node != header; node = idom[node]) assert(node != -1);
+    }
+}
+
+int main() {
+    graph_type graph = {
+        {1},
+        {2},
+        {3, 4, 5},
+        {0, 6},
+        {2, 5},
+        {7},
+        {7, 8, 9},
+        {}, {}, {}
+    };
+    auto analysis = make_analysis(graph);
+    print("Preorder", analysis.preorder());
+    print("Postorder", analysis.postorder());
+    print("Immediate dominators", analysis.immediate_dominators());
+    print("Post dominators", *analysis.post_dominator_tree().immediate_dominators);
+    print("Loop headers", *analysis.loop_headers());
+    print("Loop parents", *analysis.loop_parents());
+    print("Loop depths", *analysis.loop_depths());
+    check(graph);
+
+    std::mt19937 rng(20240823);
+    for (int round = 0; round < 1000; ++round) {
+        int        n = rng() % 30 + 1;
+        graph_type random_graph(n);
+        // the standalone functions expect every node to be reachable from the entry
+        for (int i = 1; i < n; ++i) random_graph[rng() % i].push_back(i);
+        for (int i = 0; i < n; ++i) {
+            int degree = rng() % 3;
+            for (int j = 0; j < degree; ++j) random_graph[i].push_back(rng() % n);
+        }
+        check(random_graph);
+    }
+    std::cout << "All checks passed" << std::endl;
+    return 0;
+}
@@ -4,9 +4,38 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include "dominance_frontier.h"
+#include "cfg_analysis.h"
 
 namespace py = pybind11;
 
+/// A read-only array of ints shared with the analysis that computed it, exposed through the buffer protocol
+struct IntArray {
+    int_array data;
+};
+
+static std::vector<int> to_vector(const py::buffer& buffer) {
+    py::buffer_info info = buffer.request();
+    if (info.ndim != 1 || info.itemsize != sizeof(int) || py::format_descriptor<int>::format() != info.format)
+        throw std::invalid_argument("Expected a one-dimensional buffer of 32-bit ints");
+    if (info.strides[0] != sizeof(int))
+        throw std::invalid_argument("Expected a contiguous buffer");
+    const int* data = static_cast<const int*>(info.ptr);
+    return {data, data + info.size};
+}
+
+static CSRGraph to_csr(const py::buffer& offsets, const py::buffer& targets) {
+    auto offsets_ = std::make_shared<std::vector<int>>(to_vector(offsets));
+    auto targets_ = std::make_shared<std::vector<int>>(to_vector(targets));
+    if (offsets_->empty() || offsets_->front() != 0 || offsets_->back() != targets_->size() ||
+        !std::ranges::is_sorted(*offsets_))
+        throw std::invalid_argument("Invalid CSR graph");
+    return {std::move(offsets_), std::move(targets_)};
+}
+
+static std::pair<IntArray, IntArray> to_pair(const TreeResult& result) {
+    return {IntArray{result.immediate_dominators}, IntArray{result.preorder}};
+}
+
 PYBIND11_MODULE(dominator, m) {
     m.def("get_reverse_dominance_frontier", &get_reverse_dominance_frontier,
           "Get the reverse dominance frontier mapping of every node in a directed graph.");
@@ -15,9 +44,73 @@ PYBIND11_MODULE(dominator, m) {
     m.def("get_dominator_tree_dfs_order", &get_dominator_tree_dfs_order, "Computes the DFS order of the dominator tree for the given graph.");
     py::class_<DominatorTree>(m, "DominatorTree")
         .def(py::init<const graph_type&>())
+        .def(py::init<const graph_type&, int, const std::vector<int>&>(),
+             "Initializes the tree from a graph whose immediate dominators are already known.",
+             py::arg("graph"), py::arg("start"), py::arg("immediate_dominators"))
         .def("compute", &DominatorTree::compute, "Computes the dominator tree.", py::arg("start") = 0)
         .def("get_dominated_node_counts", &DominatorTree::get_dominated_node_counts, "Computes and returns the number of nodes each node dominates starting from a specified node.")
         .def("get_immediate_dominators", &DominatorTree::get_immediate_dominators, "Computes and returns the immediate dominators of each node starting from a specified node.")
         .def("get_dfs_order", &DominatorTree::get_dfs_order, "Computes and returns the DFS order of the original graph.")
-        .def("get_dominator_tree_dfs_order", &DominatorTree::get_dominator_tree_dfs_order, "Computes the DFS order of the dominator tree for the given graph.");
+        .def("get_dominator_tree_dfs_order", &DominatorTree::get_dominator_tree_dfs_order, "Computes the DFS order of the dominator tree for the given graph.")
+        .def("get_children", &DominatorTree::get_children, "Returns the children of every node in the dominator tree.")
+        .def("add_node", &DominatorTree::add_node, "Adds an unreachable node without edges and returns its index.")
+        .def("insert_edge", &DominatorTree::insert_edge, "Inserts an edge and updates the dominator tree.",
+             py::arg("from"), py::arg("to"))
+        .def("delete_edge", &DominatorTree::delete_edge, "Deletes an edge and updates the dominator tree.",
+             py::arg("from"), py::arg("to"))
+        .def("split_edge", &DominatorTree::split_edge,
+             "Splits an edge by a new node, updates the dominator tree and returns the index of the node.",
+             py::arg("from"), py::arg("to"))
+        .def("relabel", &DominatorTree::relabel, "Renumbers the nodes, given the old index of every node.",
+             py::arg("order"));
+    py::class_<IntArray>(m, "IntArray", py::buffer_protocol())
+        .def_buffer([](const IntArray& array) {
+            return py::buffer_info(const_cast<int*>(array.data->data()), sizeof(int),
+                                   py::format_descriptor<int>::format(), 1,
+                                   {static_cast<py::ssize_t>(array.data->size())}, {sizeof(int)}, true);
+        })
+        .def("__len__", [](const IntArray& array) { return array.data->size(); })
+        .def("__getitem__", [](const IntArray& array, py::ssize_t ind) {
+            if (ind < 0) ind += static_cast<py::ssize_t>(array.data->size());
+            if (ind < 0 || ind >= array.data->size()) throw py::index_error();
+            return (*array.data)[ind];
+        });
+    py::class_<CSRGraph>(m, "CSRGraph")
+        .def_property_readonly("offsets", [](const CSRGraph& graph) { return IntArray{graph.offsets}; })
+        .def_property_readonly("targets", [](const CSRGraph& graph) { return IntArray{graph.targets}; })
+        .def("__len__", &CSRGraph::num_nodes);
+    py::class_<CFGAnalysis>(m, "CFGAnalysis")
+        .def(py::init([](const py::buffer& offsets, const py::buffer& targets, int entry) {
+            return CFGAnalysis(to_vector(offsets), to_vector(targets), entry);
+        }), "Builds the analyses of a 0-indexed graph in CSR format.",
+             py::arg("offsets"), py::arg("targets"), py::arg("entry") = 0)
+        .def("__len__", &CFGAnalysis::size)
+        .def_property_readonly("entry", &CFGAnalysis::get_entry)
+        .def_property_readonly("successors", &CFGAnalysis::get_successors)
+        .def_property_readonly("predecessors", &CFGAnalysis::get_predecessors)
+        .def("preorder", [](CFGAnalysis& analysis) { return IntArray{analysis.preorder_array()}; },
+             "DFS preorder of the nodes reachable from the entry.")
+        .def("postorder", [](CFGAnalysis& analysis) { return IntArray{analysis.postorder_array()}; },
+             "DFS postorder of the nodes reachable from the entry.")
+        .def("dominator_tree", [](CFGAnalysis& analysis) { return to_pair(analysis.dominator_tree()); },
+             "Immediate dominators and DFS order of the dominator tree.")
+        .def("post_dominator_tree", [](CFGAnalysis& analysis) { return to_pair(analysis.post_dominator_tree()); },
+             "Immediate post dominators and DFS order of the post dominator tree, rooted at a virtual end node.")
+        .def("dominator_tree_children", &CFGAnalysis::dominator_tree_children,
+             "Children of every node in the dominator tree.")
+        .def("dominance_frontiers", &CFGAnalysis::dominance_frontiers, "Sorted dominance frontier of every node.")
+        .def("dominance_frontier_predecessors", &CFGAnalysis::dominance_frontier_predecessors,
+             "The indirect predecessor set of the dominator frontier of every node.")
+        .def("place_phis", [](CFGAnalysis& analysis, const py::buffer& def_offsets, const py::buffer& def_nodes,
+                              const py::buffer& use_offsets, const py::buffer& use_nodes) {
+            return analysis.place_phis(to_csr(def_offsets, def_nodes), to_csr(use_offsets, use_nodes));
+        }, "The nodes needing a phi for every variable in pruned SSA form, given the nodes defining it and the "
+           "nodes using it before defining it, both in CSR format.",
+             py::arg("def_offsets"), py::arg("def_nodes"), py::arg("use_offsets"), py::arg("use_nodes"))
+        .def("loop_headers", [](CFGAnalysis& analysis) { return IntArray{analysis.loop_headers()}; },
+             "Header of the innermost natural loop containing every node.")
+        .def("loop_parents", [](CFGAnalysis& analysis) { return IntArray{analysis.loop_parents()}; },
+             "Header of the loop directly containing the loop of every header.")
+        .def("loop_depths", [](CFGAnalysis& analysis) { return IntArray{analysis.loop_depths()}; },
+             "Number of loops containing every node.");
 }
@@ -1,6 +1,6 @@
 # dominator.pyi
 
-from typing import List
+from typing import List, overload
 
 # Aliases for readability
 graph_type = List[List[int]]
@@ -51,6 +51,7 @@ def get_dominator_tree_dfs_order(graph: graph_type) -> list[int]:
     """
 
 class DominatorTree:
+    @overload
     def __init__(self, graph: graph_type):
         """
         Construct the dominator tree from a directed graph.
@@ -59,6 +60,18 @@ class DominatorTree:
         """
         pass
 
+    @overload
+    def __init__(self, graph: graph_type, start: int, immediate_dominators: List[int]):
+        """
+        Construct an already computed dominator tree from a directed graph and its immediate dominators,
+        so that it can be updated without running the algorithm.
+
+        :param graph: The directed graph represented as an adjacency list.
+        :param start: The root of the tree.
+        :param immediate_dominators: The immediate dominator of each node, -1 for the root and unreachable nodes.
+        """
+        pass
+
     def compute(self, start_node: int = 0):
         """
         Computes the dominator tree starting from a specified node.
@@ -99,3 +112,179 @@ class DominatorTree:
         """
         pass
 
+    def get_children(self) -> graph_type:
+        """
+        Returns the children of each node in the dominator tree, in increasing order.
+
+        :return: The dominator tree as an adjacency list.
+        """
+        pass
+
+    def add_node(self) -> int:
+        """
+        Adds a node without edges, unreachable until an edge to it is inserted.
+
+        :return: The index of the new node.
+        """
+        pass
+
+    def insert_edge(self, from_: int, to: int):
+        """
+        Inserts an edge into the graph and updates the computed dominator tree.
+        Only the nodes whose immediate dominator changes are visited, and the nodes the edge makes reachable.
+
+        :param from_: The starting node of the edge.
+        :param to: The ending node of the edge.
+        """
+        pass
+
+    def delete_edge(self, from_: int, to: int):
+        """
+        Deletes an edge from the graph and updates the computed dominator tree.
+        Only the subtree of the nearest common dominator of both ends is computed again,
+        unless the end of the edge becomes unreachable.
+
+        :param from_: The starting node of the edge.
+        :param to: The ending node of the edge.
+        """
+        pass
+
+    def split_edge(self, from_: int, to: int) -> int:
+        """
+        Replaces an edge by a new node and two edges, and updates the computed dominator tree.
+        The new node is dominated by the start of the edge, and only the end of the edge may get a new immediate
+        dominator, so no part of the tree is computed again.
+
+        :param from_: The starting node of the edge.
+        :param to: The ending node of the edge.
+        :return: The index of the new node.
+        """
+        pass
+
+    def relabel(self, order: List[int]):
+        """
+        Renumbers the nodes, keeping the computed dominator tree.
+
+        :param order: The old index of each node in the new numbering.
+        """
+        pass
+
+
+
+class IntArray:
+    """
+    A read-only array of 32-bit ints owned by a CFGAnalysis.
+    It supports the buffer protocol, so memoryview(array) gives zero-copy access.
+    """
+
+    def __len__(self) -> int: ...
+
+    def __getitem__(self, index: int) -> int: ...
+
+
+class CSRGraph:
+    """
+    A graph in compressed sparse row format.
+    The successors of node i are targets[offsets[i]:offsets[i + 1]].
+    """
+    offsets: IntArray
+    targets: IntArray
+
+    def __len__(self) -> int: ...
+
+
+class CFGAnalysis:
+    def __init__(self, offsets, targets, entry: int = 0):
+        """
+        Builds the analyses of a 0-indexed directed graph in CSR format.
+        Every analysis is computed on first request and cached.
+
+        :param offsets: A buffer of num_nodes + 1 32-bit ints, such as array('i'), starting from 0.
+        :param targets: A buffer of 32-bit ints holding the successors of every node, in order.
+        :param entry: The entry node of the graph.
+        """
+        pass
+
+    def __len__(self) -> int: ...
+
+    entry: int
+    successors: CSRGraph
+    predecessors: CSRGraph
+
+    def preorder(self) -> IntArray:
+        """
+        :return: The DFS preorder of the nodes reachable from the entry.
+        """
+        pass
+
+    def postorder(self) -> IntArray:
+        """
+        :return: The DFS postorder of the nodes reachable from the entry.
+        """
+        pass
+
+    def dominator_tree(self) -> tuple[IntArray, IntArray]:
+        """
+        :return: The immediate dominator of every node (-1 for the entry and unreachable nodes)
+            and the DFS order of the dominator tree.
+        """
+        pass
+
+    def post_dominator_tree(self) -> tuple[IntArray, IntArray]:
+        """
+        The post dominator tree is rooted at a virtual end node with index len(self),
+        which is post dominated by every node without successors.
+
+        :return: The immediate post dominator of every node and the virtual end node,
+            and the DFS order of the post dominator tree.
+        """
+        pass
+
+    def dominator_tree_children(self) -> CSRGraph:
+        """
+        :return: The children of every node in the dominator tree, in increasing order.
+        """
+        pass
+
+    def dominance_frontiers(self) -> CSRGraph:
+        """
+        :return: The dominance frontier of every node, sorted.
+        """
+        pass
+
+    def dominance_frontier_predecessors(self) -> CSRGraph:
+        """
+        :return: The same sets as get_indirect_predecessor_set_of_dominator_frontier.
+        """
+        pass
+
+    def place_phis(self, def_offsets, def_nodes, use_offsets, use_nodes) -> CSRGraph:
+        """
+        Places the phis of the pruned SSA form of a set of variables: the nodes in the iterated dominance frontier
+        of the nodes defining a variable, where the variable is live on entry.
+
+        :param def_offsets: The offsets of the nodes defining every variable in def_nodes, in CSR format.
+        :param def_nodes: A buffer of 32-bit ints holding the nodes defining every variable.
+        :param use_offsets: The offsets of the nodes using every variable in use_nodes, in CSR format.
+        :param use_nodes: A buffer of 32-bit ints holding the nodes using every variable before defining it.
+        :return: The nodes needing a phi for every variable, sorted.
+        """
+        pass
+
+    def loop_headers(self) -> IntArray:
+        """
+        :return: The header of the innermost natural loop containing every node, -1 outside loops.
+        """
+        pass
+
+    def loop_parents(self) -> IntArray:
+        """
+        :return: For every loop header, the header of the loop directly containing its loop, -1 otherwise.
+        """
+        pass
+
+    def loop_depths(self) -> IntArray:
+        """
+        :return: The number of natural loops containing every node.
+        """
+        pass
@@ -4,7 +4,10 @@
 
 #pragma once
 #include <vector>
+#include <queue>
+#include <algorithm>
 #include <functional>
+#include <stdexcept>
 
 
 using graph_type = std::vector<std::vector<int>>;
@@ -17,6 +20,12 @@ private:
     std::vector<std::vector<int>> original_graph, reverse_graph, semi_dominator_tree;
     std::vector<int> dfs_number, dfs_order, parent, immediate_dominator, semi_dominator, disjoint_set, min_vertex,
                      subtree_size;
+    // state kept for the incremental updates: the dominator tree itself and the depth of every node in it (-1 if the
+    // node is unreachable). dfs_order is only refreshed on demand after an update.
+    bool computed = false, dfs_stale = false;
+    std::vector<std::vector<int>> dominator_children;
+    std::vector<int> level, mark, local_index;
+    int mark_stamp = 0;
 
     int find_set(int v) {
         if (v == disjoint_set[v]) return v;
@@ -66,6 +75,181 @@ private:
         }
     }
 
+    void reset() {
+        dfs_count = 0;
+        std::ranges::fill(dfs_number, 0);
+        std::ranges::fill(dfs_order, 0);
+        std::ranges::fill(parent, 0);
+        std::ranges::fill(immediate_dominator, 0);
+        for (auto& bucket : semi_dominator_tree) bucket.clear();
+    }
+
+    void recompute() {
+        reset();
+        compute_dominators();
+        build_tree_links();
+        dfs_stale = false;
+    }
+
+    void refresh_dfs_order() {
+        if (!dfs_stale) return;
+        dfs_count = 0;
+        std::ranges::fill(dfs_number, 0);
+        std::ranges::fill(dfs_order, 0);
+        dfs(start_node);
+        dfs_stale = false;
+    }
+
+    [[nodiscard]] bool reachable(int v) const { return v == start_node || immediate_dominator[v] != 0; }
+
+    void build_tree_links() {
+        dominator_children.assign(num_nodes + 1, {});
+        level.assign(num_nodes + 1, -1);
+        for (int i = 1; i <= num_nodes; ++i) {
+            if (immediate_dominator[i] != 0) dominator_children[immediate_dominator[i]].push_back(i);
+        }
+        update_levels(start_node, 0);
+    }
+
+    void update_levels(int root, int root_level) {
+        level[root] = root_level;
+        std::vector<int> stack{root};
+        while (!stack.empty()) {
+            int v = stack.back();
+            stack.pop_back();
+            for (int child : dominator_children[v]) {
+                level[child] = level[v] + 1;
+                stack.push_back(child);
+            }
+        }
+    }
+
+    void set_immediate_dominator(int v, int dominator) {
+        if (immediate_dominator[v] != 0) {
+            auto& siblings = dominator_children[immediate_dominator[v]];
+            siblings.erase(std::ranges::find(siblings, v));
+        }
+        immediate_dominator[v] = dominator;
+        dominator_children[dominator].push_back(v);
+    }
+
+    [[nodiscard]] int nearest_common_dominator(int a, int b) const {
+        while (a != b) {
+            if (level[a] < level[b]) std::swap(a, b);
+            a = immediate_dominator[a];
+        }
+        return a;
+    }
+
+    /// Dominators of a region of the graph only entered through region[0], with region[0] as root
+    std::vector<int> compute_region_dominators(const std::vector<int>& region) {
+        ++mark_stamp;
+        for (int i = 0; i < region.size(); ++i) {
+            mark[region[i]] = mark_stamp;
+            local_index[region[i]] = i;
+        }
+        graph_type region_graph(region.size());
+        for (int i = 0; i < region.size(); ++i) {
+            for (int succ : original_graph[region[i]]) {
+                if (mark[succ] == mark_stamp) region_graph[i].push_back(local_index[succ]);
+            }
+        }
+        DominatorTree region_tree(region_graph);
+        region_tree.compute(0);
+        auto local_dominators = region_tree.get_immediate_dominators();
+        std::vector<int> dominators(region.size(), 0);
+        for (int i = 1; i < region.size(); ++i) dominators[i] = region[local_dominators[i]];
+        return dominators;
+    }
+
+    /**
+     * @brief Updates the tree after the insertion of an edge between two reachable nodes.
+     * @details The nodes whose immediate dominator changes are the nodes w deeper than nca(from, to) + 1 reachable
+     *      from `to` through nodes at least as deep as w. They all become children of nca(from, to). They are found by
+     *      a search visiting the deepest nodes first, the depth-based search of Georgiadis et al.
+     */
+    void insert_reachable_edge(int from, int to) {
+        int nca = nearest_common_dominator(from, to);
+        if (nca == to || nca == immediate_dominator[to]) return;
+        int nca_level = level[nca];
+
+        ++mark_stamp;
+        std::priority_queue<std::pair<int, int>> bucket;  // deepest first
+        std::vector<int> affected, unaffected;
+        bucket.emplace(level[to], to);
+        mark[to] = mark_stamp;
+        while (!bucket.empty()) {
+            int v = bucket.top().second;
+            bucket.pop();
+            affected.push_back(v);
+            int current_level = level[v];
+            while (true) {
+                for (int succ : original_graph[v]) {
+                    if (level[succ] <= nca_level + 1 || mark[succ] == mark_stamp) continue;
+                    mark[succ] = mark_stamp;
+                    if (level[succ] > current_level) unaffected.push_back(succ);
+                    else bucket.emplace(level[succ], succ);
+                }
+                if (unaffected.empty()) break;
+                v = unaffected.back();
+                unaffected.pop_back();
+            }
+        }
+        for (int v : affected) set_immediate_dominator(v, nca);
+        for (int v : affected) update_levels(v, nca_level + 1);
+    }
+
+    /// Updates the tree after the insertion of an edge from a reachable node to an unreachable one
+    void insert_unreachable_edge(int from, int to) {
+        // the newly reachable region, and the edges leaving it towards nodes that were already reachable
+        ++mark_stamp;
+        std::vector<int> region, stack{to};
+        std::vector<std::pair<int, int>> outgoing;
+        mark[to] = mark_stamp;
+        while (!stack.empty()) {
+            int v = stack.back();
+            stack.pop_back();
+            region.push_back(v);
+            for (int succ : original_graph[v]) {
+                if (reachable(succ)) {
+                    outgoing.emplace_back(v, succ);
+                } else if (mark[succ] != mark_stamp) {
+                    mark[succ] = mark_stamp;
+                    stack.push_back(succ);
+                }
+            }
+        }
+        auto dominators = compute_region_dominators(region);
+        dominators[0] = from;
+        for (int i = 0; i < region.size(); ++i) set_immediate_dominator(region[i], dominators[i]);
+        update_levels(to, level[from] + 1);
+        for (auto [u, v] : outgoing) insert_reachable_edge(u, v);
+    }
+
+    /// Recomputes the dominators inside the subtree of root, which is entered only through root
+    void rebuild_subtree(int root) {
+        std::vector<int> region, stack{root};
+        while (!stack.empty()) {
+            int v = stack.back();
+            stack.pop_back();
+            region.push_back(v);
+            for (int child : dominator_children[v]) stack.push_back(child);
+        }
+        auto dominators = compute_region_dominators(region);
+        for (int i = 1; i < region.size(); ++i) {
+            if (dominators[i] != immediate_dominator[region[i]]) set_immediate_dominator(region[i], dominators[i]);
+        }
+        update_levels(root, level[root]);
+    }
+
+    void check_node(int v) const {
+        if (v < 0 || v >= num_nodes) throw std::out_of_range("Node index out of range");
+    }
+
+    void check_computed() const {
+        if (!computed) throw std::logic_error("The dominator tree must be computed before it is updated");
+    }
+
     std::vector<int> compute_dominated_node_counts() {
         std::vector<int> subtree_size(num_nodes + 1);
         for (int i = dfs_count; i >= 2; --i)
@@ -110,6 +294,8 @@ public:
         original_graph.resize(n + 1);
         reverse_graph.resize(n + 1);
         semi_dominator_tree.resize(n + 1);
+        mark.resize(n + 1);
+        local_index.resize(n + 1);
         dfs_number.resize(n + 1);
         dfs_order.resize(n + 1);
         parent.resize(n + 1);
@@ -145,9 +331,158 @@ public:
         reverse_graph[to].push_back(from);
     }
 
+    /**
+     * @brief Constructor to initialize the DominatorTree with a graph whose dominators are already known.
+     * @details The tree can be updated right away, without running the algorithm again.
+     * @param graph The 0-indexed adjacency list of the graph.
+     * @param start The root of the tree (0-indexed).
+     * @param immediate_dominators The 0-indexed immediate dominator of every node, -1 for the root and unreachable nodes.
+     */
+    DominatorTree(const graph_type& graph, int start, const std::vector<int>& immediate_dominators)
+        : DominatorTree(graph) {
+        if (immediate_dominators.size() != num_nodes)
+            throw std::invalid_argument("Expected one immediate dominator per node");
+        check_node(start);
+        start_node = start + 1;
+        for (int i = 0; i < num_nodes; ++i) immediate_dominator[i + 1] = immediate_dominators[i] + 1;
+        immediate_dominator[start_node] = 0;
+        build_tree_links();
+        computed = dfs_stale = true;
+    }
+
     void compute(int start = 0) {
         start_node = start + 1; // Convert to 1-indexed graph.
-        compute_dominators();
+        recompute();
+        computed = true;
+    }
+
+    /**
+     * @brief Adds a node without any edge, which is unreachable until an edge to it is inserted.
+     * @return The index of the new node (0-indexed).
+     */
+    int add_node() {
+        ++num_nodes;
+        for (auto* list : {&original_graph, &reverse_graph, &semi_dominator_tree, &dominator_children})
+            list->emplace_back();
+        for (auto* array : {&dfs_number, &dfs_order, &parent, &immediate_dominator, &semi_dominator, &disjoint_set,
+                            &min_vertex, &mark, &local_index})
+            array->push_back(0);
+        level.push_back(-1);
+        return num_nodes - 1;
+    }
+
+    /**
+     * @brief Inserts an edge and updates the computed dominator tree.
+     * @details Only the nodes whose immediate dominator changes, and the nodes made reachable by the edge, are visited.
+     * @param from The starting node of the edge (0-indexed).
+     * @param to The ending node of the edge (0-indexed).
+     */
+    void insert_edge(int from, int to) {
+        check_computed();
+        check_node(from);
+        check_node(to);
+        add_edge(from, to);
+        dfs_stale = true;
+        ++from;
+        ++to;
+        if (!reachable(from)) return;
+        if (reachable(to)) insert_reachable_edge(from, to);
+        else insert_unreachable_edge(from, to);
+    }
+
+    /**
+     * @brief Deletes one occurrence of an edge and updates the computed dominator tree.
+     * @details Only the subtree of the nearest common dominator of the two ends is recomputed. If the edge was the
+     *      only way to reach its end, the whole tree is recomputed.
+     * @param from The starting node of the edge (0-indexed).
+     * @param to The ending node of the edge (0-indexed).
+     */
+    void delete_edge(int from, int to) {
+        check_computed();
+        check_node(from);
+        check_node(to);
+        ++from;
+        ++to;
+        auto successor = std::ranges::find(original_graph[from], to);
+        if (successor == original_graph[from].end()) throw std::invalid_argument("No such edge");
+        original_graph[from].erase(successor);
+        reverse_graph[to].erase(std::ranges::find(reverse_graph[to], from));
+        dfs_stale = true;
+        if (!reachable(from) || !reachable(to)) return;
+
+        int nca = nearest_common_dominator(from, to);
+        if (nca == to) return;  // a back edge
+        bool still_reachable = from != immediate_dominator[to];
+        for (int i = 0; !still_reachable && i < reverse_graph[to].size(); ++i) {
+            int pred = reverse_graph[to][i];
+            still_reachable = reachable(pred) && nearest_common_dominator(pred, to) != to;
+        }
+        if (still_reachable) rebuild_subtree(nca);
+        else recompute();
+    }
+
+    /**
+     * @brief Splits an edge by a new node and updates the computed dominator tree.
+     * @details The new node is dominated by the start of the edge. The end keeps its immediate dominator, unless the
+     *      edge was the only way into it: then the new node is inserted above the end. No other node is affected, so
+     *      only the predecessors of the end are checked, instead of recomputing a subtree as delete_edge does.
+     * @param from The starting node of the edge (0-indexed).
+     * @param to The ending node of the edge (0-indexed).
+     * @return The index of the new node (0-indexed).
+     */
+    int split_edge(int from, int to) {
+        check_computed();
+        check_node(from);
+        check_node(to);
+        if (std::ranges::find(original_graph[from + 1], to + 1) == original_graph[from + 1].end())
+            throw std::invalid_argument("No such edge");
+        int split = add_node() + 1;
+        ++from;
+        ++to;
+        *std::ranges::find(original_graph[from], to) = split;
+        *std::ranges::find(reverse_graph[to], from) = split;
+        original_graph[split].push_back(to);
+        reverse_graph[split].push_back(from);
+        dfs_stale = true;
+        if (!reachable(from)) return split - 1;
+
+        set_immediate_dominator(split, from);
+        level[split] = level[from] + 1;
+        if (to == start_node) return split - 1;
+        for (int pred : reverse_graph[to]) {
+            if (pred != split && reachable(pred) && nearest_common_dominator(pred, to) != to) return split - 1;
+        }
+        set_immediate_dominator(to, split);
+        update_levels(to, level[split] + 1);
+        return split - 1;
+    }
+
+    /**
+     * @brief Renumbers the nodes, keeping the computed dominator tree.
+     * @param order The old index of every node in the new numbering (0-indexed), a permutation of all the nodes.
+     */
+    void relabel(const std::vector<int>& order) {
+        check_computed();
+        if (order.size() != num_nodes) throw std::invalid_argument("Expected a permutation of all the nodes");
+        std::vector<int> new_index(num_nodes + 1, 0);
+        for (int i = 0; i < num_nodes; ++i) {
+            check_node(order[i]);
+            if (new_index[order[i] + 1] != 0) throw std::invalid_argument("Expected a permutation of all the nodes");
+            new_index[order[i] + 1] = i + 1;
+        }
+        graph_type new_graph(num_nodes + 1), new_reverse_graph(num_nodes + 1);
+        std::vector<int> new_dominator(num_nodes + 1, 0);
+        for (int v = 1; v <= num_nodes; ++v) {
+            for (int succ : original_graph[v]) new_graph[new_index[v]].push_back(new_index[succ]);
+            for (int pred : reverse_graph[v]) new_reverse_graph[new_index[v]].push_back(new_index[pred]);
+            if (immediate_dominator[v] != 0) new_dominator[new_index[v]] = new_index[immediate_dominator[v]];
+        }
+        original_graph = std::move(new_graph);
+        reverse_graph = std::move(new_reverse_graph);
+        immediate_dominator = std::move(new_dominator);
+        start_node = new_index[start_node];
+        build_tree_links();
+        dfs_stale = true;
     }
 
     /**
@@ -157,6 +492,7 @@ public:
      * @return A vector containing the number of nodes each node dominates.
      */
     std::vector<int> get_dominated_node_counts() {
+        refresh_dfs_order();
         return compute_dominated_node_counts();
     }
 
@@ -175,6 +511,7 @@ public:
     }
 
     std::vector<int> get_dfs_order() {
+        refresh_dfs_order();
         std::vector<int> dfs_0_ind(num_nodes);
         for (int i = 1; i <= num_nodes; ++i) {
             dfs_0_ind[i - 1] = dfs_order[i] - 1;
@@ -189,6 +526,15 @@ public:
         }
         return dfs_order;
     }
+
+    /// The children of every node in the dominator tree, in increasing order (0-indexed).
+    graph_type get_children() const {
+        graph_type children(num_nodes);
+        for (int i = 1; i <= num_nodes; ++i) {
+            if (immediate_dominator[i] != 0) children[immediate_dominator[i] - 1].push_back(i - 1);
+        }
+        return children;
+    }
 };
 
 /**
@@ -0,0 +1,96 @@
+//
+// Checks the incremental updates of DominatorTree against a recomputation from scratch.
+//
+#include <cassert>
+#include <iostream>
+#include <random>
+#include "dominator_tree.h"
+
+static std::vector<int> recompute(const graph_type& graph, int start) {
+    DominatorTree tree(graph);
+    tree.compute(start);
+    return tree.get_immediate_dominators();
+}
+
+int main() {
+    std::mt19937 rng(20240822);
+    int updates = 0;
+    for (int round = 0; round < 300; ++round) {
+        int        n = rng() % 20 + 1;
+        graph_type graph(n);
+        for (int i = 0; i < n; ++i) {
+            int degree = rng() % 3;
+            for (int j = 0; j < degree; ++j) graph[i].push_back(rng() % n);
+        }
+        int start = rng() % n;
+        DominatorTree tree(graph);
+        tree.compute(start);
+
+        for (int step = 0; step < 60; ++step) {
+            int action = rng() % 10;
+            if (action == 0) {
+                assert(tree.add_node() == graph.size());
+                graph.emplace_back();
+            } else if (action < 6) {
+                int from = rng() % graph.size(), to = rng() % graph.size();
+                tree.insert_edge(from, to);
+                graph[from].push_back(to);
+            } else if (action < 9) {
+                int from = rng() % graph.size();
+                if (graph[from].empty()) continue;
+                int to = graph[from][rng() % graph[from].size()];
+                tree.delete_edge(from, to);
+                graph[from].erase(std::ranges::find(graph[from], to));
+            } else {
+                // splitting an edge, as done for critical edges
+                int from = rng() % graph.size();
+                if (graph[from].empty()) continue;
+                int to    = graph[from][rng() % graph[from].size()];
+                int split;
+                if (rng() % 2) {
+                    // split_edge keeps the position of the edge among the successors
+                    split = tree.split_edge(from, to);
+                    *std::ranges::find(graph[from], to) = split;
+                } else {
+                    split = tree.add_node();
+                    tree.insert_edge(from, split);
+                    tree.insert_edge(split, to);
+                    tree.delete_edge(from, to);
+                    graph[from].erase(std::ranges::find(graph[from], to));
+                    graph[from].push_back(split);
+                }
+                assert(split == graph.size());
+                graph.emplace_back();
+                graph[split].push_back(to);
+            }
+            ++updates;
+            assert(tree.get_immediate_dominators() == recompute(graph, start));
+        }
+
+        // renumbering keeps the tree
+        std::vector<int> order(graph.size());
+        for (int i = 0; i < order.size(); ++i) order[i] = i;
+        std::ranges::shuffle(order, rng);
+        std::vector<int> new_index(graph.size());
+        for (int i = 0; i < order.size(); ++i) new_index[order[i]] = i;
+        graph_type relabeled(graph.size());
+        for (int i = 0; i < graph.size(); ++i) {
+            for (int succ : graph[i]) relabeled[new_index[i]].push_back(new_index[succ]);
+        }
+        tree.relabel(order);
+        assert(tree.get_immediate_dominators() == recompute(relabeled, new_index[start]));
+        DominatorTree expected(relabeled);
+        expected.compute(new_index[start]);
+        assert(tree.get_dominator_tree_dfs_order() == expected.get_dominator_tree_dfs_order());
+        assert(tree.get_dfs_order() == expected.get_dfs_order());
+
+        // a tree seeded with known dominators can be updated right away
+        DominatorTree seeded(relabeled, new_index[start], expected.get_immediate_dominators());
+        int from = rng() % relabeled.size(), to = rng() % relabeled.size();
+        seeded.insert_edge(from, to);
+        relabeled[from].push_back(to);
+        assert(seeded.get_immediate_dominators() == recompute(relabeled, new_index[start]));
+    }
+    std::cout << "Checked " << updates << " updates" << std::endl;
+    return 0;
+}
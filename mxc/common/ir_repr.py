@@ -1,4 +1,6 @@
 # Utility types and functions for LLVM 15 IR generation
+from copy import copy
+
 from mxc.frontend.semantic.syntax_recorder import FunctionInfo, ClassInfo, builtin_function_infos, internal_array_info, VariableInfo
 from mxc.frontend.semantic.type import TypeBase
 
@@ -18,6 +20,13 @@ class IRCmdBase:
     def llvm(self) -> str:
         raise NotImplementedError()
 
+    def clone(self) -> "IRCmdBase":
+        """A copy of the command with its own operand lists, so that its operands can be renamed"""
+        cmd = copy(self)
+        cmd.var_def = self.var_def.copy()
+        cmd.var_use = self.var_use.copy()
+        return cmd
+
     def __repr__(self):
         return f'IR("{self.llvm()}")'
 
@@ -397,6 +406,10 @@ class IRFunction:
     is_leaf: bool
     no_effect: bool
     edge_to_remove: set[tuple[IRBlock, IRBlock]] # [from, to]
+    analyses: dict[str, object] # cached analysis results, see middle_end/analysis.py
+    updated_analyses: set[str] # analyses kept valid by the running pass, see middle_end/analysis.py
+    value_ranges: dict[str, tuple[int, int]] # intervals of i32 variables found by SCCP
+    allocation_table: dict[str, object] | None # set by the register allocator, see backend/regalloc.py
 
     def __init__(self, info: FunctionInfo, chain: BlockChain = None):
         self.info = info
@@ -404,6 +417,10 @@ class IRFunction:
         self.is_leaf = False
         self.no_effect = info.no_effect
         self.edge_to_remove = set()
+        self.analyses = {}
+        self.updated_analyses = set()
+        self.value_ranges = {}
+        self.allocation_table = None
 
     def llvm(self):
         if self.is_declare():
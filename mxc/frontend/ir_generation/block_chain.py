@@ -209,16 +209,15 @@ class BlockChain:
         visited = set()
         result = []
 
-        def dfs(block: IRBlock):
+        # preorder, with an explicit stack so that long functions do not hit the recursion limit
+        stack = [self.header if self.header else unreachable_block]
+        while stack:
+            block = stack.pop()
             if block in visited:
-                return
+                continue
             visited.add(block)
             result.append(block)
-            for succ in block.successors:
-                dfs(succ)
-
-        start_block = self.header if self.header else unreachable_block
-        dfs(start_block)
+            stack.extend(reversed(block.successors))
 
         return result
 
@@ -34,7 +34,9 @@ class FunctionInfo:
     param_ir_names: list[str]
     local_vars: list[VariableInfo]
     is_member: bool
-    no_effect: bool
+    no_effect: bool  # calls can be removed if the result is unused
+    read_only: bool  # no memory is modified, so calls with the same arguments and memory state are equal
+    pure: bool  # the result only depends on the arguments
 
     def __init__(self, name: str = "", ir_name: str = "", ret_type: TypeBase = None, param_types: list[TypeBase] = None,
                  param_ir_names: list[str] = None,
@@ -47,6 +49,8 @@ class FunctionInfo:
         self.local_vars = []
         self.is_member = is_member
         self.no_effect = no_effect
+        self.read_only = False
+        self.pure = False
 
     @staticmethod
     def from_function_type(func: FunctionType):
@@ -0,0 +1,89 @@
+"""Type-based and allocation-site alias analysis.
+
+Memory is split into disjoint partitions that can never alias each other:
+- every global variable
+- every member of every class (the internal `%.arr` type of multidimensional arrays included)
+- the elements of arrays, one partition per element type
+
+Within a partition, two addresses are known to be equal if they are computed from the same base pointer
+with the same index, and known to be different if they use different constant indexes or their base pointers
+come from different allocation sites (`malloc` or `__new_*_array__` calls) in the function.
+"""
+from enum import Enum
+
+from mxc.common.ir_repr import IRFunction, IRCall, IRGetElementPtr
+from mxc.frontend.semantic.syntax_recorder import ClassInfo
+from mxc.middle_end.purity import ALLOCATORS
+
+
+class AliasResult(Enum):
+    NO_ALIAS = 0
+    MAY_ALIAS = 1
+    MUST_ALIAS = 2
+
+
+class MemoryLocation:
+    partition: str | None  # None if the address can not be classified, such a location may alias anything
+    base: str
+    index: str
+    member: str | None
+
+    def __init__(self, partition: str | None, base: str, index: str = "0", member: str | None = None):
+        self.partition = partition
+        self.base = base
+        self.index = index
+        self.member = member
+
+    def key(self):
+        return self.partition, self.base, self.index, self.member
+
+
+def is_constant(var: str) -> bool:
+    return not var.startswith("%") and not var.startswith("@")
+
+
+class AliasAnalysis:
+    geps: dict[str, IRGetElementPtr]
+    allocation_sites: set[str]
+
+    def __init__(self, function: IRFunction):
+        self.geps = {}
+        self.allocation_sites = set()
+        for block in function.blocks:
+            for cmd in block:
+                if isinstance(cmd, IRGetElementPtr):
+                    self.geps[cmd.dest] = cmd
+                elif isinstance(cmd, IRCall) and cmd.var_def and cmd.func.ir_name in ALLOCATORS:
+                    self.allocation_sites.add(cmd.dest)
+
+    def get_location(self, addr: str) -> MemoryLocation:
+        if addr.startswith("@"):
+            return MemoryLocation(addr, addr)
+        gep = self.geps.get(addr)
+        if gep is None:
+            return MemoryLocation(None, addr)
+        if isinstance(gep.typ, ClassInfo):
+            return MemoryLocation(f"{gep.typ.ir_name}.{gep.member}", gep.ptr, gep.arr_index, gep.member)
+        return MemoryLocation(f"{gep.typ.ir_name}[]", gep.ptr, gep.arr_index)
+
+    def get_root(self, ptr: str) -> str:
+        """The pointer the address computation of `ptr` starts from"""
+        while ptr in self.geps:
+            ptr = self.geps[ptr].ptr
+        return ptr
+
+    def alias(self, a: MemoryLocation, b: MemoryLocation) -> AliasResult:
+        if a.partition is None or b.partition is None:
+            return AliasResult.MAY_ALIAS
+        if a.partition != b.partition:
+            return AliasResult.NO_ALIAS
+        if a.base == b.base:
+            if a.index == b.index:
+                return AliasResult.MUST_ALIAS
+            if is_constant(a.index) and is_constant(b.index):
+                return AliasResult.NO_ALIAS
+            return AliasResult.MAY_ALIAS
+        root_a, root_b = self.get_root(a.base), self.get_root(b.base)
+        if root_a != root_b and root_a in self.allocation_sites and root_b in self.allocation_sites:
+            return AliasResult.NO_ALIAS
+        return AliasResult.MAY_ALIAS
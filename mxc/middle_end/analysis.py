@@ -0,0 +1,171 @@
+"""Analyses shared between optimization passes.
+
+Every analysis is computed on first request and cached in `IRFunction.analyses`.
+Passes declare which analyses they preserve; the pass manager drops the rest
+(and everything derived from them) after the pass has run.
+
+A pass that edits the CFG can keep the (post) dominator tree valid through the
+incremental updates of `dominator.DominatorTree`, see `get_updatable_dominator_tree`.
+"""
+import time
+from typing import Any, Callable
+
+from mxc.common import dominator
+from mxc.common.ir_repr import IRFunction
+from mxc.middle_end.utils import mark_blocks, build_control_flow_graph, collect_defs, collect_def_sites, collect_uses, collect_type_map
+
+# Analyses that only depend on the shape of the control flow graph
+BLOCK_INDEX = "block_index"
+CFG = "cfg"
+DOMINATOR_TREE = "dominator_tree"
+POST_DOMINATOR_TREE = "post_dominator_tree"
+DOMINANCE_FRONTIER_PRED = "dominance_frontier_pred"
+# Analyses that depend on the instructions
+DEFS = "defs"
+DEF_SITES = "def_sites"
+USES = "uses"
+TYPE_MAP = "type_map"
+
+CFG_ANALYSES = frozenset({BLOCK_INDEX, CFG, DOMINATOR_TREE, POST_DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED})
+INSTRUCTION_ANALYSES = frozenset({DEFS, DEF_SITES, USES, TYPE_MAP})
+ALL_ANALYSES = CFG_ANALYSES | INSTRUCTION_ANALYSES
+
+
+def _compute_block_index(function: IRFunction):
+    mark_blocks(function.blocks)
+    return len(function.blocks)
+
+
+def _compute_cfg(function: IRFunction) -> dominator.CFGAnalysis:
+    """The native analysis object, which computes every other CFG analysis lazily from one copy of the graph"""
+    get_analysis(function, BLOCK_INDEX)
+    return dominator.CFGAnalysis(*build_control_flow_graph(function.blocks))
+
+
+def _compute_dominator_tree(function: IRFunction) -> dominator.DominatorTreeView:
+    cfg = get_analysis(function, CFG)
+    return dominator.DominatorTreeView(cfg.dominator_tree(), cfg.dominator_tree_children())
+
+
+def _compute_post_dominator_tree(function: IRFunction) -> tuple[dominator.DominatorTreeView, int]:
+    """Returns the post dominator tree and the index of the virtual end node"""
+    cfg = get_analysis(function, CFG)
+    return dominator.DominatorTreeView(cfg.post_dominator_tree()), len(cfg)
+
+
+def _compute_dominance_frontier_pred(function: IRFunction) -> list[memoryview]:
+    return dominator.rows(get_analysis(function, CFG).dominance_frontier_predecessors())
+
+
+def _compute_uses(function: IRFunction) -> dict[str, list]:
+    """Use sites of every local variable, including parameters and the return address"""
+    defs = get_analysis(function, DEFS) | {"ret_addr"} | {
+        param + ".param" for param in function.info.param_ir_names
+    }
+    return collect_uses(defs, function.blocks)
+
+
+ANALYSES: dict[str, Callable[[IRFunction], Any]] = {
+    BLOCK_INDEX: _compute_block_index,
+    CFG: _compute_cfg,
+    DOMINATOR_TREE: _compute_dominator_tree,
+    POST_DOMINATOR_TREE: _compute_post_dominator_tree,
+    DOMINANCE_FRONTIER_PRED: _compute_dominance_frontier_pred,
+    DEFS: collect_defs,
+    DEF_SITES: collect_def_sites,
+    USES: _compute_uses,
+    TYPE_MAP: collect_type_map,
+}
+
+# An analysis is stale as soon as any analysis it was derived from is stale
+DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    CFG: (BLOCK_INDEX,),
+    DOMINATOR_TREE: (CFG,),
+    POST_DOMINATOR_TREE: (CFG,),
+    DOMINANCE_FRONTIER_PRED: (CFG,),
+    USES: (DEFS,),
+}
+
+
+class AnalysisStatistics:
+    hits: dict[str, int]
+    misses: dict[str, int]
+    time: dict[str, float]
+
+    def __init__(self):
+        self.hits = {name: 0 for name in ANALYSES}
+        self.misses = {name: 0 for name in ANALYSES}
+        self.time = {name: 0.0 for name in ANALYSES}
+
+    def report(self) -> str:
+        lines = [f"{'Analysis':<26}{'Hits':>8}{'Misses':>8}{'Time (s)':>10}"]
+        for name in ANALYSES:
+            lines.append(f"{name:<26}{self.hits[name]:>8}{self.misses[name]:>8}{self.time[name]:>10.3f}")
+        return "\n".join(lines)
+
+
+statistics = AnalysisStatistics()
+
+
+def get_analysis(function: IRFunction, name: str):
+    """Returns the cached result of an analysis, computing it if necessary.
+    The result is shared, so callers must not modify it."""
+    cache = function.analyses
+    if name in cache:
+        statistics.hits[name] += 1
+        return cache[name]
+    statistics.misses[name] += 1
+    start = time.perf_counter()
+    result = ANALYSES[name](function)
+    # Time spent on nested requests is attributed to the nested analyses as well
+    statistics.time[name] += time.perf_counter() - start
+    cache[name] = result
+    return result
+
+
+def get_updatable_dominator_tree(function: IRFunction, name: str) -> dominator.DominatorTree | None:
+    """Returns the cached dominator tree (DOMINATOR_TREE) or post dominator tree (POST_DOMINATOR_TREE) as a tree that
+    can be updated along with the CFG, or None if it is not cached. The tree is not recomputed, and keeps the node
+    indices of the analysis, the virtual end node of the post dominator tree included."""
+    tree = function.analyses.get(name)
+    if tree is None:
+        return None
+    if name == POST_DOMINATOR_TREE:
+        tree = tree[0]
+    if isinstance(tree, dominator.DominatorTree):
+        return tree
+    blocks = function.blocks
+    if name == DOMINATOR_TREE:
+        graph, start = [[succ.index for succ in block.successors] for block in blocks], 0
+    else:
+        graph = [[pred.index for pred in block.predecessors] for block in blocks]
+        graph.append([block.index for block in blocks if not block.successors])
+        start = len(blocks)
+    return dominator.DominatorTree(graph, start, list(tree.get_immediate_dominators()))
+
+
+def set_analysis(function: IRFunction, name: str, result):
+    """Caches a result updated by the running pass, which must declare the analysis as preserved.
+    It is kept even if the analyses it was derived from are dropped after the pass."""
+    function.analyses[name] = result
+    function.updated_analyses.add(name)
+
+
+def invalidate_analyses(function: IRFunction, preserved: frozenset[str] | set[str] = frozenset()):
+    """Drops every cached analysis that is not preserved or derived from an analysis that is not preserved,
+    unless the pass has updated it with `set_analysis`"""
+    cache = function.analyses
+    updated = function.updated_analyses & preserved
+    function.updated_analyses = set()
+    stale = {name for name in cache if name not in preserved}
+    changed = True
+    while changed:
+        changed = False
+        for name in cache:
+            if name in stale or name in updated:
+                continue
+            if any(dep in stale for dep in DEPENDENCIES.get(name, ())):
+                stale.add(name)
+                changed = True
+    for name in stale:
+        del cache[name]
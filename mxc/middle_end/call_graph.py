@@ -0,0 +1,78 @@
+from mxc.common.ir_repr import IRModule, IRFunction, IRCall
+
+
+class CallGraph:
+    """Call graph of the function definitions in a module, keyed by ir_name.
+    Builtins only appear as callees."""
+    functions: dict[str, IRFunction]
+    callees: dict[str, set[str]]
+    callers: dict[str, set[str]]
+
+    def __init__(self, ir: IRModule):
+        self.functions = {}
+        self.callees = {}
+        self.callers = {}
+        for function in ir.functions:
+            if function.is_declare():
+                continue
+            name = function.info.ir_name
+            self.functions[name] = function
+            self.callees[name] = {cmd.func.ir_name
+                                  for block in function.blocks
+                                  for cmd in block
+                                  if isinstance(cmd, IRCall)}
+        for name in self.functions:
+            self.callers[name] = set()
+        for caller, callees in self.callees.items():
+            for callee in callees:
+                if callee in self.callers:
+                    self.callers[callee].add(caller)
+
+    def bottom_up_sccs(self) -> list[list[IRFunction]]:
+        """Strongly connected components in reverse topological order: callees come before their callers"""
+        index: dict[str, int] = {}
+        low_link: dict[str, int] = {}
+        on_stack: set[str] = set()
+        stack: list[str] = []
+        sccs: list[list[IRFunction]] = []
+
+        for root in self.functions:
+            if root in index:
+                continue
+            # iterative Tarjan's algorithm, each frame is (node, iterator over its callees)
+            index[root] = low_link[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            frames = [(root, iter(self.callees[root]))]
+            while frames:
+                node, callees = frames[-1]
+                for callee in callees:
+                    if callee not in self.functions:
+                        continue
+                    if callee not in index:
+                        index[callee] = low_link[callee] = len(index)
+                        stack.append(callee)
+                        on_stack.add(callee)
+                        frames.append((callee, iter(self.callees[callee])))
+                        break
+                    if callee in on_stack:
+                        low_link[node] = min(low_link[node], index[callee])
+                else:
+                    frames.pop()
+                    if frames:
+                        parent = frames[-1][0]
+                        low_link[parent] = min(low_link[parent], low_link[node])
+                    if low_link[node] == index[node]:
+                        scc = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            scc.append(self.functions[member])
+                            if member == node:
+                                break
+                        sccs.append(scc)
+        return sccs
+
+    def is_recursive(self, function: IRFunction) -> bool:
+        name = function.info.ir_name
+        return name in self.callees[name]
@@ -1,8 +1,10 @@
 from collections import defaultdict
 
-from mxc.common.ir_repr import IRFunction, IRRet, UnreachableBlock, IRPhi, IRBranch, IRJump, BBExit, IRBinOp
+from mxc.common.ir_repr import IRFunction, IRRet, UnreachableBlock, IRPhi, IRBranch, IRJump, BBExit, IRBinOp, IRCmdBase
 from mxc.common.ir_repr import IRBlock
 from mxc.common.renamer import renamer
+from mxc.middle_end.analysis import BLOCK_INDEX, DOMINATOR_TREE, POST_DOMINATOR_TREE, get_updatable_dominator_tree, \
+    set_analysis, invalidate_analyses
 from mxc.middle_end.utils import rearrange_in_rpo, mark_blocks
 
 
@@ -94,19 +96,67 @@ def remove_unreachable(function: IRFunction):
 
 
 def copy_propagation(function: IRFunction):
-    rename_map: dict[str, str] = {}
+    """Replaces copies by their source in a single sweep, and removes them. The copies are `add x, 0` and the phis
+    whose operands are all the same value, ignoring the phi itself.
+    Copies are merged into the class of their source in a union-find, whose representatives are never copies.
+    A phi is checked again whenever the class of one of its operands grows, so that chains and cycles of copies
+    through phis collapse in the same sweep."""
+    parent: dict[str, str] = {}  # the copies, each mapped to a value of the class of its source
+    phi_users: dict[str, list[IRPhi]] = defaultdict(list)  # representative -> phis using a value of its class
+    worklist: list[IRPhi] = []
+
+    def find(var: str) -> str:
+        root = var
+        while root in parent:
+            root = parent[root]
+        while var != root:
+            parent[var], var = root, parent[var]
+        return root
+
+    def union(copy: str, source: str):
+        copy, source = find(copy), find(source)
+        if copy == source:
+            return
+        parent[copy] = source
+        users = phi_users.pop(copy, None)
+        if users:
+            phi_users[source] += users
+            worklist.extend(users)
+
+    def simplify(phi: IRPhi):
+        if phi.dest in parent:
+            return
+        dest, value = find(phi.dest), None
+        for var in phi.var_use:
+            var = find(var)
+            if var == dest or var == value:
+                continue
+            if value is not None:
+                return
+            value = var
+        if value is not None:
+            union(dest, value)
+
     for block in function.blocks:
         for cmd in block.cmds:
             if isinstance(cmd, IRPhi):
-                if len(cmd.sources) == 1:
-                    rename_map[cmd.dest] = cmd.var_use[0]
-            elif isinstance(cmd, IRBinOp):
-                if cmd.op == "add" and cmd.rhs == "0":
-                    rename_map[cmd.dest] = cmd.lhs
-    if not rename_map: return
+                for var in cmd.var_use:
+                    phi_users[find(var)].append(cmd)
+                simplify(cmd)
+            elif isinstance(cmd, IRBinOp) and cmd.op == "add" and cmd.rhs == "0":
+                union(cmd.dest, cmd.lhs)
+            while worklist:
+                simplify(worklist.pop())
+    if not parent: return
     for block in function.blocks:
+        cmds = []
         for cmd in block.cmds:
-            cmd.var_use = [rename_map.get(var, var) for var in cmd.var_use]
+            if cmd.var_def and cmd.var_def[0] in parent and (isinstance(cmd, IRPhi) or isinstance(cmd, IRBinOp)):
+                continue
+            if any(var in parent for var in cmd.var_use):
+                cmd.var_use = [find(var) for var in cmd.var_use]
+            cmds.append(cmd)
+        block.cmds = cmds
 
 def remove_critical_edge(function: IRFunction):
     blocks = function.blocks
@@ -119,9 +169,18 @@ def remove_critical_edge(function: IRFunction):
     ]
     if not critical_edges: return
 
+    # the cached dominator trees are updated with every split instead of being computed again
+    num_blocks = len(blocks)
+    dom_tree = get_updatable_dominator_tree(function, DOMINATOR_TREE)
+    post_dom_tree = get_updatable_dominator_tree(function, POST_DOMINATOR_TREE)  # the end node is num_blocks
+
     new_blocks = []
     for block, succ in critical_edges:
         split = IRBlock(renamer.get_name("split"))
+        if dom_tree is not None:
+            dom_tree.split_edge(block.index, succ.index)
+        if post_dom_tree is not None:
+            post_dom_tree.split_edge(succ.index, block.index)
         new_blocks.append(split)
         split.successors = [succ]
         split.predecessors = [block]
@@ -139,3 +198,245 @@ def remove_critical_edge(function: IRFunction):
 
     mark_blocks(function.blocks)
     rearrange_in_rpo(function)
+
+    order = [block.index for block in function.blocks]
+    mark_blocks(function.blocks)  # the indices must follow the relabeled trees
+    if len(order) != num_blocks + len(new_blocks):
+        # unreachable blocks were dropped, so the trees cannot be relabeled and are recomputed
+        invalidate_analyses(function)
+        return
+    set_analysis(function, BLOCK_INDEX, len(function.blocks))
+    if dom_tree is not None:
+        dom_tree.relabel(order)
+        set_analysis(function, DOMINATOR_TREE, dom_tree)
+    if post_dom_tree is not None:
+        # the split blocks come after the end node in the post dominator tree, and the end node goes last
+        post_dom_tree.relabel([ind if ind < num_blocks else ind + 1 for ind in order] + [num_blocks])
+        set_analysis(function, POST_DOMINATOR_TREE, (post_dom_tree, len(order)))
+
+
+def is_phi_branch_block(block: IRBlock, use_sites: dict[str, list[tuple[IRCmdBase, IRBlock]]]) -> bool:
+    """The block only merges values and branches on one of them, and none of the merged values is used
+    outside the block except by phis of its successors on the edges leaving it"""
+    if not isinstance(block.cmds[-1], IRBranch) or not all(isinstance(cmd, IRPhi) for cmd in block.cmds[:-1]):
+        return False
+    for phi in block.cmds[:-1]:
+        for user, user_block in use_sites.get(phi.dest, []):
+            if user is block.cmds[-1]:
+                continue
+            if not isinstance(user, IRPhi) or user_block not in block.successors:
+                return False
+            if any(source is not block for source, value in zip(user.sources, user.var_use) if value == phi.dest):
+                return False
+    return True
+
+
+def thread_edge(pred: IRBlock, block: IRBlock, target: IRBlock):
+    """Redirects the edge `pred -> block` to `target`, which `block` branches to when entered from `pred`"""
+    incoming = {phi.dest: phi.var_use[phi.sources.index(pred)] for phi in block.cmds[:-1]}
+    for phi in target.cmds:
+        if not isinstance(phi, IRPhi):
+            break
+        value = phi.var_use[phi.sources.index(block)]
+        phi.sources.append(pred)
+        phi.var_use.append(incoming.get(value, value))
+    for phi in block.cmds[:-1]:
+        ind = phi.sources.index(pred)
+        del phi.sources[ind], phi.var_use[ind]
+    pred.successors[pred.successors.index(block)] = target
+    block.predecessors.remove(pred)
+    target.predecessors.append(pred)
+
+
+def remove_edge(block: IRBlock, succ: IRBlock):
+    """Removes `block` from the predecessors and phi sources of `succ`"""
+    succ.predecessors = [pred for pred in succ.predecessors if pred is not block]
+    for phi in succ.cmds:
+        if not isinstance(phi, IRPhi):
+            break
+        entries = [(source, value) for source, value in zip(phi.sources, phi.var_use) if source is not block]
+        phi.sources = [source for source, _ in entries]
+        phi.var_use = [value for _, value in entries]
+
+
+def remove_dead_blocks(function: IRFunction):
+    """Removes the blocks left without predecessors, and the phi entries coming from them"""
+    entry = function.blocks[0]
+    dead = set()
+    worklist = [block for block in function.blocks if block is not entry and not block.predecessors]
+    while worklist:
+        block = worklist.pop()
+        dead.add(block)
+        for succ in block.successors:
+            if isinstance(succ, UnreachableBlock) or block not in succ.predecessors:
+                continue
+            remove_edge(block, succ)
+            if succ is not entry and not succ.predecessors and succ not in dead:
+                worklist.append(succ)
+    function.blocks = [block for block in function.blocks if block not in dead]
+
+
+def jump_threading(function: IRFunction):
+    """Threads the predecessors of a block that branches on a phi of `true` and `false` (as built for
+    short-circuit booleans) directly to the successor the phi value decides"""
+    threaded = False
+    changed = True
+    while changed:
+        changed = False
+        use_sites: dict[str, list[tuple[IRCmdBase, IRBlock]]] = {}
+        for block in function.blocks:
+            for cmd in block.cmds:
+                for var in cmd.var_use:
+                    use_sites.setdefault(var, []).append((cmd, block))
+        for block in function.blocks:
+            if not block.predecessors or not is_phi_branch_block(block, use_sites):
+                continue
+            branch = block.cmds[-1]
+            cond = next((phi for phi in block.cmds[:-1] if phi.dest == branch.cond), None)
+            if cond is None:
+                continue
+            for pred, value in list(zip(cond.sources, cond.var_use)):
+                if value not in ("true", "false") or pred is block or pred.successors.count(block) != 1:
+                    continue
+                target = block.successors[0 if value == "true" else 1]
+                if target is block or isinstance(target, UnreachableBlock) or target in pred.successors:
+                    continue
+                thread_edge(pred, block, target)
+                changed = threaded = True
+
+    if threaded:
+        remove_dead_blocks(function)
+        mark_blocks(function.blocks)
+        copy_propagation(function)
+
+
+def get_phis(block: IRBlock) -> list[IRPhi]:
+    phis = []
+    for cmd in block.cmds:
+        if not isinstance(cmd, IRPhi):
+            break
+        phis.append(cmd)
+    return phis
+
+
+def simplify_cfg(function: IRFunction):
+    """Simplifies the control flow graph to a fixed point:
+    - branches on a constant condition or to the same block twice become jumps
+    - a block is merged into its only predecessor if that predecessor jumps to it
+    - a block that only jumps somewhere else is bypassed by its predecessors
+    Blocks left without predecessors are removed.
+    """
+    entry = function.blocks[0]
+    removed: set[IRBlock] = set()
+    rename_map: dict[str, str] = {}
+    worklist = list(reversed(function.blocks))
+
+    def resolve(var: str) -> str:
+        while var in rename_map:
+            var = rename_map[var]
+        return var
+
+    def remove_block(block: IRBlock):
+        stack = [block]
+        while stack:
+            block = stack.pop()
+            removed.add(block)
+            for succ in block.successors:
+                if isinstance(succ, UnreachableBlock) or block not in succ.predecessors:
+                    continue
+                remove_edge(block, succ)
+                worklist.append(succ)
+                if succ is not entry and not succ.predecessors and succ not in removed:
+                    stack.append(succ)
+
+    def fold_branch(block: IRBlock) -> bool:
+        branch = block.cmds[-1]
+        if not isinstance(branch, IRBranch):
+            return False
+        true_dest, false_dest = block.successors
+        if true_dest is false_dest:
+            kept = true_dest
+            # both edges were merged into a single phi entry, or there is one entry per edge
+            if true_dest.predecessors.count(block) == 2:
+                true_dest.predecessors.remove(block)
+                for phi in get_phis(true_dest):
+                    ind = phi.sources.index(block)
+                    del phi.sources[ind], phi.var_use[ind]
+        elif resolve(branch.cond) in ("true", "false"):
+            kept, dropped = (true_dest, false_dest) if resolve(branch.cond) == "true" else (false_dest, true_dest)
+            if not isinstance(dropped, UnreachableBlock):
+                remove_edge(block, dropped)
+                worklist.append(dropped)
+                if dropped is not entry and not dropped.predecessors:
+                    remove_block(dropped)
+        else:
+            return False
+        block.successors = [kept]
+        block.cmds[-1] = IRJump(BBExit(block, 0))
+        return True
+
+    def merge_successor(block: IRBlock) -> bool:
+        if not isinstance(block.cmds[-1], IRJump):
+            return False
+        succ = block.successors[0]
+        if (succ is block or succ is entry or isinstance(succ, UnreachableBlock)
+                or len(succ.predecessors) != 1):
+            return False
+        phis = get_phis(succ)
+        for phi in phis:
+            rename_map[phi.dest] = phi.var_use[0]
+        block.cmds = block.cmds[:-1] + succ.cmds[len(phis):]
+        terminator = block.cmds[-1]
+        for exit_ in (getattr(terminator, "jump_dest", None), getattr(terminator, "true_dest", None),
+                      getattr(terminator, "false_dest", None)):
+            if exit_ is not None:
+                exit_.block = block
+        block.successors = succ.successors
+        for next_block in block.successors:
+            if isinstance(next_block, UnreachableBlock):
+                continue
+            next_block.predecessors = [block if pred is succ else pred for pred in next_block.predecessors]
+            for phi in get_phis(next_block):
+                phi.sources = [block if source is succ else source for source in phi.sources]
+        removed.add(succ)
+        return True
+
+    def bypass(block: IRBlock) -> bool:
+        if block is entry or len(block.cmds) != 1 or not isinstance(block.cmds[0], IRJump):
+            return False
+        succ = block.successors[0]
+        if succ is block or isinstance(succ, UnreachableBlock):
+            return False
+        phis = get_phis(succ)
+        values = [phi.var_use[phi.sources.index(block)] for phi in phis]
+        changed = False
+        for pred in list(block.predecessors):
+            if pred.successors.count(block) != 1 or pred in succ.predecessors:
+                continue
+            pred.successors[pred.successors.index(block)] = succ
+            block.predecessors.remove(pred)
+            succ.predecessors.append(pred)
+            for phi, value in zip(phis, values):
+                phi.sources.append(pred)
+                phi.var_use.append(value)
+            worklist.append(pred)
+            changed = True
+        if changed and not block.predecessors:
+            remove_block(block)
+        return changed
+
+    while worklist:
+        block = worklist.pop()
+        if block in removed:
+            continue
+        if fold_branch(block) or merge_successor(block):
+            worklist.append(block)
+        elif bypass(block):
+            worklist.append(block.successors[0])
+
+    function.blocks = [block for block in function.blocks if block not in removed]
+    mark_blocks(function.blocks)
+    if rename_map:
+        for block in function.blocks:
+            for cmd in block.cmds:
+                cmd.var_use = [resolve(var) for var in cmd.var_use]
@@ -1,6 +1,9 @@
 from collections import deque
-from mxc.common.ir_repr import IRBranch, IRRet, IRStore, IRCall, IRCmdBase, IRJump, IRFunction
-from .utils import collect_commands, collect_var_use
+from mxc.common.ir_repr import IRBranch, IRRet, IRStore, IRCall, IRCmdBase, IRJump, IRFunction, IRBlock, IRPhi, BBExit, \
+    UnreachableBlock
+from .analysis import get_analysis, invalidate_analyses, BLOCK_INDEX, DEF_SITES, POST_DOMINATOR_TREE
+from .cfg_transform import remove_edge, remove_dead_blocks
+from .utils import collect_commands, collect_var_use, mark_blocks
 
 
 def build_node(cmds: list[IRCmdBase]):
@@ -66,3 +69,135 @@ def naive_dce(function: IRFunction):
             function.is_leaf = False
             if cmd.var_def and cmd.var_def[0] not in var_use:
                 cmd.var_def = []
+
+
+def has_side_effect(cmd: IRCmdBase) -> bool:
+    if isinstance(cmd, IRStore) or isinstance(cmd, IRRet) or isinstance(cmd, IRJump):
+        return True
+    if isinstance(cmd, IRCall):
+        return cmd.tail_call or not cmd.func.no_effect
+    return False
+
+
+def find_back_edge_sources(blocks: list[IRBlock]) -> set[IRBlock]:
+    """Blocks with an edge to a block on the DFS stack, i.e. the latches of the loops"""
+    sources = set()
+    on_stack = {blocks[0]}
+    visited = {blocks[0]}
+    stack = [(blocks[0], iter(blocks[0].successors))]
+    while stack:
+        block, successors = stack[-1]
+        succ = next(successors, None)
+        if succ is None:
+            on_stack.discard(block)
+            stack.pop()
+        elif isinstance(succ, UnreachableBlock):
+            continue
+        elif succ in on_stack:
+            sources.add(block)
+        elif succ not in visited:
+            visited.add(succ)
+            on_stack.add(succ)
+            stack.append((succ, iter(succ.successors)))
+    return sources
+
+
+def aggressive_dce(function: IRFunction):
+    """Mark-sweep dead code elimination on the SSA def-use graph.
+
+    Only the commands with side effects are assumed live. A command is live if a live command uses its result,
+    a phi makes the terminators of its sources live, and a block with a live command makes the branches it is
+    control dependent on live. Dead cycles of phis are removed, and a dead branch becomes a jump to its immediate
+    post dominator, removing the blocks that only it could reach.
+    Loops are kept, as removing them may make a non-terminating program terminate.
+    Returns False if nothing was removed.
+    """
+    blocks = function.blocks
+    def_sites = get_analysis(function, DEF_SITES)
+    reverse_dom_tree, end_node = get_analysis(function, POST_DOMINATOR_TREE)
+    immediate_post_dominator = reverse_dom_tree.get_immediate_dominators()
+
+    # control_dependence[b] are the blocks whose branch decides whether b is executed,
+    # found by walking up the post dominator tree from their successors
+    control_dependence: list[list[IRBlock]] = [[] for _ in blocks]
+    for block in blocks:
+        if not isinstance(block.cmds[-1], IRBranch):
+            continue
+        for succ in set(block.successors):
+            runner = succ.index
+            while runner != immediate_post_dominator[block.index] and 0 <= runner < end_node:
+                control_dependence[runner].append(block)
+                runner = immediate_post_dominator[runner]
+
+    live: set[int] = set()
+    live_blocks: set[IRBlock] = set()
+    used: set[str] = set()  # variables used by live commands
+    worklist: list[tuple[IRBlock, IRCmdBase]] = []
+
+    def mark(block: IRBlock, cmd: IRCmdBase):
+        if id(cmd) not in live:
+            live.add(id(cmd))
+            worklist.append((block, cmd))
+
+    def mark_block(block: IRBlock):
+        if block not in live_blocks:
+            live_blocks.add(block)
+            for controlling in control_dependence[block.index]:
+                mark(controlling, controlling.cmds[-1])
+
+    latches = find_back_edge_sources(blocks)
+    for block in blocks:
+        for cmd in block.cmds:
+            if has_side_effect(cmd):
+                mark(block, cmd)
+        # a branch that cannot be replaced by a jump to its post dominator
+        if block in latches or not 0 <= immediate_post_dominator[block.index] < end_node:
+            mark(block, block.cmds[-1])
+
+    while worklist:
+        block, cmd = worklist.pop()
+        used.update(cmd.var_use)
+        for var in cmd.var_use:
+            if var in def_sites:
+                def_block, def_ind = def_sites[var]
+                mark(def_block, def_block.cmds[def_ind])
+        if isinstance(cmd, IRPhi):
+            # the value depends on the way the block is entered
+            for source in cmd.sources:
+                mark(source, source.cmds[-1])
+                mark_block(source)
+        if not isinstance(cmd, IRJump):
+            mark_block(block)
+
+    function.is_leaf = True
+    unused_results = False
+    for block in blocks:
+        for cmd in block.cmds:
+            if isinstance(cmd, IRCall):
+                function.is_leaf = False
+                unused_results |= bool(cmd.var_def) and cmd.dest not in used
+    if not unused_results and all(id(cmd) in live for block in blocks for cmd in block.cmds):
+        return False
+
+    cfg_changed = False
+    for block in blocks:
+        terminator = block.cmds[-1]
+        block.cmds = [cmd for cmd in block.cmds if id(cmd) in live]
+        for cmd in block.cmds:
+            if isinstance(cmd, IRCall) and cmd.var_def and cmd.dest not in used:
+                cmd.var_def = []
+        if id(terminator) in live:
+            continue
+        # a dead branch: whichever way it goes, execution reaches the post dominator without doing anything
+        target = blocks[immediate_post_dominator[block.index]]
+        for succ in set(block.successors):
+            remove_edge(block, succ)
+        block.successors = [target]
+        target.predecessors.append(block)
+        block.cmds.append(IRJump(BBExit(block, 0)))
+        cfg_changed = True
+
+    if cfg_changed:
+        remove_dead_blocks(function)
+        mark_blocks(function.blocks)
+        invalidate_analyses(function)
@@ -0,0 +1,153 @@
+"""Module level dead code elimination.
+
+- Functions that are not reachable from @main over call edges are dropped, and so are unused builtin declarations
+- Parameters of internal functions that are never used are removed, together with the arguments at every call site
+- Globals that are only ever stored to are dropped along with the stores
+- Globals and strings that are not referenced any more are dropped
+"""
+from copy import copy
+
+from mxc.common.ir_repr import IRModule, IRFunction, IRCall, IRStore
+from mxc.middle_end.call_graph import CallGraph
+from mxc.middle_end.dce import naive_dce
+
+
+def remove_unreachable_functions(ir: IRModule):
+    call_graph = CallGraph(ir)
+    reachable = {"@main"}
+    worklist = ["@main"]
+    while worklist:
+        name = worklist.pop()
+        for callee in call_graph.callees.get(name, ()):
+            if callee not in reachable:
+                reachable.add(callee)
+                worklist.append(callee)
+    ir.functions = [function for function in ir.functions if function.info.ir_name in reachable]
+
+
+def collect_live_vars(function: IRFunction, dead_params: dict[str, set[int]]) -> set[str]:
+    """Variables the effects of the function depend on, ignoring arguments passed to parameters that are
+    (assumed to be) dead. Like `naive_dce`, only stores, control flow and calls with side effects are roots."""
+    operands: dict[str, list[str]] = {}
+    worklist = []
+    for block in function.blocks:
+        for cmd in block:
+            uses = cmd.var_use
+            if isinstance(cmd, IRCall) and cmd.func.ir_name in dead_params:
+                dead = dead_params[cmd.func.ir_name]
+                uses = [arg for i, arg in enumerate(uses) if i not in dead]
+            if cmd.var_def and (not isinstance(cmd, IRCall) or cmd.func.no_effect):
+                operands[cmd.var_def[0]] = uses
+            else:
+                worklist.extend(uses)
+    live = set()
+    while worklist:
+        var = worklist.pop()
+        if var not in live:
+            live.add(var)
+            worklist.extend(operands.get(var, ()))
+    return live
+
+
+def find_dead_params(functions: list[IRFunction]) -> dict[str, set[int]]:
+    """Optimistically assume every parameter is dead, then revive the used ones until a fixed point is reached.
+    A parameter that only flows into dead parameters (e.g. in a recursive call) stays dead."""
+    dead_params = {function.info.ir_name: set(range(len(function.info.param_ir_names))) for function in functions}
+    changed = True
+    while changed:
+        changed = False
+        for function in functions:
+            dead = dead_params[function.info.ir_name]
+            if not dead:
+                continue
+            live = collect_live_vars(function, dead_params)
+            for i in list(dead):
+                if function.info.param_ir_names[i] + ".param" in live:
+                    dead.remove(i)
+                    changed = True
+    return {name: dead for name, dead in dead_params.items() if dead}
+
+
+def remove_dead_params(ir: IRModule) -> bool:
+    functions = [function for function in ir.functions
+                 if not function.is_declare() and function.info.ir_name != "@main"]
+    dead_params = find_dead_params(functions)
+    if not dead_params:
+        return False
+    # the function info is shared with the frontend, so the changed functions get their own copies
+    new_infos = {}
+    for function in functions:
+        if function.info.ir_name in dead_params:
+            dead = dead_params[function.info.ir_name]
+            info = copy(function.info)
+            info.param_types = [typ for i, typ in enumerate(info.param_types) if i not in dead]
+            info.param_ir_names = [name for i, name in enumerate(info.param_ir_names) if i not in dead]
+            function.info = new_infos[info.ir_name] = info
+    for function in ir.functions:
+        if function.is_declare():
+            continue
+        for block in function.blocks:
+            for cmd in block:
+                if isinstance(cmd, IRCall) and cmd.func.ir_name in dead_params:
+                    dead = dead_params[cmd.func.ir_name]
+                    cmd.var_use = [arg for i, arg in enumerate(cmd.var_use) if i not in dead]
+                    cmd.func = new_infos[cmd.func.ir_name]
+        # the computation of the removed arguments may be dead now
+        naive_dce(function)
+    return True
+
+
+def remove_store_only_globals(ir: IRModule) -> bool:
+    loaded = set()
+    stored = set()
+    for function in ir.functions:
+        if function.is_declare():
+            continue
+        for block in function.blocks:
+            for cmd in block:
+                if isinstance(cmd, IRStore):
+                    stored.add(cmd.addr)
+                    loaded.add(cmd.src)
+                else:
+                    loaded.update(cmd.var_use)
+    loaded.update(var.value for var in ir.globals)
+    store_only = {var.name for var in ir.globals if var.name in stored and var.name not in loaded}
+    if not store_only:
+        return False
+    for function in ir.functions:
+        if function.is_declare():
+            continue
+        for block in function.blocks:
+            block.cmds = [cmd for cmd in block.cmds if not (isinstance(cmd, IRStore) and cmd.addr in store_only)]
+        naive_dce(function)
+    return True
+
+
+def remove_unreferenced_globals(ir: IRModule):
+    referenced = {var
+                  for function in ir.functions if not function.is_declare()
+                  for block in function.blocks
+                  for cmd in block
+                  for var in cmd.var_use if var.startswith("@")}
+    # values of globals may refer to other globals or strings
+    changed = True
+    while changed:
+        changed = False
+        for var in ir.globals:
+            if var.name in referenced and var.value.startswith("@") and var.value not in referenced:
+                referenced.add(var.value)
+                changed = True
+    ir.globals = [var for var in ir.globals if var.name in referenced]
+    ir.strings = [string for string in ir.strings if string.name in referenced]
+
+
+def global_dead_code_elimination(ir: IRModule):
+    remove_unreachable_functions(ir)
+    # removing stores may kill parameters and removing arguments may kill loads, iterate until nothing changes
+    changed = True
+    while changed:
+        changed = remove_store_only_globals(ir)
+        changed |= remove_dead_params(ir)
+    # calls whose arguments were dead may have been the only calls to some functions
+    remove_unreachable_functions(ir)
+    remove_unreferenced_globals(ir)
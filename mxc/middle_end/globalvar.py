@@ -1,45 +1,110 @@
 from mxc.common.renamer import renamer
-from mxc.common.ir_repr import IRFunction, IRLoad, IRStore, IRRet, IRAlloca
-
-
-def get_variables_to_inline(function: IRFunction) -> tuple[list[str], list[str], dict[str, str]]:
+from mxc.common.ir_repr import IRModule, IRFunction, IRBlock, IRLoad, IRStore, IRRet, IRAlloca, IRCall
+from mxc.middle_end.call_graph import CallGraph
+from mxc.middle_end.utils import compute_loop_depths
+
+K = 8  # maximum number of global variables inlined into a function
+LOOP_WEIGHT = 10  # estimated number of iterations of a loop
+MAX_LOOP_DEPTH = 4
+
+
+class GlobalModRef:
+    """Global variables a function may read (ref) or write (mod), including those accessed by its callees"""
+    ref: set[str]
+    mod: set[str]
+
+    def __init__(self):
+        self.ref = set()
+        self.mod = set()
+
+    def touches(self, global_var: str) -> bool:
+        return global_var in self.ref or global_var in self.mod
+
+
+def compute_mod_ref(call_graph: CallGraph) -> dict[str, GlobalModRef]:
+    """Mod/ref summaries of the user functions, computed bottom-up over the call graph.
+    Builtins never access global variables, so they have no summary."""
+    summaries: dict[str, GlobalModRef] = {}
+    for scc in call_graph.bottom_up_sccs():
+        # functions in the same SCC may call each other, so they share a summary
+        summary = GlobalModRef()
+        scc_names = {function.info.ir_name for function in scc}
+        for function in scc:
+            global_var_count, stored_global_vars, _ = get_global_variables(function)
+            summary.ref.update(global_var_count.keys() - stored_global_vars)
+            summary.mod.update(stored_global_vars)
+            for callee in call_graph.callees[function.info.ir_name]:
+                if callee in summaries and callee not in scc_names:
+                    summary.ref.update(summaries[callee].ref)
+                    summary.mod.update(summaries[callee].mod)
+        for name in scc_names:
+            summaries[name] = summary
+    return summaries
+
+
+def get_block_weights(function: IRFunction) -> dict[IRBlock, int]:
+    depths = compute_loop_depths(function.blocks)
+    return {block: LOOP_WEIGHT ** min(depths.get(block, 0), MAX_LOOP_DEPTH) for block in function.blocks}
+
+
+def is_tail_position(block: IRBlock, index: int) -> bool:
+    """Whether the command at `index` is a call immediately followed by the return of the block"""
+    return (index + 2 == len(block.cmds) and isinstance(block.cmds[index], IRCall)
+            and isinstance(block.cmds[-1], IRRet))
+
+
+def get_variables_to_inline(function: IRFunction,
+                            mod_ref: dict[str, GlobalModRef]) -> tuple[list[str], list[str], dict[str, str]]:
     """
-    Get the global variables that are frequently used in the function
+    Get the global variables whose inlining saves the most (loop-weighted) memory accesses
 
-    Currently, only leaf functions are considered
-    A maximum of 8 global variables are considered
+    Inlining costs a load at the entry, a store at every return if the variable is stored,
+    a saved register or a reload around every call, and a store before every call that may access the variable
+    A maximum of K global variables are considered
     """
 
-    if not function.is_leaf:
-        return [], [], {}
-
-    global_var_count, stored_global_vars, global_var_types = get_global_variables(function)
+    weights = get_block_weights(function)
+    global_var_count, stored_global_vars, global_var_types = get_global_variables(function, weights)
 
-    K = 8
-    chosen_global_vars = sorted(global_var_count.keys(), key=lambda x: global_var_count[x], reverse=True)[:K]
-    global_var_count = {k: v for k, v in global_var_count.items() if k in chosen_global_vars}
-    # stored_global_vars = stored_global_vars.intersection(chosen_global_vars)
+    gain = {var: count - weights[function.blocks[0]] for var, count in global_var_count.items()}
+    for block in function.blocks:
+        weight = weights.get(block, 0)
+        for ind, cmd in enumerate(block.cmds):
+            if isinstance(cmd, IRRet) and not (ind > 0 and is_tail_position(block, ind - 1)):
+                for var in stored_global_vars:
+                    gain[var] -= weight
+            elif is_tail_position(block, ind):
+                for var in stored_global_vars:
+                    gain[var] -= weight
+            elif isinstance(cmd, IRCall):
+                # the local copy has to be kept in a saved register or reloaded after the call
+                callee = mod_ref.get(cmd.func.ir_name)
+                for var in gain:
+                    gain[var] -= weight * (1 + (var in stored_global_vars and callee is not None and callee.touches(var)))
+
+    chosen_global_vars = sorted((var for var in gain if gain[var] > 0), key=lambda x: (-gain[x], x))[:K]
     stored_global_vars = [var for var in chosen_global_vars if
                           var in stored_global_vars]  # keep the order to ensure reproducibility
     return chosen_global_vars, stored_global_vars, global_var_types
 
 
-def get_global_variables(function):
+def get_global_variables(function: IRFunction, weights: dict[IRBlock, int] = None):
     global_var_count: dict[str, int] = {}
     stored_global_vars = set()
     global_var_types: dict[str, str] = {}
     for block in function.blocks:
+        weight = weights.get(block, 0) if weights is not None else 1
         for cmd in block.cmds:
             if isinstance(cmd, IRLoad):
                 addr = cmd.src
                 if addr[0] == '@':
                     global_var_types[addr] = cmd.typ
-                    global_var_count[addr] = global_var_count.get(addr, 0) + 1
+                    global_var_count[addr] = global_var_count.get(addr, 0) + weight
             elif isinstance(cmd, IRStore):
                 addr = cmd.mem_dest
                 if addr[0] == '@':
                     global_var_types[addr] = cmd.typ
-                    global_var_count[addr] = global_var_count.get(addr, 0) + 1
+                    global_var_count[addr] = global_var_count.get(addr, 0) + weight
                     stored_global_vars.add(addr)
     return global_var_count, stored_global_vars, global_var_types
 
@@ -51,25 +116,55 @@ def get_local_name(global_var: str):
 def _inline_global_variables(function: IRFunction,
                              global_variables: list[str],
                              stored_global_vars: list[str],
-                             global_var_types: dict[str, str]):
+                             global_var_types: dict[str, str],
+                             mod_ref: dict[str, GlobalModRef]):
     if not global_variables:
         return
     local_names = {global_var: get_local_name(global_var) for global_var in global_variables}
+
+    def store_back(global_vars: list[str]):
+        store_cmds = []
+        for global_var in global_vars:
+            local_ptr_name = local_names[global_var]
+            local_val_name = renamer.get_name(local_ptr_name.removesuffix('.ptr') + '.val')
+            typ = global_var_types[global_var]
+            store_cmds.append(IRLoad(local_val_name, local_ptr_name, typ))
+            store_cmds.append(IRStore(global_var, local_val_name, typ))
+        return store_cmds
+
+    def reload(global_vars: list[str]):
+        load_cmds = []
+        for global_var in global_vars:
+            local_ptr_name = local_names[global_var]
+            local_val_name = renamer.get_name(local_ptr_name.removesuffix('.ptr') + '.val')
+            typ = global_var_types[global_var]
+            load_cmds.append(IRLoad(local_val_name, global_var, typ))
+            load_cmds.append(IRStore(local_ptr_name, local_val_name, typ))
+        return load_cmds
+
     for block in function.blocks:
-        for cmd in block.cmds:
+        new_cmds = []
+        for ind, cmd in enumerate(block.cmds):
             if isinstance(cmd, IRLoad) or isinstance(cmd, IRStore):
                 addr = cmd.addr
                 if addr in local_names:
                     cmd.addr = local_names[addr]
-        if block.cmds and isinstance(block.cmds[-1], IRRet):
-            store_cmds = []
-            for global_var in stored_global_vars:
-                local_ptr_name = local_names[global_var]
-                local_val_name = renamer.get_name(local_ptr_name.removesuffix('.ptr') + '.val')
-                typ = global_var_types[global_var]
-                store_cmds.append(IRLoad(local_val_name, local_ptr_name, typ))
-                store_cmds.append(IRStore(global_var, local_val_name, typ))
-            block.cmds = block.cmds[:-1] + store_cmds + block.cmds[-1:]
+                new_cmds.append(cmd)
+            elif is_tail_position(block, ind):
+                # write everything back before the call, so that it stays a tail call
+                new_cmds.extend(store_back(stored_global_vars))
+                new_cmds.append(cmd)
+            elif isinstance(cmd, IRCall) and cmd.func.ir_name in mod_ref:
+                callee = mod_ref[cmd.func.ir_name]
+                new_cmds.extend(store_back([var for var in stored_global_vars if callee.touches(var)]))
+                new_cmds.append(cmd)
+                new_cmds.extend(reload([var for var in global_variables if var in callee.mod]))
+            elif isinstance(cmd, IRRet) and not (ind > 0 and is_tail_position(block, ind - 1)):
+                new_cmds.extend(store_back(stored_global_vars))
+                new_cmds.append(cmd)
+            else:
+                new_cmds.append(cmd)
+        block.cmds = new_cmds
 
     entry_block = function.blocks[0]
     allocas = [cmd for cmd in entry_block.cmds if isinstance(cmd, IRAlloca)]
@@ -77,24 +172,26 @@ def _inline_global_variables(function: IRFunction,
 
     for global_var in global_variables:
         local_ptr_name = local_names[global_var]
-        local_val_name = renamer.get_name(local_ptr_name.removesuffix('.ptr') + '.val')
-        typ = global_var_types[global_var]
-        allocas.append(IRAlloca(local_ptr_name, typ))
-        others.append(IRLoad(local_val_name, global_var, typ))
-        others.append(IRStore(local_ptr_name, local_val_name, typ))
+        allocas.append(IRAlloca(local_ptr_name, global_var_types[global_var]))
+    others.extend(reload(global_variables))
 
     others.extend([cmd for cmd in entry_block.cmds if not isinstance(cmd, IRAlloca)])
     entry_block.cmds = allocas + others
 
 
-def inline_global_variables(function: IRFunction):
+def inline_global_variables(ir: IRModule):
     """
     Convert frequently used global variables to local variables
 
     Load the global variable to a local variable at the beginning of the function, and store it back at the end.
-    Currently, only leaf functions are considered
+    Around calls, the variable is only written back if the callee may access it,
+    and only reloaded if the callee may modify it.
     """
 
-    global_variables, stored_global_vars, global_var_types = get_variables_to_inline(function)
-    _inline_global_variables(function, global_variables, stored_global_vars, global_var_types)
-    return global_variables, stored_global_vars, global_var_types
+    mod_ref = compute_mod_ref(CallGraph(ir))
+
+    def inline(function: IRFunction):
+        global_variables, stored_global_vars, global_var_types = get_variables_to_inline(function, mod_ref)
+        _inline_global_variables(function, global_variables, stored_global_vars, global_var_types, mod_ref)
+
+    ir.for_each_function_definition(inline)
@@ -1,16 +1,22 @@
-from copy import copy, deepcopy
+from bisect import bisect_right, insort
 from dataclasses import dataclass
-from collections import defaultdict, deque
-from typing import Optional, Dict, Set, List, Tuple
+from typing import Optional, Dict, List, Iterable
 
-from mxc.common.dominator import DominatorTree
-from mxc.common.ir_repr import IRBinOp, IRBlock, IRCmdBase, IRPhi, IRIcmp, IRGetElementPtr, IRFunction
+from mxc.common.ir_repr import IRBinOp, IRBlock, IRCmdBase, IRPhi, IRIcmp, IRGetElementPtr, IRFunction, IRLoad, \
+    IRStore, IRCall
 from mxc.common.renamer import renamer
+from mxc.frontend.semantic.syntax_recorder import builtin_function_infos
 from mxc.middle_end.cfg_transform import copy_propagation
-from mxc.middle_end.utils import mark_blocks, build_control_flow_graph, build_reverse_control_flow_graph
+from mxc.middle_end.analysis import get_analysis, DOMINATOR_TREE, POST_DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED
+from mxc.middle_end.memory_ssa import writes_memory
+from mxc.middle_end.utils import walk_tree
 
+COMMUTATIVE_OPS = ['add', 'mul', 'and', 'or', 'xor']
 
-@dataclass(frozen=True)
+
+# Expressions are hash-consed by the value table: there is a single object for every distinct expression,
+# so they are compared and hashed by identity.
+@dataclass(frozen=True, eq=False)
 class Expression:
     def depends_on(self) -> list[int]:
         return []
@@ -19,25 +25,41 @@ class Expression:
         return isinstance(self, Temporary)
 
 
-@dataclass(frozen=True)
-class BinOpExpression(Expression):
-    op: str  # Can be arithmetic op, icmp op, or 'gep'
-    v1: int
-    v2: int
-
-    @classmethod
-    def new(cls, op: str, v1: int, v2: int):
-        if op in ['add', 'mul', 'and', 'or', 'xor']:
-            return cls(op, min(v1, v2), max(v1, v2))
-        return cls(op, v1, v2)
+@dataclass(frozen=True, eq=False)
+class CompoundExpression(Expression):
+    op: str  # Can be arithmetic op, icmp op, or a gep, load or call key (see `expression_key`)
+    operands: tuple[int, ...]  # the values of the operands of the command, then the memory version it reads
 
     def depends_on(self) -> list[int]:
-        return [self.v1, self.v2]
+        return list(self.operands)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Temporary(Expression):
-    reg: str  # can be a register or a constant
+    reg: str  # can be a register or a constant, or `memory.<n>` for a memory version
+
+
+def expression_key(cmd: IRCmdBase) -> tuple[str, bool] | None:
+    """The op of the expression computed by the command, and whether it reads memory,
+    None if the command is not numbered as an expression"""
+    if isinstance(cmd, IRBinOp) or isinstance(cmd, IRIcmp):
+        return cmd.op, False
+    if isinstance(cmd, IRGetElementPtr):
+        return f"gep {cmd.typ.ir_name} {cmd.member}", False
+    if isinstance(cmd, IRLoad):
+        return f"load {cmd.typ}", True
+    if isinstance(cmd, IRCall) and cmd.dest:
+        func = cmd.func
+        # Builtins only read immutable strings, those returning a pointer allocate fresh memory
+        if func.ir_name in builtin_function_infos:
+            return (f"call {func.ir_name}", False) if func.no_effect and cmd.typ != "ptr" else None
+        if func.pure or func.read_only:
+            return f"call {func.ir_name}", not func.pure
+    return None
+
+
+def is_memory_write(cmd: IRCmdBase) -> bool:
+    return isinstance(cmd, IRStore) or isinstance(cmd, IRCall) and writes_memory(cmd)
 
 
 class ValueTable:
@@ -45,6 +67,25 @@ class ValueTable:
         self.expressions: Dict[Expression, int] = {}
         self.number = 0
         self.ir_expressions: list[IRCmdBase | Temporary] = []
+        self.compounds: dict[tuple[str, tuple[int, ...]], CompoundExpression] = {}
+        self.temporaries: dict[str, Temporary] = {}
+        self.memory_versions = 0
+
+    def compound(self, op: str, operands: tuple[int, ...]) -> CompoundExpression:
+        """The unique expression `op operands`, with the operands of commutative ops in canonical order"""
+        if op in COMMUTATIVE_OPS and operands[0] > operands[1]:
+            operands = (operands[1], operands[0])
+        key = (op, operands)
+        expr = self.compounds.get(key)
+        if expr is None:
+            expr = self.compounds[key] = CompoundExpression(op, operands)
+        return expr
+
+    def temporary(self, reg: str) -> Temporary:
+        expr = self.temporaries.get(reg)
+        if expr is None:
+            expr = self.temporaries[reg] = Temporary(reg)
+        return expr
 
     def query_or_assign(self, expr: Expression, ir_exp: IRCmdBase | None) -> int:
         if expr in self.expressions:
@@ -63,80 +104,168 @@ class ValueTable:
     def query(self, expr: Expression) -> Optional[int]:
         return self.expressions.get(expr)
 
-    def phi_translate(self, pred: IRBlock, succ: IRBlock,
-                      value: int, expr: Expression, phi_gen: dict[int, list[tuple[int, Temporary]]]) -> tuple[int, Expression]:
-        pred_index = succ.predecessors.index(pred)
-        translate = lambda v: phi_gen[v][pred_index][0] if v in phi_gen else v
-        if not isinstance(expr, BinOpExpression):
+    def new_memory_version(self) -> tuple[int, Temporary]:
+        tmp = self.temporary(f"memory.{self.memory_versions}")
+        self.memory_versions += 1
+        return self.assign(tmp), tmp
+
+    def phi_translate(self, pred_index: int, value: int, expr: Expression,
+                      phi_gen: dict[int, list[tuple[int, Temporary]]]) -> tuple[int, Expression]:
+        """Translates the expression through the phis of the successor, `pred_index` being the position of
+        the predecessor in its predecessor list"""
+        if not isinstance(expr, CompoundExpression):
             return phi_gen[value][pred_index] if value in phi_gen else (value, expr)
-        new_expr = BinOpExpression.new(
+        if not any(v in phi_gen for v in expr.operands):
+            return value, expr
+        new_expr = self.compound(
             expr.op,
-            translate(expr.v1),
-            translate(expr.v2)
+            tuple(phi_gen[v][pred_index][0] if v in phi_gen else v for v in expr.operands)
         )
-        if new_expr == expr:
+        if new_expr is expr:
             return value, expr
         return self.query_or_assign(new_expr, self.ir_expressions[value]), new_expr
 
-    def reconstruct(self, avail_out: dict[int, Temporary], value: int, expr: BinOpExpression):
-        new_ir_expr = deepcopy(self.ir_expressions[value])
-        for i in range(2):
-            v = expr.depends_on()[i]
-            if v in avail_out:
-                new_ir_expr.var_use[i] = avail_out[v].reg
+    def reconstruct(self, leaders: "LeaderSets", block: int, value: int, expr: CompoundExpression):
+        new_ir_expr = self.ir_expressions[value].clone()
+        # The memory version read by a load or a call is not an operand of the command
+        for i, v in enumerate(expr.operands[:len(new_ir_expr.var_use)]):
+            leader = leaders.get(block, v)
+            if leader is not None:
+                new_ir_expr.var_use[i] = leader.reg
             else:
                 temporary = self.ir_expressions[v]
                 operand = temporary.reg
                 assert not operand.startswith('%') or operand.endswith('.param'), \
                     f"Temporary {operand} not found in avail_out"
                 new_ir_expr.var_use[i] = operand
-        new_ir_expr.var_def[0] = renamer.get_name(new_ir_expr.var_def[0])
+        # Pointers and loaded values are named after a registered stem (".ptr", ".val"), so they may be unknown
+        dest = new_ir_expr.var_def[0]
+        if dest not in renamer.name_map:
+            renamer.register_name(dest)
+        new_ir_expr.var_def[0] = renamer.get_name(dest)
         return new_ir_expr
 
+
+class LeaderSets:
+    """
+    The leader of every value available at the end of every block (AVAIL_OUT).
+    A block only stores the leaders it defines or receives by insertion, and inherits the others from its
+    dominators, so that the sets are never copied down the dominator tree. The leader of a value in a block is
+    found among the blocks storing one, kept sorted by their preorder in the dominator tree.
+    """
+
+    def __init__(self, dominator_children: list[list[int]]):
+        n = len(dominator_children)
+        self.local: list[dict[int, Temporary]] = [{} for _ in range(n)]
+        self.definers: dict[int, list[int]] = {}  # value -> blocks storing a leader for it, in preorder
+        # The subtree of a block in the dominator tree is the preorder interval [enter, exit)
+        self.enter = [-1] * n
+        self.exit = [-1] * n
+        counter = 0
+
+        def enter(node: int):
+            nonlocal counter
+            self.enter[node] = counter
+            counter += 1
+
+        def exit(node: int):
+            self.exit[node] = counter
+
+        walk_tree(0, dominator_children.__getitem__, enter, exit)
+
+    def get(self, block: int, value: int) -> Temporary | None:
+        definers = self.definers.get(value)
+        if not definers:
+            return None
+        enter = self.enter[block]
+        if enter < 0:
+            return self.local[block].get(value)  # unreachable block
+        # The subtrees of the definers dominating the block are nested, so the last one in preorder is the closest
+        for ind in range(bisect_right(definers, enter, key=self.enter.__getitem__) - 1, -1, -1):
+            if self.exit[definers[ind]] > enter:
+                return self.local[definers[ind]][value]
+        return None
+
+    def set(self, block: int, value: int, leader: Temporary):
+        if value not in self.local[block]:
+            insort(self.definers.setdefault(value, []), block, key=self.enter.__getitem__)
+        self.local[block][value] = leader
+
+    def setdefault(self, block: int, value: int, leader: Temporary):
+        if self.get(block, value) is None:
+            self.set(block, value, leader)
+
+
 def clean(gen_set: dict[int, Expression], kill_set: dict[int, Temporary]):
     result = {}
     # Since Python 3.7, dict is ordered by insertion order
     # This feature is used to ensure that the gen_set is topologically sorted
     for value, expr in gen_set.items():
-        if isinstance(expr, Temporary) and value in kill_set:
-            continue
-        if (isinstance(expr, BinOpExpression)
-                and (expr.v1 not in result or expr.v2 not in result)):
+        if isinstance(expr, Temporary):
+            if value in kill_set:
+                continue
+        elif isinstance(expr, CompoundExpression) and any(v not in result for v in expr.operands):
             continue
         result[value] = expr
     return result
 
+
+def value_bits(values: Iterable[int]) -> int:
+    """The bitset of a set of value ids"""
+    bits = bytearray()
+    for value in values:
+        if value >> 3 >= len(bits):
+            bits.extend(bytes((value >> 3) + 1 - len(bits)))
+        bits[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(bits, "little")
+
+
 def build_sets(blocks: list[IRBlock],
                immediate_dominator: list[int],
                dominator_tree_order: list[int],
                post_dominator_tree_order: list[int],
+               memory_phis: list[bool],
+               leaders: LeaderSets,
                value_table: ValueTable) -> tuple[
-    list[dict[int, Temporary]],
     list[dict[int, Expression]],
     list[dict[int, list[tuple[int, Temporary]]]]]:
     n = len(blocks)
-    avail_out: list[dict[int, Temporary]] = [{} for _ in range(n)]
     antic_in: list[dict[int, Expression]] = [{} for _ in range(n)]
     phi_gen: list[dict[int, list[tuple[int, Temporary]]]] = [{} for _ in range(n)]
     tmp_gen: list[dict[int, Temporary]] = [{} for _ in range(n)]
+    # The memory is numbered like a variable: every write defines a new version, and the blocks where
+    # versions from different predecessors meet start with a memory phi
+    memory_in: list[tuple[int, Temporary] | None] = [None] * n
+    memory_out: list[tuple[int, Temporary] | None] = [None] * n
 
     # Phase 1
     for i in dominator_tree_order:
         block = blocks[i]
         exp_gen: dict[int, Expression] = {}
-        avail_out[i] = copy(avail_out[immediate_dominator[i]]) if i else {}
+        if i == 0 or memory_phis[i]:
+            memory_in[i] = value_table.new_memory_version()
+        else:
+            memory_in[i] = memory_out[immediate_dominator[i]]
+        memory = memory_in[i]
         for cmd in block.cmds:
+            if is_memory_write(cmd):
+                memory = value_table.new_memory_version()
+                tmp_gen[i].setdefault(*memory)
             if not cmd.var_def:
                 continue
             def_value = None
-            tmp_def = Temporary(cmd.var_def[0])
-            if isinstance(cmd, IRBinOp):
-                tmp_use = [Temporary(var) for var in cmd.var_use]
+            tmp_def = value_table.temporary(cmd.var_def[0])
+            key = expression_key(cmd)
+            if key is not None:
+                op, reads_memory = key
+                tmp_use = [value_table.temporary(var) for var in cmd.var_use]
                 val_use = [value_table.query_or_assign(tmp, None) for tmp in tmp_use]
+                if reads_memory:
+                    val_use.append(memory[0])
+                    tmp_use.append(memory[1])
                 for val, tmp in zip(val_use, tmp_use):
                     exp_gen.setdefault(val, tmp)
-                op = cmd.op
-                expr = BinOpExpression.new(op, *val_use)
+                expr = value_table.compound(op, tuple(val_use))
                 value = value_table.query_or_assign(expr, cmd)
                 exp_gen.setdefault(value, expr)
                 def_value = value
@@ -145,155 +274,166 @@ def build_sets(blocks: list[IRBlock],
             if not isinstance(cmd, IRPhi):
                 def_value = value_table.assign(tmp_def, def_value)
                 tmp_gen[i].setdefault(def_value, tmp_def)
-            avail_out[i].setdefault(def_value, tmp_def)
+            leaders.setdefault(i, def_value, tmp_def)
+        memory_out[i] = memory
         antic_in[i] = clean(exp_gen, tmp_gen[i])
 
     # Phase 1.5
     for i, block in enumerate(blocks):
         for phi in block.cmds:
             if not isinstance(phi, IRPhi): break
-            tmp_use = [Temporary(phi.lookup(pred)) for pred in block.predecessors]
+            tmp_use = [value_table.temporary(phi.lookup(pred)) for pred in block.predecessors]
             val_use = [value_table.query_or_assign(tmp, None) for tmp in tmp_use]
-            def_value = value_table.query(Temporary(phi.dest))
+            def_value = value_table.query(value_table.temporary(phi.dest))
             phi_gen[i][def_value] = list(zip(val_use, tmp_use))
+        if memory_phis[i] and memory_in[i] is not None:
+            phi_gen[i][memory_in[i][0]] = [memory_out[pred.index] for pred in block.predecessors]
 
-    # Phase 2
+    # Phase 2: a block is recomputed only when the ANTIC_IN of one of its successors changed
+    # since its last computation; the values of every set are also kept as a bitset
+    antic_bits = [value_bits(antic) for antic in antic_in]
+    dirty = bytearray([1]) * n
     converged = False
     while not converged:
         converged = True
         for i in post_dominator_tree_order:
+            if not dirty[i]:
+                continue
+            dirty[i] = 0
             block = blocks[i]
-            antic_out = {}
             if len(block.successors) == 0:
                 continue
             elif len(block.successors) > 1:
-                a1, a2 = (antic_in[succ.index] for succ in block.successors)
-                antic_out = {v: e for v, e in a1.items() if v in a2}
+                s1, s2 = (succ.index for succ in block.successors)
+                a1, a2 = antic_in[s1], antic_in[s2]
+                common = antic_bits[s1] & antic_bits[s2]
+                antic_out = a1 if common == antic_bits[s1] else {v: e for v, e in a1.items() if v in a2}
             else:
                 succ = block.successors[0]
                 succ_index = succ.index
                 a = antic_in[succ_index]
-                for v, e in a.items():
-                    v_, e_ = value_table.phi_translate(block, succ, v, e, phi_gen[succ_index])
-                    antic_out[v_] = e_
-            new_antic_in = copy(antic_in[i])
+                if phi_gen[succ_index]:
+                    pred_index = succ.predecessors.index(block)
+                    antic_out = {}
+                    for v, e in a.items():
+                        v_, e_ = value_table.phi_translate(pred_index, v, e, phi_gen[succ_index])
+                        antic_out[v_] = e_
+                else:
+                    antic_out = a  # nothing to translate
+            old_antic_in = antic_in[i]
+            if all(old_antic_in.get(v) is e for v, e in antic_out.items()):
+                continue  # ANTIC_IN is already clean, and contains ANTIC_OUT
+            new_antic_in = old_antic_in.copy()
             new_antic_in.update(antic_out)
             new_antic_in = clean(new_antic_in, tmp_gen[i])
-            if new_antic_in != antic_in[i]:
+            new_bits = value_bits(new_antic_in)
+            if new_bits != antic_bits[i] or new_antic_in != old_antic_in:
                 antic_in[i] = new_antic_in
+                antic_bits[i] = new_bits
+                for pred in block.predecessors:
+                    dirty[pred.index] = 1
                 converged = False
 
-    return avail_out, antic_in, phi_gen
+    return antic_in, phi_gen
+
 
 def insert(blocks: list[IRBlock],
            dominator_tree_order: list[int],
-           dominator_children: list[list[int]],
-           avail_out: list[dict[int, Temporary]],
+           leaders: LeaderSets,
            antic_in: list[dict[int, Expression]],
            phi_gen: list[dict[int, list[tuple[int, Temporary]]]],
            value_table: ValueTable):
     converged = False
     while not converged:
         converged = True
-        new_set: list[dict[int, Temporary]] = [{} for _ in range(len(blocks))]
         for i in dominator_tree_order:
             block = blocks[i]
             m = len(block.predecessors)
             if m > 1:
                 for value, expr in antic_in[i].items():
-                    if not isinstance(expr, BinOpExpression):
+                    if not isinstance(expr, CompoundExpression):
                         continue
                     if value in phi_gen[i]:
                         continue
-                    translated = [value_table.phi_translate(pred, block, value, expr, phi_gen[i])
-                                  for pred in block.predecessors]
-                    leaders = [(avail_out[pred.index].get(value[0]))
-                                  for value, pred in zip(translated, block.predecessors)]
-                    # if all(leaders):
+                    translated = [value_table.phi_translate(j, value, expr, phi_gen[i]) for j in range(m)]
+                    pred_leaders = [leaders.get(pred.index, vt) for (vt, _), pred in zip(translated, block.predecessors)]
+                    # if all(pred_leaders):
                     #     continue
                     converged = False
-                    typ = "i32" # Temporary fix
+                    typ = value_table.ir_expressions[value].dest_typ
                     for j, pred in enumerate(block.predecessors):
-                        if leaders[j]:
+                        if pred_leaders[j]:
                             continue
                         vt, et = translated[j]
-                        new_cmd = value_table.reconstruct(avail_out[pred.index], vt, et)
-                        typ = new_cmd.dest_typ
+                        new_cmd = value_table.reconstruct(leaders, pred.index, vt, et)
                         pred.cmds[-1:-1] = [new_cmd]
-                        new_set[pred.index][vt] = tmp = Temporary(new_cmd.var_def[0])
-                        avail_out[pred.index][vt] = tmp
-                        leaders[j] = tmp
+                        tmp = value_table.temporary(new_cmd.var_def[0])
+                        leaders.set(pred.index, vt, tmp)
+                        pred_leaders[j] = tmp
                         value_table.assign(tmp, vt)
-                    # noinspection PyUnboundLocalVariable
                     phi_cmd = IRPhi(
                         renamer.get_name("%.gvn_pre"),
                         typ,
-                        [(pred, leader.reg) for pred, leader in zip(block.predecessors, leaders)]
+                        [(pred, leader.reg) for pred, leader in zip(block.predecessors, pred_leaders)]
                     )
                     block.cmds[0:0] = [phi_cmd]
-                    new_set[i][value] = tmp = Temporary(phi_cmd.dest)
-                    avail_out[i][value] = tmp
+                    tmp = value_table.temporary(phi_cmd.dest)
+                    leaders.set(i, value, tmp)
                     value_table.assign(tmp, value)
-                    phi_gen[i][value] = list(zip((vt for vt, _ in translated), leaders))
-                avail_out[i].update(new_set[i])
-            for c in dominator_children[i]:
-                new_set[c].update(new_set[i])
-                avail_out[c].update(new_set[i])
+                    phi_gen[i][value] = list(zip((vt for vt, _ in translated), pred_leaders))
 
 
 def eliminate(blocks: list[IRBlock],
               immediate_dominator: list[int],
-              avail_out: list[dict[int, Temporary]],
+              leaders: LeaderSets,
               value_table: ValueTable):
     for i, block in enumerate(blocks):
-        avail_in = copy(avail_out[immediate_dominator[i]]) if i else {}
+        idom = immediate_dominator[i]
+        local: dict[int, Temporary] = {}
         new_cmds = []
         for cmd in block.cmds:
             if not cmd.var_def:
                 new_cmds.append(cmd)
                 continue
             var_def = cmd.var_def[0]
-            current_tmp = Temporary(var_def)
+            current_tmp = value_table.temporary(var_def)
             current_value = value_table.query(current_tmp)
-            leader = avail_in.get(current_value)
+            leader = leaders.get(idom, current_value) if idom >= 0 else None
+            if leader is None:
+                leader = local.get(current_value)
             if leader and leader.reg != var_def:
                 move_cmd = IRBinOp(var_def, "add", leader.reg, "0", cmd.dest_typ)
                 new_cmds.append(move_cmd)
             else:
                 new_cmds.append(cmd)
-            avail_in.setdefault(current_value, current_tmp)
+                local.setdefault(current_value, current_tmp)
         # Ensure phi nodes are at the beginning of the block (temporary fix)
         new_cmds = ([cmd for cmd in new_cmds if isinstance(cmd, IRPhi)]
                     + [cmd for cmd in new_cmds if not isinstance(cmd, IRPhi)])
         block.cmds = new_cmds
 
+
 def gvn_pre(function: IRFunction):
     blocks = function.blocks
-    mark_blocks(blocks)
-
-    cfg = build_control_flow_graph(blocks)
-    reverse_cfg, end_node = build_reverse_control_flow_graph(blocks)
 
-    dom_tree = DominatorTree(cfg)
-    dom_tree.compute()
+    dom_tree = get_analysis(function, DOMINATOR_TREE)
     immediate_dominator = dom_tree.get_immediate_dominators()
     dominator_tree_order = dom_tree.get_dominator_tree_dfs_order()
-    reverse_dom_tree = DominatorTree(reverse_cfg)
-    reverse_dom_tree.compute(end_node)
-    post_dominator_tree_order = reverse_dom_tree.get_dominator_tree_dfs_order()
-    post_dominator_tree_order.pop(0) # Remove the end node
+    reverse_dom_tree, _ = get_analysis(function, POST_DOMINATOR_TREE)
+    dominance_frontier_pred = get_analysis(function, DOMINANCE_FRONTIER_PRED)
+    post_dominator_tree_order = reverse_dom_tree.get_dominator_tree_dfs_order()[1:]  # Remove the end node
+    dominator_children = dom_tree.get_children()
 
-    dominator_children = [[] for _ in range(len(blocks))]
-    for i, dom in enumerate(immediate_dominator[1:]):
-        # immediate_dominator[0] is -1
-        dominator_children[dom].append(i + 1)
+    del dom_tree, reverse_dom_tree
 
-    del dom_tree, reverse_dom_tree, cfg, reverse_cfg
+    writers = [any(is_memory_write(cmd) for cmd in block.cmds) for block in blocks]
+    memory_phis = [any(writers[ind] for ind in preds) for preds in dominance_frontier_pred]
 
     value_table = ValueTable()
-    avail_out, antic_in, phi_gen = build_sets(
-        blocks, immediate_dominator, dominator_tree_order, post_dominator_tree_order, value_table)
-    insert(blocks, dominator_tree_order, dominator_children, avail_out, antic_in, phi_gen, value_table)
-    eliminate(blocks, immediate_dominator, avail_out, value_table)
+    leaders = LeaderSets(dominator_children)
+    antic_in, phi_gen = build_sets(blocks, immediate_dominator, dominator_tree_order, post_dominator_tree_order,
+                                   memory_phis, leaders, value_table)
+    insert(blocks, dominator_tree_order, leaders, antic_in, phi_gen, value_table)
+    eliminate(blocks, immediate_dominator, leaders, value_table)
 
     # copy_propagation(function)
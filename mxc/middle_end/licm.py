@@ -0,0 +1,118 @@
+"""Loop invariant code motion for address computations and loads.
+
+The typical candidates are the array headers: the `.data` and `.size` members of the rows of multidimensional
+arrays, and array members of classes, which are reloaded in every iteration of a loop over the array.
+A load is invariant if its address is invariant and memory SSA shows that no definition inside the loop
+may alias it. Loops are emitted rotated and guarded, so a load that is executed whenever the loop is entered
+(its block dominates every exit of the loop) can be hoisted into the preheader without versioning the loop.
+Calls to pure functions with invariant arguments are hoisted under the same condition.
+"""
+from mxc.common.renamer import renamer
+from mxc.common.ir_repr import IRFunction, IRBlock, IRCmdBase, IRPhi, IRJump, BBExit, IRLoad, IRGetElementPtr, \
+    IRBinOp, IRCall
+from mxc.middle_end.analysis import get_analysis, invalidate_analyses, DOMINATOR_TREE
+from mxc.middle_end.memory_opt import find_clobber
+from mxc.middle_end.memory_ssa import MemorySSA, LiveOnEntry
+from mxc.middle_end.utils import NaturalLoop, find_natural_loops, mark_blocks
+
+
+def insert_preheader(function: IRFunction, loop: NaturalLoop) -> IRBlock | None:
+    """Returns the block that is the only way into the loop, creating it if necessary"""
+    header = loop.header
+    outside_preds = [pred for pred in header.predecessors if pred not in loop.body]
+    if not outside_preds:
+        return None
+    if len(outside_preds) == 1 and len(outside_preds[0].successors) == 1:
+        return outside_preds[0]
+
+    preheader = IRBlock(renamer.get_name(header.name + ".preheader"))
+    preheader.predecessors = outside_preds
+    preheader.successors = [header]
+    for pred in outside_preds:
+        pred.successors = [preheader if succ is header else succ for succ in pred.successors]
+    header.predecessors = [pred for pred in header.predecessors if pred in loop.body] + [preheader]
+
+    for phi in header.cmds:
+        if not isinstance(phi, IRPhi):
+            break
+        inside = [(source, value) for source, value in zip(phi.sources, phi.var_use) if source in loop.body]
+        outside = [(source, value) for source, value in zip(phi.sources, phi.var_use) if source not in loop.body]
+        if len(outside) == 1:
+            value = outside[0][1]
+        else:
+            value = renamer.get_name(phi.dest)
+            preheader.add_cmd(IRPhi(value, phi.typ, outside))
+        phi.sources = [source for source, _ in inside] + [preheader]
+        phi.var_use = [value for _, value in inside] + [value]
+    preheader.add_cmd(IRJump(BBExit(preheader, 0)))
+
+    function.blocks.insert(function.blocks.index(header), preheader)
+    return preheader
+
+
+def is_invariant(cmd: IRCmdBase, loop_defs: set[str]) -> bool:
+    return all(var not in loop_defs for var in cmd.var_use)
+
+
+def hoist_from_loop(loop: NaturalLoop, preheader: IRBlock, mssa: MemorySSA, dom_order: list[int],
+                    dominates) -> None:
+    loop_defs = {var for block in loop.body for cmd in block for var in cmd.var_def}
+    exiting_blocks = loop.exiting_blocks()
+    hoisted: list[IRCmdBase] = []
+    for block in sorted(loop.body, key=lambda b: dom_order[b.index]):
+        guaranteed = bool(exiting_blocks) and all(dominates(block, exiting) for exiting in exiting_blocks)
+        kept = []
+        for cmd in block.cmds:
+            if isinstance(cmd, IRGetElementPtr) or isinstance(cmd, IRBinOp):
+                movable = is_invariant(cmd, loop_defs)
+            elif isinstance(cmd, IRLoad) and id(cmd) in mssa.uses:
+                clobber, _ = find_clobber(mssa, mssa.locations[id(cmd)], mssa.uses[id(cmd)])
+                movable = (guaranteed and is_invariant(cmd, loop_defs)
+                           and (isinstance(clobber, LiveOnEntry) or clobber.block not in loop.body))
+            elif isinstance(cmd, IRCall) and cmd.dest and cmd.func.pure:
+                movable = guaranteed and is_invariant(cmd, loop_defs)
+            else:
+                movable = False
+            if movable:
+                hoisted.append(cmd)
+                loop_defs.difference_update(cmd.var_def)
+            else:
+                kept.append(cmd)
+        block.cmds = kept
+    preheader.cmds = preheader.cmds[:-1] + hoisted + preheader.cmds[-1:]
+
+
+def loop_invariant_code_motion(function: IRFunction):
+    loops = find_natural_loops(function.blocks)
+    if not loops:
+        return
+    preheaders = []
+    for loop in loops:
+        preheader = insert_preheader(function, loop)
+        preheaders.append(preheader)
+        if preheader is not None:
+            for outer in loops:
+                if outer is not loop and loop.header in outer.body:
+                    outer.body.add(preheader)
+    mark_blocks(function.blocks)
+    invalidate_analyses(function)
+
+    dom_tree = get_analysis(function, DOMINATOR_TREE)
+    immediate_dominator = dom_tree.get_immediate_dominators()
+    dom_order = [0] * len(function.blocks)
+    for order, ind in enumerate(dom_tree.get_dominator_tree_dfs_order()):
+        dom_order[ind] = order
+
+    def dominates(a: IRBlock, b: IRBlock) -> bool:
+        ind = b.index
+        while ind >= 0:
+            if ind == a.index:
+                return True
+            ind = immediate_dominator[ind]
+        return False
+
+    mssa = MemorySSA(function)
+    # inner loops first, so that their invariants can move further out with the enclosing loop
+    for loop, preheader in sorted(zip(loops, preheaders), key=lambda item: len(item[0].body)):
+        if preheader is not None:
+            hoist_from_loop(loop, preheader, mssa, dom_order, dominates)
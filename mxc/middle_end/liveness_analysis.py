@@ -1,5 +1,5 @@
 from mxc.common.ir_repr import IRBlock, IRFunction, IRPhi
-from .utils import mark_blocks, collect_defs, collect_uses
+from .analysis import get_analysis, BLOCK_INDEX, DEFS, USES
 
 
 def init_live_out(blocks: list[IRBlock]):
@@ -11,26 +11,28 @@ def init_live_out(blocks: list[IRBlock]):
 def liveness_analysis(function: IRFunction):
     blocks: list[IRBlock] = function.blocks
 
-    mark_blocks(blocks)
-    defs = collect_defs(function)
-    defs.add("ret_addr")
-    defs.update({
+    get_analysis(function, BLOCK_INDEX)
+    defs = get_analysis(function, DEFS) | {"ret_addr"} | {
         param + ".param" for param in function.info.param_ir_names
-    })
-    use_sites = collect_uses(defs, blocks)
+    }
+    use_sites = get_analysis(function, USES)
     init_live_out(blocks)
     function.var_defs = defs
 
     def scan_block(block: IRBlock):
-        if block in visited: return
-        visited.add(block)
-        for cmd in block.cmds[::-1]:
-            cmd.live_out.add(var)
-            if var in cmd.var_def:
-                return
-        block.live_in.add(var)
-        for pred in block.predecessors:
-            scan_block(pred)
+        """Marks var live out of `block`, and at the end of every block it is live into"""
+        worklist = [block]
+        while worklist:
+            block = worklist.pop()
+            if block in visited: continue
+            visited.add(block)
+            for cmd in block.cmds[::-1]:
+                cmd.live_out.add(var)
+                if var in cmd.var_def:
+                    break
+            else:
+                block.live_in.add(var)
+                worklist.extend(block.predecessors)
 
     def scan_live_in(block: IRBlock, cmd_ind: int):
         for cmd in block.cmds[:cmd_ind][::-1]:
@@ -1,20 +1,33 @@
-from mxc.common import dominator
 from mxc.common.renamer import renamer
 from mxc.common.ir_repr import IRBlock, IRFunction, IRStore, IRAlloca, IRLoad, IRPhi, UnreachableBlock
-from mxc.middle_end.utils import mark_blocks, build_control_flow_graph
-
-
-def collect_mem_defs(blocks: list[IRBlock], allocas: set[str]):
-    # return [{var for cmd in block for var in cmd.var_def} for block in blocks]
-    return [{cmd.mem_dest
-             for cmd in block
-             if isinstance(cmd, IRStore) and cmd.mem_dest in allocas}
-            for block in blocks]
+from mxc.middle_end.analysis import get_analysis, BLOCK_INDEX, CFG, DOMINATOR_TREE
+from mxc.middle_end.utils import walk_tree, to_csr
+
+
+def collect_mem_defs_and_uses(blocks: list[IRBlock], allocas: list[str]) -> tuple[list[list[int]], list[list[int]]]:
+    """The blocks storing to every alloca, and the blocks loading from it before any store"""
+    variable_index = {pointer_name: ind for ind, pointer_name in enumerate(allocas)}
+    defs: list[list[int]] = [[] for _ in allocas]
+    uses: list[list[int]] = [[] for _ in allocas]
+    for ind, block in enumerate(blocks):
+        defined, used = set(), set()
+        for cmd in block:
+            if isinstance(cmd, IRStore):
+                var = variable_index.get(cmd.mem_dest)
+                if var is not None and var not in defined:
+                    defined.add(var)
+                    defs[var].append(ind)
+            elif isinstance(cmd, IRLoad):
+                var = variable_index.get(cmd.src)
+                if var is not None and var not in defined and var not in used:
+                    used.add(var)
+                    uses[var].append(ind)
+    return defs, uses
 
 
 def collect_allocas(blocks: list[IRBlock]):
     block = blocks[0]
-    return {cmd.dest for cmd in block if isinstance(cmd, IRAlloca)}, \
+    return [cmd.dest for cmd in block if isinstance(cmd, IRAlloca)], \
         {cmd.dest: cmd.typ for cmd in block if isinstance(cmd, IRAlloca)}
 
 
@@ -53,28 +66,25 @@ def mem2reg(function: IRFunction):
     blocks: list[IRBlock] = function.blocks
     n = len(blocks)
 
-    mark_blocks(blocks)
-    cfg = build_control_flow_graph(blocks)
-    allocas, type_map = collect_allocas(blocks)
-    defs = collect_mem_defs(blocks, allocas)
-    dominance_frontier_pred = dominator.get_indirect_predecessor_set_of_dominator_frontier(cfg)
-    phi_map = [
-        {pointer_name: PhiMap(pointer_name)
-         for pointer_name in set.union(*(
-            defs[pred] for pred in preds
-        ))}
-        if preds else {}
-        for preds in dominance_frontier_pred
-    ]
+    get_analysis(function, BLOCK_INDEX)
+    alloca_list, type_map = collect_allocas(blocks)
+    allocas = set(alloca_list)
+    # pruned SSA: an alloca only gets a phi in the blocks of the iterated dominance frontier of its stores
+    # where it is live on entry, so that no dead phi is created
+    defs, uses = collect_mem_defs_and_uses(blocks, alloca_list)
+    phi_blocks = get_analysis(function, CFG).place_phis(*to_csr(defs), *to_csr(uses))
+    offsets, targets = memoryview(phi_blocks.offsets), memoryview(phi_blocks.targets)
+    phi_map: list[dict[str, PhiMap]] = [{} for _ in range(n)]
+    for var, pointer_name in enumerate(alloca_list):
+        for ind in targets[offsets[var]:offsets[var + 1]]:
+            phi_map[ind][pointer_name] = PhiMap(pointer_name)
     stack: dict[str, list[str | IRUndefinedValue]] = {
         pointer_name: [IRUndefinedValue(type_map[pointer_name])]
         for pointer_name in allocas
     }
     rename_map: dict[str, str] = {}
-    visited = set()
 
-    def dfs(index: int):
-        visited.add(index)
+    def enter(index: int):
         for pointer_name, info in phi_map[index].items():
             stack[pointer_name].append(info.dest)
         for cmd in blocks[index]:
@@ -90,14 +100,8 @@ def mem2reg(function: IRFunction):
         for succ in blocks[index].successors:
             for pointer_name, info in phi_map[succ.index].items():
                 info.values[index] = stack[pointer_name][-1]
-            if succ.index not in visited:
-                dfs(succ.index)
-            else:
-                for cmd in succ:
-                    if not isinstance(cmd, IRPhi): break
-                    cmd.var_use = [
-                        rename_map.get(var, var) for var in cmd.var_use
-                    ]
+
+    def exit(index: int):
         for pointer_name, info in phi_map[index].items():
             stack[pointer_name].pop()
         for cmd in blocks[index]:
@@ -108,7 +112,15 @@ def mem2reg(function: IRFunction):
                               if (not isinstance(cmd, IRLoad) or cmd.src not in allocas)
                               and (not isinstance(cmd, IRStore) or cmd.mem_dest not in allocas)]
 
-    dfs(0)
+    # the values reaching a block are those at the end of its immediate dominator
+    walk_tree(0, get_analysis(function, DOMINATOR_TREE).get_children().__getitem__, enter, exit)
+    # the operands of the existing phis may come from loads in blocks entered after them
+    for block in blocks:
+        for cmd in block:
+            if not isinstance(cmd, IRPhi): break
+            cmd.var_use = [
+                rename_map.get(var, var) for var in cmd.var_use
+            ]
 
     for phi_map_item, block in zip(phi_map, blocks):
         if isinstance(block, UnreachableBlock):
@@ -0,0 +1,138 @@
+"""Memoization of pure recursive functions with small int parameters.
+
+The memo table is a direct-mapped int array of MEMO_TABLE_SIZE slots, allocated on the first call.
+Each slot holds [filled, key0, key1, value]. A lookup hits if the slot is filled and the keys match;
+otherwise the original body runs and overwrites the slot before returning.
+"""
+from mxc.common.ir_repr import IRModule, IRFunction, IRBlock, IRGlobal, IRLoad, IRStore, IRIcmp, IRBranch, IRJump, \
+    BBExit, IRCall, IRPhi, IRBinOp, IRGetElementPtr, IRRet
+from mxc.common.renamer import renamer
+from mxc.frontend.semantic.syntax_recorder import builtin_function_infos
+from mxc.frontend.semantic.type import builtin_types
+from mxc.middle_end.call_graph import CallGraph
+
+MEMO_TABLE_SIZE = 1 << 14  # number of slots, must be a power of two
+MEMO_SLOT_WIDTH = 4  # filled, key0, key1, value
+MEMO_MAX_PARAMS = 2
+HASH_MULTIPLIER = "-1640531535"  # 0x9E3779B1
+
+
+def is_memoizable(function: IRFunction, call_graph: CallGraph) -> bool:
+    info = function.info
+    return (info.pure and info.ir_name != "@main" and call_graph.is_recursive(function)
+            and info.ret_type.ir_name == "i32"
+            and 1 <= len(info.param_types) <= MEMO_MAX_PARAMS
+            and all(typ.ir_name == "i32" for typ in info.param_types)
+            and not function.blocks[0].predecessors)
+
+
+def link(block: IRBlock, *successors: IRBlock):
+    block.successors = list(successors)
+    for succ in successors:
+        succ.predecessors.append(block)
+
+
+def memoize_function(function: IRFunction, ir: IRModule):
+    info = function.info
+    params = [param + ".param" for param in info.param_ir_names]
+    int_type = builtin_types["int"]
+    table_ptr = renamer.get_name(info.ir_name + ".memo.ptr")
+    ir.globals.append(IRGlobal(table_ptr, "ptr", "null"))
+
+    old_entry = function.blocks[0]
+    entry = IRBlock(renamer.get_name("memo.entry"))
+    init = IRBlock(renamer.get_name("memo.init"))
+    init_loop = IRBlock(renamer.get_name("memo.init.loop"))
+    lookup = IRBlock(renamer.get_name("memo.lookup"))
+    checks = [IRBlock(renamer.get_name("memo.check")) for _ in params]
+    hit = IRBlock(renamer.get_name("memo.hit"))
+
+    # entry: allocate the table on the first call
+    old_table = renamer.get_name("%.memo.table")
+    is_null = renamer.get_name("%.memo.null")
+    entry.add_cmd(IRLoad(old_table, table_ptr, "ptr"))
+    entry.add_cmd(IRIcmp(is_null, "eq", "ptr", old_table, "null"))
+    entry.add_cmd(IRBranch(is_null, BBExit(entry, 0), BBExit(entry, 1)))
+    link(entry, init, lookup)
+
+    new_table = renamer.get_name("%.memo.table")
+    table_length = str(MEMO_TABLE_SIZE * MEMO_SLOT_WIDTH)
+    init.add_cmd(IRCall(new_table, builtin_function_infos["@__new_int_1d_array__"], [table_length]))
+    init.add_cmd(IRStore(table_ptr, new_table, "ptr"))
+    init.add_cmd(IRJump(BBExit(init, 0)))
+    link(init, init_loop)
+
+    # clear the filled flags
+    index = renamer.get_name("%.memo.i")
+    next_index = renamer.get_name("%.memo.i")
+    flag_ptr = renamer.get_name("%.memo.flag.ptr")
+    loop_cond = renamer.get_name("%.memo.cond")
+    init_loop.add_cmd(IRPhi(index, "i32", [(init, "0"), (init_loop, next_index)]))
+    init_loop.add_cmd(IRGetElementPtr(flag_ptr, int_type, new_table, arr_index=index))
+    init_loop.add_cmd(IRStore(flag_ptr, "0", "i32"))
+    init_loop.add_cmd(IRBinOp(next_index, "add", index, str(MEMO_SLOT_WIDTH), "i32"))
+    init_loop.add_cmd(IRIcmp(loop_cond, "slt", "i32", next_index, table_length))
+    init_loop.add_cmd(IRBranch(loop_cond, BBExit(init_loop, 0), BBExit(init_loop, 1)))
+    link(init_loop, init_loop, lookup)
+
+    # lookup: hash the arguments into a slot
+    table = renamer.get_name("%.memo.table")
+    lookup.add_cmd(IRPhi(table, "ptr", [(entry, old_table), (init_loop, new_table)]))
+    hash_value = params[0]
+    for param in params[1:]:
+        product = renamer.get_name("%.memo.hash")
+        lookup.add_cmd(IRBinOp(product, "mul", hash_value, HASH_MULTIPLIER, "i32"))
+        hash_value = renamer.get_name("%.memo.hash")
+        lookup.add_cmd(IRBinOp(hash_value, "add", product, param, "i32"))
+    slot = renamer.get_name("%.memo.slot")
+    lookup.add_cmd(IRBinOp(slot, "and", hash_value, str(MEMO_TABLE_SIZE - 1), "i32"))
+    slot_index = renamer.get_name("%.memo.index")
+    lookup.add_cmd(IRBinOp(slot_index, "mul", slot, str(MEMO_SLOT_WIDTH), "i32"))
+    field_ptrs = []
+    for offset in range(MEMO_SLOT_WIDTH):
+        field_index = renamer.get_name("%.memo.index")
+        field_ptr = renamer.get_name("%.memo.field.ptr")
+        lookup.add_cmd(IRBinOp(field_index, "add", slot_index, str(offset), "i32"))
+        lookup.add_cmd(IRGetElementPtr(field_ptr, int_type, table, arr_index=field_index))
+        field_ptrs.append(field_ptr)
+    filled_ptr, key_ptrs, value_ptr = field_ptrs[0], field_ptrs[1:-1], field_ptrs[-1]
+    filled = renamer.get_name("%.memo.filled")
+    is_filled = renamer.get_name("%.memo.filled")
+    lookup.add_cmd(IRLoad(filled, filled_ptr, "i32"))
+    lookup.add_cmd(IRIcmp(is_filled, "ne", "i32", filled, "0"))
+    lookup.add_cmd(IRBranch(is_filled, BBExit(lookup, 0), BBExit(lookup, 1)))
+    link(lookup, checks[0], old_entry)
+
+    # compare the keys one by one, fall back to the original body on a collision
+    for i, (check, param, key_ptr) in enumerate(zip(checks, params, key_ptrs)):
+        key = renamer.get_name("%.memo.key")
+        same_key = renamer.get_name("%.memo.same")
+        check.add_cmd(IRLoad(key, key_ptr, "i32"))
+        check.add_cmd(IRIcmp(same_key, "eq", "i32", key, param))
+        check.add_cmd(IRBranch(same_key, BBExit(check, 0), BBExit(check, 1)))
+        link(check, checks[i + 1] if i + 1 < len(checks) else hit, old_entry)
+
+    value = renamer.get_name("%.memo.value")
+    hit.add_cmd(IRLoad(value, value_ptr, "i32"))
+    hit.add_cmd(IRRet("i32", value))
+
+    # record the result before every return of the original body
+    for block in function.blocks:
+        ret = block.cmds[-1]
+        if not isinstance(ret, IRRet):
+            continue
+        block.cmds.pop()
+        block.add_cmd(IRStore(filled_ptr, "1", "i32"))
+        for param, key_ptr in zip(params, key_ptrs):
+            block.add_cmd(IRStore(key_ptr, param, "i32"))
+        block.add_cmd(IRStore(value_ptr, ret.value, "i32"))
+        block.add_cmd(ret)
+
+    function.blocks = [entry, init, init_loop, lookup] + checks + [hit] + function.blocks
+
+
+def memoize_pure_functions(ir: IRModule):
+    call_graph = CallGraph(ir)
+    for function in call_graph.functions.values():
+        if is_memoizable(function, call_graph):
+            memoize_function(function, ir)
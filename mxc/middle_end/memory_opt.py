@@ -0,0 +1,122 @@
+"""Load and store elimination on memory SSA.
+
+- Store-to-load forwarding: a load from the address a dominating store wrote to, with no possibly aliasing
+  definition in between, is replaced by the stored value
+- Redundant load elimination: a load is replaced by a dominating load from the same address that is reached
+  by the same memory state
+- Dead store elimination: a store is removed if a later store to the same address post-dominates it,
+  and nothing that may read the address comes in between
+"""
+from mxc.common.ir_repr import IRFunction, IRLoad, IRStore
+from mxc.middle_end.alias import AliasResult, MemoryLocation
+from mxc.middle_end.analysis import get_analysis, DOMINATOR_TREE, POST_DOMINATOR_TREE
+from mxc.middle_end.memory_ssa import MemorySSA, MemoryAccess, MemoryDef
+
+WALK_LIMIT = 64  # maximum number of definitions visited when walking up a chain of memory SSA definitions
+
+
+def find_clobber(mssa: MemorySSA, location: MemoryLocation, access: MemoryAccess) -> tuple[MemoryAccess, str | None]:
+    """Walks up from `access` past the stores that do not alias `location`.
+    Returns the first access that may define `location`, and the stored value if it is a store to that exact address.
+    """
+    for _ in range(WALK_LIMIT):
+        if not isinstance(access, MemoryDef) or access.partition is None:
+            return access, None
+        result = mssa.alias.alias(location, access.location)
+        if result == AliasResult.MUST_ALIAS:
+            return access, access.cmd.src
+        if result == AliasResult.MAY_ALIAS:
+            return access, None
+        access = access.defining
+    return access, None
+
+
+def eliminate_loads(function: IRFunction, mssa: MemorySSA) -> dict[str, str]:
+    """Returns the values that replace the eliminated loads"""
+    blocks = function.blocks
+    dom_tree = get_analysis(function, DOMINATOR_TREE)
+    immediate_dominator = dom_tree.get_immediate_dominators()
+    replace: dict[str, str] = {}
+    available: dict[tuple, str] = {}  # (clobbering access, address, type) -> loaded value
+    open_blocks: list[tuple[int, list[tuple]]] = []  # blocks on the dominator tree path, with their new entries
+
+    for ind in dom_tree.get_dominator_tree_dfs_order():
+        while open_blocks and open_blocks[-1][0] != immediate_dominator[ind]:
+            for key in open_blocks.pop()[1]:
+                del available[key]
+        added = []
+        for cmd in blocks[ind]:
+            if not isinstance(cmd, IRLoad) or id(cmd) not in mssa.uses:
+                continue
+            location = mssa.locations[id(cmd)]
+            clobber, value = find_clobber(mssa, location, mssa.uses[id(cmd)])
+            if value is not None and clobber.cmd.typ == cmd.typ:
+                replace[cmd.dest] = value
+                continue
+            key = (id(clobber), location.key(), cmd.typ)
+            if key in available:
+                replace[cmd.dest] = available[key]
+            else:
+                available[key] = cmd.dest
+                added.append(key)
+        open_blocks.append((ind, added))
+    return replace
+
+
+def eliminate_dead_stores(function: IRFunction, mssa: MemorySSA, replaced_loads: set[str]) -> set[int]:
+    """Returns the ids of the dead stores"""
+    reverse_dom_tree, end_node = get_analysis(function, POST_DOMINATOR_TREE)
+    immediate_post_dominator = reverse_dom_tree.get_immediate_dominators()
+
+    def post_dominates(a: int, b: int) -> bool:
+        while b != a:
+            if b < 0 or b == end_node:
+                return False
+            b = immediate_post_dominator[b]
+        return True
+
+    def may_read(reader, location: MemoryLocation) -> bool:
+        if not isinstance(reader, IRLoad):
+            return True  # calls and memory phis
+        if reader.dest in replaced_loads:
+            return False
+        return mssa.alias.alias(mssa.locations[id(reader)], location) != AliasResult.NO_ALIAS
+
+    dead: set[int] = set()
+    for block in function.blocks:
+        for cmd in block:
+            if not isinstance(cmd, IRStore) or id(cmd) not in mssa.defs or id(cmd) in dead:
+                continue
+            killer = mssa.defs[id(cmd)]
+            if killer.partition is None:
+                continue
+            access = killer.defining
+            for _ in range(WALK_LIMIT):
+                if not isinstance(access, MemoryDef) or access.partition is None:
+                    break
+                if any(may_read(reader, killer.location) for reader in access.users):
+                    break
+                if (mssa.alias.alias(access.location, killer.location) == AliasResult.MUST_ALIAS
+                        and post_dominates(block.index, access.block.index)):
+                    dead.add(id(access.cmd))
+                access = access.defining
+    return dead
+
+
+def memory_access_elimination(function: IRFunction):
+    mssa = MemorySSA(function)
+    if not mssa.partitions:
+        return
+    replace = eliminate_loads(function, mssa)
+    dead_stores = eliminate_dead_stores(function, mssa, set(replace))
+
+    def resolve(var: str) -> str:
+        while var in replace:
+            var = replace[var]
+        return var
+
+    for block in function.blocks:
+        block.cmds = [cmd for cmd in block.cmds
+                      if not (isinstance(cmd, IRLoad) and cmd.dest in replace) and id(cmd) not in dead_stores]
+        for cmd in block.cmds:
+            cmd.var_use = [resolve(var) for var in cmd.var_use]
@@ -0,0 +1,170 @@
+"""Memory SSA.
+
+Every memory partition (see alias.py) is renamed separately, like a variable in mem2reg:
+- a store defines the partition it writes to
+- a call that may write memory, or a store to an unknown address, defines (clobbers) every partition
+- memory phis are placed at the iterated dominance frontier of the definitions
+
+Every load is linked to the access that reaches it in its partition. Loads from unknown addresses and calls
+that read memory are linked to the reaching access of every partition, phis to their incoming accesses.
+"""
+from mxc.common.ir_repr import IRFunction, IRBlock, IRCmdBase, IRLoad, IRStore, IRCall, UnreachableBlock
+from mxc.frontend.semantic.syntax_recorder import builtin_function_infos
+from mxc.middle_end.alias import AliasAnalysis, MemoryLocation
+from mxc.middle_end.analysis import get_analysis, BLOCK_INDEX, DOMINATOR_TREE, DOMINANCE_FRONTIER_PRED
+
+
+class MemoryAccess:
+    block: IRBlock | None
+    users: list["IRCmdBase | MemoryPhi"]  # loads and calls reading the memory state defined by this access
+
+    def __init__(self, block: IRBlock | None):
+        self.block = block
+        self.users = []
+
+
+class LiveOnEntry(MemoryAccess):
+    def __init__(self):
+        super().__init__(None)
+
+
+class MemoryPhi(MemoryAccess):
+    partition: str
+    incoming: dict[IRBlock, MemoryAccess]
+
+    def __init__(self, block: IRBlock, partition: str):
+        super().__init__(block)
+        self.partition = partition
+        self.incoming = {}
+
+
+class MemoryDef(MemoryAccess):
+    cmd: IRCmdBase
+    index: int  # position of the command in its block
+    partition: str | None  # None if every partition is clobbered
+    location: MemoryLocation | None
+    defining: MemoryAccess | None  # the previous definition of the partition, only kept for stores
+
+    def __init__(self, block: IRBlock, index: int, cmd: IRCmdBase, partition: str | None,
+                 location: MemoryLocation | None = None, defining: MemoryAccess | None = None):
+        super().__init__(block)
+        self.cmd = cmd
+        self.index = index
+        self.partition = partition
+        self.location = location
+        self.defining = defining
+
+
+# Builtins only deal with strings, I/O and freshly allocated memory, none of which is tracked here
+def reads_memory(cmd: IRCall) -> bool:
+    return cmd.func.ir_name not in builtin_function_infos and not cmd.func.pure
+
+
+def writes_memory(cmd: IRCall) -> bool:
+    return cmd.func.ir_name not in builtin_function_infos and not cmd.func.no_effect
+
+
+class MemorySSA:
+    alias: AliasAnalysis
+    partitions: set[str]
+    locations: dict[int, MemoryLocation]  # id of a load or store -> the location it accesses
+    uses: dict[int, MemoryAccess]  # id of a load from a known location -> the access reaching it
+    defs: dict[int, MemoryDef]  # id of a store -> its definition
+    phis: list[dict[str, MemoryPhi]]  # memory phis of every block
+    live_on_entry: LiveOnEntry
+
+    def __init__(self, function: IRFunction):
+        blocks = function.blocks
+        get_analysis(function, BLOCK_INDEX)
+        self.alias = AliasAnalysis(function)
+        self.partitions = set()
+        self.locations = {}
+        self.uses = {}
+        self.defs = {}
+        self.live_on_entry = LiveOnEntry()
+
+        clobbers = [False] * len(blocks)
+        defined: list[set[str]] = [set() for _ in blocks]
+        for block in blocks:
+            for cmd in block:
+                if isinstance(cmd, IRLoad) or isinstance(cmd, IRStore):
+                    location = self.alias.get_location(cmd.addr)
+                    self.locations[id(cmd)] = location
+                    if location.partition is not None:
+                        self.partitions.add(location.partition)
+                    if isinstance(cmd, IRStore):
+                        if location.partition is None:
+                            clobbers[block.index] = True
+                        else:
+                            defined[block.index].add(location.partition)
+                elif isinstance(cmd, IRCall) and writes_memory(cmd):
+                    clobbers[block.index] = True
+        for ind in range(len(blocks)):
+            if clobbers[ind]:
+                defined[ind] = self.partitions
+
+        dominance_frontier_pred = get_analysis(function, DOMINANCE_FRONTIER_PRED)
+        self.phis = [
+            {partition: MemoryPhi(blocks[ind], partition)
+             for partition in sorted(set().union(*(defined[pred] for pred in preds)))}
+            for ind, preds in enumerate(dominance_frontier_pred)
+        ]
+        self.rename(function)
+
+    def rename(self, function: IRFunction):
+        blocks = function.blocks
+        dom_tree = get_analysis(function, DOMINATOR_TREE)
+        immediate_dominator = dom_tree.get_immediate_dominators()
+        current: dict[str, list[MemoryAccess]] = {partition: [self.live_on_entry] for partition in self.partitions}
+        open_blocks: list[tuple[int, list[str]]] = []  # blocks on the dominator tree path, with their pushes
+
+        def read_all(cmd: IRCmdBase):
+            for stack in current.values():
+                stack[-1].users.append(cmd)
+
+        for ind in dom_tree.get_dominator_tree_dfs_order():
+            while open_blocks and open_blocks[-1][0] != immediate_dominator[ind]:
+                for partition in open_blocks.pop()[1]:
+                    current[partition].pop()
+            block = blocks[ind]
+            pushed = []
+            for partition, phi in self.phis[ind].items():
+                current[partition].append(phi)
+                pushed.append(partition)
+            for cmd_ind, cmd in enumerate(block.cmds):
+                if isinstance(cmd, IRLoad):
+                    location = self.locations[id(cmd)]
+                    if location.partition is None:
+                        read_all(cmd)
+                    else:
+                        access = current[location.partition][-1]
+                        access.users.append(cmd)
+                        self.uses[id(cmd)] = access
+                elif isinstance(cmd, IRStore):
+                    location = self.locations[id(cmd)]
+                    if location.partition is None:
+                        access = MemoryDef(block, cmd_ind, cmd, None)
+                        for partition in self.partitions:
+                            current[partition].append(access)
+                            pushed.append(partition)
+                    else:
+                        access = MemoryDef(block, cmd_ind, cmd, location.partition, location,
+                                           current[location.partition][-1])
+                        current[location.partition].append(access)
+                        pushed.append(location.partition)
+                    self.defs[id(cmd)] = access
+                elif isinstance(cmd, IRCall):
+                    if reads_memory(cmd):
+                        read_all(cmd)
+                    if writes_memory(cmd):
+                        access = MemoryDef(block, cmd_ind, cmd, None)
+                        for partition in self.partitions:
+                            current[partition].append(access)
+                            pushed.append(partition)
+            for succ in block.successors:
+                if isinstance(succ, UnreachableBlock):
+                    continue
+                for partition, phi in self.phis[succ.index].items():
+                    phi.incoming[block] = current[partition][-1]
+                    current[partition][-1].users.append(phi)
+            open_blocks.append((ind, pushed))
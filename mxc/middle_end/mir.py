@@ -4,6 +4,8 @@ from mxc.common.ir_repr import IRBlock, IRBinOp, IRIcmp, IRGetElementPtr, IRCmdB
 from mxc.frontend.ir_generation.block_chain import BlockChain
 from .mem2reg import IRUndefinedValue
 
+MUL_DECOMPOSITION_BUDGET = 3  # maximum number of shifts, adds and subs replacing a `li` + `mul`
+
 
 def is_imm(s: str):
     return isinstance(s, IRUndefinedValue) or not s.startswith("%") and not s.startswith("@")
@@ -59,13 +61,75 @@ def is_power_of_two(value: int) -> bool:
     return value != 0 and (value & (value - 1)) == 0
 
 
-def division_by_invariant_integer(n: str, d: int) -> list[IRBinOp]:
+def is_non_negative(var: str, function: IRFunction) -> bool:
+    """Whether the value range found by SCCP shows that `var` is never negative"""
+    return var in function.value_ranges and function.value_ranges[var][0] >= 0
+
+
+def canonical_signed_digits(value: int) -> list[tuple[int, int]]:
+    """The non-zero digits (shift, +1 or -1) of the non-adjacent form of value, which has the fewest of them"""
+    digits = []
+    shift = 0
+    while value != 0:
+        if value & 1:
+            digit = 2 - (value & 3)  # 1 if value % 4 == 1, -1 if value % 4 == 3
+            digits.append((shift, digit))
+            value -= digit
+        value >>= 1
+        shift += 1
+    return digits
+
+
+def multiplication_by_invariant_integer(n: str, c: int, budget: int = MUL_DECOMPOSITION_BUDGET) -> list[IRBinOp]:
+    """Generate LLVM IR code for multiplication by a constant with shifts, adds and subs"""
+    # param n is the name of the multiplicand, a signed 32-bit integer
+    # param c is the multiplier, a signed 32-bit integer
+    # return a list of IRBinOp commands, empty if it takes more than `budget` of them
+    digits = canonical_signed_digits(c)
+    if not digits or 2 * len(digits) - 2 > budget:
+        return []
+    common_shift = digits[0][0]  # x * c = (x * (c >> common_shift)) << common_shift
+    # start from a positive digit, so that no negation is needed
+    start = next((digit for digit in digits if digit[1] > 0), digits[0])
+    digits.remove(start)
+
+    cmds = []
+
+    def shifted(shift: int) -> str:
+        if shift == 0:
+            return n
+        shl_var = renamer.get_name("%.shl")
+        cmds.append(IRBinOp(shl_var, "shl", n, str(shift), "i32"))
+        return shl_var
+
+    acc = shifted(start[0] - common_shift)
+    if start[1] < 0:
+        neg_var = renamer.get_name("%.neg")
+        cmds.append(IRBinOp(neg_var, "sub", "0", acc, "i32"))
+        acc = neg_var
+    for shift, digit in digits:
+        term = shifted(shift - common_shift)
+        acc_var = renamer.get_name("%.add" if digit > 0 else "%.sub")
+        cmds.append(IRBinOp(acc_var, "add" if digit > 0 else "sub", acc, term, "i32"))
+        acc = acc_var
+    if common_shift > 0:
+        cmds.append(IRBinOp(renamer.get_name("%.shl"), "shl", acc, str(common_shift), "i32"))
+    if not cmds:  # multiplication by 1
+        cmds.append(IRBinOp(renamer.get_name("%.mul"), "add", n, "0", "i32"))
+    return cmds if len(cmds) <= budget else []
+
+
+def division_by_invariant_integer(n: str, d: int, non_negative: bool = False) -> list[IRBinOp]:
     """Generate LLVM IR code for division by a constant"""
     # param n is the name of the dividend, a signed 32-bit integer
     # param d is the divisor, a signed 32-bit integer
+    # param non_negative: n is known to be >= 0, so no rounding fixup is needed
     # return a list of IRBinOp commands
     # note that this is a compiler intended for RV32IMA.
     cmds = []
+    if is_power_of_two(d) and non_negative:
+        output_var = renamer.get_name("%.magic")
+        return [IRBinOp(output_var, "ashr", n, str(d.bit_length() - 1), "i32")]
     if is_power_of_two(d):
         srai_var = renamer.get_name("%.srai")
         cmds.append(IRBinOp(srai_var, "ashr", n, "31", "i32"))
@@ -119,11 +183,14 @@ def division_by_invariant_integer(n: str, d: int) -> list[IRBinOp]:
         mulh_var = shift_var
 
     # Step 4: Add 1 for negative numbers (floor division)
-    sign_var = renamer.get_name("%.sign")
-    ops.append(IRBinOp(sign_var, "ashr", n, "31", "i32"))
+    if non_negative:
+        result_var = mulh_var
+    else:
+        sign_var = renamer.get_name("%.sign")
+        ops.append(IRBinOp(sign_var, "ashr", n, "31", "i32"))
 
-    result_var = renamer.get_name("%.div")
-    ops.append(IRBinOp(result_var, "sub", mulh_var, sign_var, "i32"))
+        result_var = renamer.get_name("%.div")
+        ops.append(IRBinOp(result_var, "sub", mulh_var, sign_var, "i32"))
 
     # Handle negative divisor by negating result
     if d < 0:
@@ -133,6 +200,48 @@ def division_by_invariant_integer(n: str, d: int) -> list[IRBinOp]:
     return ops
 
 
+def remainder_by_invariant_integer(n: str, d: int, non_negative: bool = False) -> list[IRBinOp]:
+    """Generate LLVM IR code for the remainder of a division by a constant"""
+    # param n is the name of the dividend, a signed 32-bit integer
+    # param d is the divisor, a signed 32-bit integer
+    # param non_negative: n is known to be >= 0
+    # return a list of IRBinOp commands, empty if `rem` should be kept
+    # the remainder takes the sign of the dividend, so n % d == n % |d|
+    abs_d = abs(d)
+    if d == 0 or abs_d > 2 ** 31 - 1:
+        return []
+    if abs_d == 1:
+        return [IRBinOp(renamer.get_name("%.rem"), "sub", n, n, "i32")]
+
+    cmds = []
+    if is_power_of_two(abs_d):
+        if non_negative:
+            and_cmd = IRBinOp(renamer.get_name("%.rem"), "and", n, str(abs_d - 1), "i32")
+            commutative_law(and_cmd, cmds)
+            cmds.append(and_cmd)
+            return cmds
+        # round n towards zero to a multiple of d, like the division does
+        srai_var = renamer.get_name("%.srai")
+        cmds.append(IRBinOp(srai_var, "ashr", n, "31", "i32"))
+        bias_cmd = IRBinOp(renamer.get_name("%.and"), "and", srai_var, str(abs_d - 1), "i32")
+        commutative_law(bias_cmd, cmds)
+        cmds.append(bias_cmd)
+        add_var = renamer.get_name("%.add")
+        cmds.append(IRBinOp(add_var, "add", n, bias_cmd.dest, "i32"))
+        mask_cmd = IRBinOp(renamer.get_name("%.and"), "and", add_var, str(-abs_d), "i32")
+        commutative_law(mask_cmd, cmds)
+        cmds.append(mask_cmd)
+        cmds.append(IRBinOp(renamer.get_name("%.rem"), "sub", n, mask_cmd.dest, "i32"))
+        return cmds
+
+    cmds = division_by_invariant_integer(n, abs_d, non_negative)
+    mul_cmd = IRBinOp(renamer.get_name("%.mul"), "mul", cmds[-1].dest, str(abs_d), "i32")
+    li_rhs(mul_cmd, cmds)
+    cmds.append(mul_cmd)
+    cmds.append(IRBinOp(renamer.get_name("%.rem"), "sub", n, mul_cmd.dest, "i32"))
+    return cmds
+
+
 def build_mir_block(block: IRBlock, icmp_map: dict[str, IRIcmp], function: IRFunction):
     new_list: list[IRCmdBase] = []
     for cmd in block.cmds:
@@ -158,11 +267,25 @@ def build_mir_block(block: IRBlock, icmp_map: dict[str, IRIcmp], function: IRFun
                     if cmd.op == "mul" and is_power_of_two(imm):
                         new_list.append(IRBinOp(cmd.dest, "shl", cmd.lhs, str(imm.bit_length() - 1), cmd.typ))
                         continue
+                    elif cmd.op == "mul":
+                        cmds = multiplication_by_invariant_integer(cmd.lhs, imm)
+                        if cmds:
+                            cmds[-1].var_def[0] = cmd.dest
+                            new_list.extend(cmds)
+                            continue
+                        li_rhs(cmd, new_list)
                     elif cmd.op == "sdiv":
-                        cmds = division_by_invariant_integer(cmd.lhs, imm)
+                        cmds = division_by_invariant_integer(cmd.lhs, imm, is_non_negative(cmd.lhs, function))
                         cmds[-1].var_def[0] = cmd.dest
                         new_list.extend(cmds)
                         continue
+                    elif cmd.op == "srem":
+                        cmds = remainder_by_invariant_integer(cmd.lhs, imm, is_non_negative(cmd.lhs, function))
+                        if cmds:
+                            cmds[-1].var_def[0] = cmd.dest
+                            new_list.extend(cmds)
+                            continue
+                        li_rhs(cmd, new_list)
                     else:
                         li_rhs(cmd, new_list)
             new_list.append(cmd)
@@ -213,28 +336,31 @@ def build_mir_block(block: IRBlock, icmp_map: dict[str, IRIcmp], function: IRFun
         elif isinstance(cmd, IRGetElementPtr):
             # Not compatible with LLVM IR, as IR disallows pointer arithmetic
             operand = cmd.ptr
+            offset = cmd.member_offset
             flag = False  # command added
             if cmd.arr_index != "0":
                 shl_offset = {"%.arr": "3", "i32": "2", "ptr": "2", "i1": "0"}[cmd.typ.ir_name]
-                if shl_offset != "0":
+                if is_imm(cmd.arr_index):
+                    # constant index, fold into the offset
+                    offset += parse_imm(cmd.arr_index) << int(shl_offset)
+                elif shl_offset != "0":
                     name = renamer.get_name("%.shl")
                     shl_cmd = IRBinOp(name, "shl", cmd.arr_index, shl_offset, "i32")
-                    if is_imm(cmd.arr_index):
-                        li_lhs(shl_cmd, new_list)
                     new_list.append(shl_cmd)
                     add_name = renamer.get_name("%.add")
                     add_cmd = IRBinOp(add_name, "add", name, cmd.ptr, "ptr")
                     new_list.append(add_cmd)
-                    operand = cmd.ptr
+                    operand = add_name
+                    flag = True
                 else:
                     add_name = renamer.get_name("%.add")
                     add_cmd = IRBinOp(add_name, "add", cmd.arr_index, cmd.ptr, "ptr")
                     commutative_law(add_cmd, new_list)
                     new_list.append(add_cmd)
-                    operand = cmd.ptr
-                flag = True
-            if cmd.member_offset != 0:
-                member_cmd = IRBinOp(cmd.dest, "add", operand, str(cmd.member_offset), "ptr")
+                    operand = add_name
+                    flag = True
+            if offset != 0:
+                member_cmd = IRBinOp(cmd.dest, "add", operand, str(offset), "ptr")
                 commutative_law(member_cmd, new_list)
                 new_list.append(member_cmd)
                 flag = True
@@ -278,11 +404,11 @@ def build_mir_block(block: IRBlock, icmp_map: dict[str, IRIcmp], function: IRFun
                     last_cmd.self_tail_call = True
                     block.successors = [unreachable_block]
                     BlockChain.link_exits_to_block([BBExit(block, 0)], function.blocks[0])
-                # elif len(last_cmd.func.param_types) <= 8:
-                #     last_cmd.set_tail_call()
-                else:
+                elif max(0, len(last_cmd.func.param_types) - 8) <= max(0, len(function.info.param_ir_names) - 8):
+                    # the stack arguments of the callee are written over the incoming arguments of this function
                     last_cmd.set_tail_call()
-                    # new_list.append(cmd)
+                else:
+                    new_list.append(cmd)
             else:
                 new_list.append(cmd)
         else:
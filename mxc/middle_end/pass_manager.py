@@ -0,0 +1,67 @@
+import sys
+import time
+from typing import Callable, Iterable, Optional
+
+from mxc.common.ir_repr import IRModule, IRFunction
+from mxc.middle_end.analysis import get_analysis, invalidate_analyses, statistics
+
+
+class OptimizationPass:
+    def __init__(self, func: Callable, name: str, scope: str = "function",
+                 requires: Iterable[str] = (), preserves: Iterable[str] = ()):
+        self.func = func
+        self.name = name
+        self.scope = scope  # "function", "block", or "module"
+        self.requires = tuple(requires)  # analyses computed before the pass runs
+        self.preserves = frozenset(preserves)  # analyses still valid after the pass has run
+
+    def prepare(self, function: IRFunction):
+        for analysis in self.requires:
+            get_analysis(function, analysis)
+
+    def finish(self, function: IRFunction):
+        invalidate_analyses(function, self.preserves)
+
+    def apply(self, ir: IRModule):
+        if self.scope == "function":
+            def run(function: IRFunction):
+                self.prepare(function)
+                # a pass may return False to report that it left the function unchanged
+                if self.func(function) is not False:
+                    self.finish(function)
+
+            ir.for_each_function_definition(run)
+        elif self.scope == "block":
+            ir.for_each_function_definition(self.prepare)
+            ir.for_each_block(self.func)
+            ir.for_each_function_definition(self.finish)
+        else:
+            ir.for_each_function_definition(self.prepare)
+            self.func(ir)
+            ir.for_each_function_definition(self.finish)
+
+
+class PassManager:
+    passes: list[OptimizationPass]
+    pass_time: list[tuple[str, float]]
+
+    def __init__(self, passes: list[OptimizationPass]):
+        self.passes = passes
+        self.pass_time = []
+
+    def run(self, ir: IRModule, callback: Optional[Callable[[OptimizationPass], None]] = None):
+        """Runs every pass in order, calling `callback` after each of them"""
+        for opt_pass in self.passes:
+            print(f"Running {opt_pass.name}...", file=sys.stderr)
+            start = time.perf_counter()
+            opt_pass.apply(ir)
+            self.pass_time.append((opt_pass.name, time.perf_counter() - start))
+            if callback is not None:
+                callback(opt_pass)
+
+    def report(self) -> str:
+        lines = [f"{'Pass':<60}{'Time (s)':>10}"]
+        for name, elapsed in self.pass_time:
+            lines.append(f"{name:<60}{elapsed:>10.3f}")
+        lines.append(f"{'Total':<60}{sum(elapsed for _, elapsed in self.pass_time):>10.3f}")
+        return "\n".join(lines) + "\n\n" + statistics.report()
@@ -0,0 +1,159 @@
+"""Interprocedural side effect inference.
+
+Every user function is classified bottom-up over the call graph:
+- pure: the result only depends on the arguments (no memory is read, no mutable memory is returned)
+- read-only: memory may be read, but nothing is written
+- write-only-to-fresh-memory: only memory allocated by the function itself is written
+
+Functions in any of these classes have no side effect. The results are stored in
+`FunctionInfo.no_effect`, `FunctionInfo.read_only` and `FunctionInfo.pure`.
+"""
+from mxc.common.ir_repr import IRModule, IRFunction, IRCall, IRLoad, IRStore, IRAlloca, IRGetElementPtr, IRPhi, \
+    IRRet
+from mxc.frontend.semantic.syntax_recorder import FunctionInfo, builtin_function_infos
+from mxc.middle_end.call_graph import CallGraph
+
+# Strings are immutable, so reading them does not count as reading memory
+PURE_BUILTINS = {"@toString", "@string_length", "@string_substring", "@string_parseInt", "@string_ord",
+                 "@string_add", "@strcmp"}
+# Builtins returning freshly allocated mutable memory
+ALLOCATORS = {"@malloc"} | {f"@__new_{elem_type}_{dimension}d_array__"
+                            for elem_type in ["int", "bool", "ptr", "arr_ptr"]
+                            for dimension in [1, 2]}
+
+
+class EffectSummary:
+    reads_memory: bool  # reads memory that is not allocated by the function itself
+    writes_memory: bool  # writes memory that is not allocated by the function itself, or performs I/O
+    returns_fresh: bool  # the return value may point to memory allocated during the call
+    always_returns_fresh: bool  # the return value always points to memory allocated during the call, and nothing else
+
+    def __init__(self, reads_memory: bool = False, writes_memory: bool = False, returns_fresh: bool = False,
+                 always_returns_fresh: bool = False):
+        self.reads_memory = reads_memory
+        self.writes_memory = writes_memory
+        self.returns_fresh = returns_fresh
+        self.always_returns_fresh = always_returns_fresh
+
+    def key(self):
+        return self.reads_memory, self.writes_memory, self.returns_fresh, self.always_returns_fresh
+
+    def apply(self, info: FunctionInfo):
+        info.no_effect = not self.writes_memory
+        info.read_only = not self.writes_memory and not self.returns_fresh
+        info.pure = info.read_only and not self.reads_memory
+
+
+def builtin_summary(info: FunctionInfo) -> EffectSummary:
+    if info.ir_name in PURE_BUILTINS:
+        return EffectSummary()
+    if info.ir_name in ALLOCATORS:
+        return EffectSummary(returns_fresh=True, always_returns_fresh=True)
+    # I/O
+    return EffectSummary(writes_memory=True)
+
+
+def collect_fresh_pointers(function: IRFunction, summaries: dict[str, EffectSummary], scc: set[str]) -> set[str]:
+    """Pointers to memory allocated during the current call of the function.
+    Results of calls within the SCC are never considered fresh, which keeps the fixed point iteration monotone."""
+    fresh = set()
+    derived = []  # GEPs and pointer phis, fresh if all their pointer operands are
+    for block in function.blocks:
+        for cmd in block:
+            if isinstance(cmd, IRAlloca):
+                fresh.add(cmd.dest)
+            elif isinstance(cmd, IRCall):
+                if cmd.var_def and cmd.func.ir_name not in scc and summaries[cmd.func.ir_name].always_returns_fresh:
+                    fresh.add(cmd.dest)
+            elif isinstance(cmd, IRGetElementPtr) or isinstance(cmd, IRPhi) and cmd.typ == "ptr":
+                derived.append(cmd)
+    changed = True
+    while changed:
+        changed = False
+        for cmd in derived:
+            if cmd.dest in fresh:
+                continue
+            sources = cmd.var_use[:1] if isinstance(cmd, IRGetElementPtr) else cmd.var_use
+            if all(source in fresh for source in sources):
+                fresh.add(cmd.dest)
+                changed = True
+    return fresh
+
+
+def collect_maybe_fresh_pointers(function: IRFunction, summaries: dict[str, EffectSummary], scc: set[str]) -> set[str]:
+    """Pointers that may point to memory allocated during the current call of the function.
+    Pointer results of calls within the SCC always may, which keeps the fixed point iteration sound."""
+    maybe_fresh = set()
+    derived = []  # GEPs, pointer phis and pointer loads, which may be fresh if any of their pointer operands may
+    for block in function.blocks:
+        for cmd in block:
+            if isinstance(cmd, IRAlloca):
+                maybe_fresh.add(cmd.dest)
+            elif isinstance(cmd, IRCall):
+                if cmd.var_def and cmd.typ == "ptr" and (
+                        cmd.func.ir_name in scc or summaries[cmd.func.ir_name].returns_fresh):
+                    maybe_fresh.add(cmd.dest)
+            elif isinstance(cmd, IRGetElementPtr) or (isinstance(cmd, IRPhi) or isinstance(cmd, IRLoad)) \
+                    and cmd.typ == "ptr":
+                derived.append(cmd)
+    changed = True
+    while changed:
+        changed = False
+        for cmd in derived:
+            if cmd.dest in maybe_fresh:
+                continue
+            sources = cmd.var_use[:1] if isinstance(cmd, IRGetElementPtr) else cmd.var_use
+            if any(source in maybe_fresh for source in sources):
+                maybe_fresh.add(cmd.dest)
+                changed = True
+    return maybe_fresh
+
+
+def summarize_function(function: IRFunction, summaries: dict[str, EffectSummary], scc: set[str]) -> EffectSummary:
+    fresh = collect_fresh_pointers(function, summaries, scc)
+    maybe_fresh = collect_maybe_fresh_pointers(function, summaries, scc)
+    summary = EffectSummary()
+    returned = []
+    for block in function.blocks:
+        for cmd in block:
+            if isinstance(cmd, IRLoad):
+                if cmd.addr not in fresh:
+                    summary.reads_memory = True
+            elif isinstance(cmd, IRStore):
+                if cmd.addr not in fresh:
+                    summary.writes_memory = True
+            elif isinstance(cmd, IRCall):
+                callee = summaries[cmd.func.ir_name]
+                summary.reads_memory |= callee.reads_memory
+                summary.writes_memory |= callee.writes_memory
+            elif isinstance(cmd, IRRet):
+                returned.append(cmd.value)
+                if cmd.value in maybe_fresh:
+                    summary.returns_fresh = True
+    # a fresh object stored into memory the caller can reach is not only reachable through the return value
+    summary.always_returns_fresh = (bool(returned) and all(value in fresh for value in returned)
+                                    and not summary.writes_memory)
+    return summary
+
+
+def infer_function_effects(ir: IRModule):
+    summaries: dict[str, EffectSummary] = {
+        name: builtin_summary(info) for name, info in builtin_function_infos.items()
+    }
+    call_graph = CallGraph(ir)
+    for scc in call_graph.bottom_up_sccs():
+        # Optimistically assume the functions in the SCC have no effect and iterate to a fixed point
+        scc_names = {function.info.ir_name for function in scc}
+        for function in scc:
+            summaries[function.info.ir_name] = EffectSummary()
+        changed = True
+        while changed:
+            changed = False
+            for function in scc:
+                summary = summarize_function(function, summaries, scc_names)
+                if summary.key() != summaries[function.info.ir_name].key():
+                    summaries[function.info.ir_name] = summary
+                    changed = True
+    for function in ir.functions:
+        summaries[function.info.ir_name].apply(function.info)
+        function.no_effect = function.info.no_effect
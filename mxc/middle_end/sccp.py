@@ -1,10 +1,33 @@
-from typing import cast
+"""Sparse conditional constant propagation, extended with value ranges.
+
+Besides constants, the lattice tracks an interval for every i32 value. At a use, the interval of an operand is
+narrowed by the conditions of the dominating branches that compare it (`i < n` bounds `i` by `n - 1` in the
+true successor). Comparisons that the intervals decide are folded, which removes the branches they control.
+The intervals found for i32 values are kept in `IRFunction.value_ranges` for the MIR construction.
+
+The engine works on integers only: every variable and immediate gets a dense value id indexing the lattice array,
+every command a site id, and every CFG edge an edge id. The worklists hold ids, and flag arrays keep each of them
+queued at most once. An interval stops at a bounded number of thresholds before it is widened to the full range,
+so every value changes a bounded number of times and the pass runs in linear time.
+"""
+import operator
+from bisect import bisect_left, bisect_right
+from typing import Callable
 
 from mxc.common.ir_repr import IRFunction, IRBlock, IRPhi, IRCmdBase, IRLoad, IRCall, IRStore, IRJump, IRIcmp, IRBinOp, \
     IRBranch, IRGetElementPtr
 from mxc.middle_end.mem2reg import IRUndefinedValue
 from mxc.middle_end.mir import parse_imm, is_imm
-from mxc.middle_end.utils import mark_blocks, collect_defs, collect_uses, collect_type_map
+from mxc.middle_end.analysis import get_analysis, BLOCK_INDEX, DEFS, USES, TYPE_MAP, DOMINATOR_TREE
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+WIDENING_DELAY = 2  # number of times the interval of a phi may grow before it is widened
+WIDENING_STEPS = 4  # number of thresholds a growing interval stops at before it is widened to the full range
+REFINEMENT_DEPTH = 16  # number of dominators searched for branch conditions narrowing an operand
+
+SWAPPED = {"eq": "eq", "ne": "ne", "slt": "sgt", "sgt": "slt", "sle": "sge", "sge": "sle"}
+NEGATED = {"eq": "ne", "ne": "eq", "slt": "sge", "sge": "slt", "sgt": "sle", "sle": "sgt"}
 
 
 class Unknown:
@@ -12,20 +35,132 @@ class Unknown:
     Lattice cell values can be:
     - Unknown -> no information
     - int -> constant value
+    - Range -> i32 value within an interval
     - None -> identified as not a constant
     """
-    pass
 
+    def __eq__(self, other):
+        return isinstance(other, Unknown)
+
+    def __hash__(self):
+        return 0
+
+
+UNKNOWN = Unknown()  # shared by all the lattice cells without information
+
+
+class Range:
+    """Closed interval [lo, hi] with lo < hi; a single value is represented by an int"""
+    lo: int
+    hi: int
+
+    def __init__(self, lo: int, hi: int):
+        self.lo = lo
+        self.hi = hi
 
-def meet(lhs: Unknown | int | None, rhs: Unknown | int | None) -> Unknown | int | None:
+    def __eq__(self, other):
+        return isinstance(other, Range) and self.lo == other.lo and self.hi == other.hi
+
+    def __repr__(self):
+        return f"[{self.lo}, {self.hi}]"
+
+
+Value = Unknown | int | Range | None
+
+
+def make_range(lo: int, hi: int) -> int | Range | None:
+    """None if the interval does not fit in i32, as the computation may have wrapped around"""
+    if lo < INT_MIN or hi > INT_MAX or (lo == INT_MIN and hi == INT_MAX):
+        return None
+    if lo == hi:
+        return lo
+    return Range(lo, hi)
+
+
+def bounds(value: int | Range | None) -> tuple[int, int]:
+    if value is None:
+        return INT_MIN, INT_MAX
+    if isinstance(value, Range):
+        return value.lo, value.hi
+    return value, value
+
+
+def meet(lhs: Value, rhs: Value) -> Value:
     if isinstance(lhs, Unknown):
         return rhs
     if isinstance(rhs, Unknown):
         return lhs
     if lhs == rhs:
         return lhs
+    if lhs is None or rhs is None:
+        return None
+    (lhs_lo, lhs_hi), (rhs_lo, rhs_hi) = bounds(lhs), bounds(rhs)
+    return make_range(min(lhs_lo, rhs_lo), max(lhs_hi, rhs_hi))
+
+
+def truncated_div(lhs: int, rhs: int) -> int:
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+
+def range_binop(op: str, lhs: int | Range | None, rhs: int | Range | None) -> int | Range | None:
+    """Interval of `lhs op rhs`, at least one of the operands not being a constant"""
+    (lhs_lo, lhs_hi), (rhs_lo, rhs_hi) = bounds(lhs), bounds(rhs)
+    if op == "add":
+        return make_range(lhs_lo + rhs_lo, lhs_hi + rhs_hi)
+    if op == "sub":
+        return make_range(lhs_lo - rhs_hi, lhs_hi - rhs_lo)
+    if op == "mul":
+        corners = [lhs_lo * rhs_lo, lhs_lo * rhs_hi, lhs_hi * rhs_lo, lhs_hi * rhs_hi]
+        return make_range(min(corners), max(corners))
+    if op == "sdiv":
+        if rhs_lo <= 0 <= rhs_hi:
+            return None
+        corners = [truncated_div(a, b) for a in (lhs_lo, lhs_hi) for b in (rhs_lo, rhs_hi)]
+        return make_range(min(corners), max(corners))
+    if op == "srem":
+        if rhs_lo <= 0 <= rhs_hi:
+            return None
+        limit = max(abs(rhs_lo), abs(rhs_hi)) - 1
+        lo = 0 if lhs_lo >= 0 else max(lhs_lo, -limit)
+        hi = 0 if lhs_hi <= 0 else min(lhs_hi, limit)
+        return make_range(lo, hi)
+    if op == "and":
+        if lhs_lo >= 0 and rhs_lo >= 0:
+            return make_range(0, min(lhs_hi, rhs_hi))
+        if lhs_lo >= 0 or rhs_lo >= 0:
+            return make_range(0, lhs_hi if lhs_lo >= 0 else rhs_hi)
+        return None
+    if op in ["or", "xor"]:
+        if lhs_lo >= 0 and rhs_lo >= 0:
+            return make_range(0, (1 << max(lhs_hi, rhs_hi).bit_length()) - 1)
+        return None
+    if op == "shl":
+        if rhs_lo == rhs_hi and 0 <= rhs_lo < 32:
+            return make_range(lhs_lo << rhs_lo, lhs_hi << rhs_lo)
+        return None
+    if op == "ashr":
+        if rhs_lo == rhs_hi and 0 <= rhs_lo < 32:
+            return make_range(lhs_lo >> rhs_lo, lhs_hi >> rhs_lo)
+        return make_range(min(lhs_lo, 0), max(lhs_hi, 0))
+    return None
+
+
+def compare_ranges(op: str, lhs: int | Range | None, rhs: int | Range | None) -> int | None:
+    """1 or 0 if the intervals decide the comparison, None otherwise"""
+    (lhs_lo, lhs_hi), (rhs_lo, rhs_hi) = bounds(lhs), bounds(rhs)
+    if op in ["sgt", "sge"]:
+        op = SWAPPED[op]
+        lhs_lo, lhs_hi, rhs_lo, rhs_hi = rhs_lo, rhs_hi, lhs_lo, lhs_hi
+    if op == "slt":
+        return 1 if lhs_hi < rhs_lo else 0 if lhs_lo >= rhs_hi else None
+    if op == "sle":
+        return 1 if lhs_hi <= rhs_lo else 0 if lhs_lo > rhs_hi else None
+    if lhs_hi < rhs_lo or rhs_hi < lhs_lo:
+        return 1 if op == "ne" else 0
     return None
 
+
 def to_int32(value: int) -> int:
     return (value + 2**31) % 2**32 - 2**31
 
@@ -36,217 +171,426 @@ def to_imm(value: int, typ: str) -> str:
         return "true" if value else "false"
     return "null"
 
+
+def fold_sdiv(lhs: int, rhs: int) -> int | None:
+    return truncated_div(lhs, rhs) if rhs != 0 else None  # remain `Unknown` for undefined behavior
+
+
+def fold_srem(lhs: int, rhs: int) -> int | None:
+    return lhs - truncated_div(lhs, rhs) * rhs if rhs != 0 else None
+
+
+# Constant folding of i32 operations, before the result is wrapped around; None for undefined behavior
+BINOP_FOLDING: dict[str, Callable[[int, int], int | None]] = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "sdiv": fold_sdiv,
+    "srem": fold_srem,
+    "and": operator.and_,
+    "or": operator.or_,
+    "xor": operator.xor,
+    "shl": lambda lhs, rhs: lhs << (rhs & 0x1F),
+    "ashr": lambda lhs, rhs: lhs >> (rhs & 0x1F),
+}
+ICMP_FOLDING: dict[str, Callable[[int, int], bool]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "slt": operator.lt,
+    "sgt": operator.gt,
+    "sle": operator.le,
+    "sge": operator.ge,
+}
+
+# Kinds of commands
+OTHER, PHI, OPAQUE, ICMP, BINOP, JUMP, BRANCH = range(7)
+
+
+def constant_value(var: str | IRUndefinedValue) -> Value:
+    """The lattice value of an operand that is not a variable of the function"""
+    if isinstance(var, IRUndefinedValue):
+        return UNKNOWN
+    if var.startswith("%") or var.startswith("@"):
+        return None
+    return parse_imm(var)
+
+
 class SparseConditionalConstantPropagation:
     def __init__(self, function: IRFunction):
         self.function = function
         self.blocks: list[IRBlock] = function.blocks
-        self.defs = collect_defs(function)
-        self.type_map = collect_type_map(function)
-        self.use_sites = collect_uses(self.defs, self.blocks)
+        type_map = get_analysis(function, TYPE_MAP)
+        defs = get_analysis(function, DEFS)
+        use_sites = get_analysis(function, USES)
+        get_analysis(function, BLOCK_INDEX)
 
-        self.lattice_cell: dict[str, Unknown | int | None] = {
-            def_: Unknown() for def_ in self.defs
-        }
-        self.lattice_cell.update(
-            {param + ".param": None for param in function.info.param_ir_names}
-        )
+        # Value ids: the parameters and the variables defined in the function come first, then the other operands
+        self.value_id: dict[str, int] = {}
+        self.names: list[str] = []
+        self.lattice: list[Value] = []
+        for param in function.info.param_ir_names:
+            self.add_value(param + ".param", None)
+        for block in self.blocks:
+            for cmd in block.cmds:
+                for var in cmd.var_def:
+                    if var in defs and var not in self.value_id:
+                        self.add_value(var, UNKNOWN)
+        self.num_variables = len(self.lattice)
+        self.undefined = self.add_value(None, UNKNOWN)
+
+        # Site ids: the commands of every block are numbered consecutively
+        self.block_offset: list[int] = []
+        self.num_phis: list[int] = []
+        self.site_block: list[int] = []
+        self.site_kind: list[int] = []
+        self.site_op: list[str] = []
+        self.site_dest: list[int] = []
+        self.site_lhs: list[int] = []
+        self.site_rhs: list[int] = []
+        self.site_i32 = bytearray()  # whether an icmp or a binop operates on i32
+        self.site_edges: list[tuple[int, ...]] = []  # edges taken by a jump, or by a branch if (true, false)
+        self.phi_incoming: dict[int, list[tuple[int, int, int]]] = {}  # phi site -> (operand, edge, source)
+
+        # Edge ids, for every distinct (from, to) pair; edge 0 enters the entry block
+        self.edge_id: dict[tuple[int, int], int] = {(-1, 0): 0}
+        self.edge_target: list[int] = [0]
+
+        icmps: dict[int, IRIcmp] = {}
+        thresholds = {INT_MIN, INT_MIN + 1, -1, 0, INT_MAX - 1, INT_MAX}
+        self.is_guard_operand = bytearray(self.num_variables)  # variables compared by some i32 icmp
+        for block in self.blocks:
+            self.block_offset.append(len(self.site_block))
+            phis = 0
+            for cmd in block.cmds:
+                self.site_block.append(block.index)
+                kind, op, dest, lhs, rhs, edges, i32 = OTHER, "", -1, -1, -1, (), False
+                if isinstance(cmd, IRPhi):
+                    kind, dest = PHI, self.value_id[cmd.dest]
+                    phis += 1
+                    self.phi_incoming[len(self.site_block) - 1] = [
+                        (self.intern(var), self.edge(source.index, block.index), source.index)
+                        for var, source in zip(cmd.var_use, cmd.sources)
+                    ]
+                elif isinstance(cmd, IRLoad) or isinstance(cmd, IRCall) or isinstance(cmd, IRGetElementPtr):
+                    # The result of these commands is considered not a constant
+                    kind, dest = OPAQUE, self.value_id[cmd.dest] if cmd.dest else -1
+                elif isinstance(cmd, IRIcmp) or isinstance(cmd, IRBinOp):
+                    kind = ICMP if isinstance(cmd, IRIcmp) else BINOP
+                    op, dest, lhs, rhs = cmd.op, self.value_id[cmd.dest], self.intern(cmd.lhs), self.intern(cmd.rhs)
+                    i32 = cmd.typ == "i32"
+                    if kind == ICMP:
+                        icmps[dest] = cmd
+                        if cmd.typ == "i32":
+                            for operand in cmd.var_use:
+                                if isinstance(operand, IRUndefinedValue):
+                                    continue
+                                if is_imm(operand):
+                                    value = parse_imm(operand)
+                                    thresholds.update((value - 1, value, value + 1))
+                                elif self.value_id[operand] < self.num_variables:
+                                    self.is_guard_operand[self.value_id[operand]] = 1
+                elif isinstance(cmd, IRJump):
+                    kind, edges = JUMP, (self.edge(block.index, cmd.jump_dest.get_dest().index),)
+                elif isinstance(cmd, IRBranch):
+                    kind, lhs = BRANCH, self.intern(cmd.cond)
+                    edges = (self.edge(block.index, cmd.true_dest.get_dest().index),
+                             self.edge(block.index, cmd.false_dest.get_dest().index))
+                self.site_kind.append(kind)
+                self.site_op.append(op)
+                self.site_dest.append(dest)
+                self.site_lhs.append(lhs)
+                self.site_rhs.append(rhs)
+                self.site_i32.append(i32)
+                self.site_edges.append(edges)
+            self.num_phis.append(phis)
+        self.thresholds = sorted(thresholds)  # the bounds a growing interval is widened to
+        self.types: list[str | None] = [type_map.get(var) for var in self.names[:self.num_variables]]
+        self.is_i32 = bytearray(typ == "i32" for typ in self.types)
+
+        # The branches on an i32 comparison, which narrow its operands in the successors:
+        # block -> (lhs, rhs, op, true successor)
+        self.guards: list[tuple[int, int, str, int] | None] = [None] * len(self.blocks)
+        for block in self.blocks:
+            branch = block.cmds[-1]
+            if not isinstance(branch, IRBranch) or self.intern(branch.cond) not in icmps:
+                continue
+            true_dest, false_dest = branch.true_dest.get_dest(), branch.false_dest.get_dest()
+            icmp = icmps[self.intern(branch.cond)]
+            if true_dest is false_dest or icmp.typ != "i32" or icmp.lhs == icmp.rhs:
+                continue
+            self.guards[block.index] = (self.intern(icmp.lhs), self.intern(icmp.rhs), icmp.op, true_dest.index)
+        self.single_predecessor = [block.predecessors[0].index if len(block.predecessors) == 1 else -1
+                                   for block in self.blocks]
 
-        self.block_visited: set[int] = set()
-        self.edge_visited: set[tuple[int, int]] = set()
-        self.cfg_work_list: list[tuple[int, int]] = [(0, 0)]  # (from, to)
-        self.ssa_work_list: list[tuple[IRBlock, int]] = []  # (block, command_id)
+        # Users of every variable, and the sites narrowed by a guard comparing them with another variable
+        self.users: list[list[int]] = [[] for _ in range(self.num_variables)]
+        for var, sites in use_sites.items():
+            ind = self.value_id.get(var)
+            if ind is not None and ind < self.num_variables:
+                self.users[ind] = [self.block_offset[block.index] + cmd_id for block, cmd_id in sites]
+        self.guard_users: dict[int, set[int]] = {}
+        self.growth = [0] * self.num_variables  # number of times the interval of a phi has grown
+        self.immediate_dominator: list[int] = []
+        self.current_site = -1
+
+        self.block_visited = bytearray(len(self.blocks))
+        self.edge_executable = bytearray(len(self.edge_target))
+        self.edge_queued = bytearray(len(self.edge_target))
+        self.site_queued = bytearray(len(self.site_block))
+        self.cfg_work_list: list[int] = [0]
+        self.ssa_work_list: list[int] = []
+
+    def add_value(self, name: str | None, value: Value) -> int:
+        ind = len(self.lattice)
+        if name is not None:
+            self.value_id[name] = ind
+        self.names.append(name)
+        self.lattice.append(value)
+        return ind
+
+    def intern(self, var: str | IRUndefinedValue) -> int:
+        if isinstance(var, IRUndefinedValue):
+            return self.undefined
+        ind = self.value_id.get(var)
+        return ind if ind is not None else self.add_value(var, constant_value(var))
+
+    def edge(self, from_: int, to: int) -> int:
+        ind = self.edge_id.get((from_, to))
+        if ind is None:
+            ind = self.edge_id[(from_, to)] = len(self.edge_target)
+            self.edge_target.append(to)
+        return ind
 
     def run(self):
-        mark_blocks(self.blocks)
+        self.immediate_dominator = list(get_analysis(self.function, DOMINATOR_TREE).get_immediate_dominators())
         while self.cfg_work_list or self.ssa_work_list:
             while self.cfg_work_list:
-                from_, to = self.cfg_work_list.pop()
-                if (from_, to) in self.edge_visited:
+                edge = self.cfg_work_list.pop()
+                self.edge_queued[edge] = 0
+                if self.edge_executable[edge]:
                     continue
-                self.edge_visited.add((from_, to))
-                self.visit_block(from_, to)
+                self.edge_executable[edge] = 1
+                self.visit_block(self.edge_target[edge])
             while self.ssa_work_list:
-                block, cmd_id = self.ssa_work_list.pop()
-                if block.index not in self.block_visited:
+                site = self.ssa_work_list.pop()
+                self.site_queued[site] = 0
+                if not self.block_visited[self.site_block[site]]:
                     continue
-                self.visit_cmd(block, cmd_id)
+                if self.site_kind[site] == PHI:
+                    self.visit_phi(site)
+                else:
+                    self.visit_expr(site)
 
+        self.function.value_ranges = {
+            self.names[var]: (value.lo, value.hi)
+            for var, value in enumerate(self.lattice[:self.num_variables]) if isinstance(value, Range)
+        }
         for block in self.blocks:
-            if block.unreachable_mark or block.index not in self.block_visited:
+            if block.unreachable_mark or not self.block_visited[block.index]:
+                block.unreachable_mark = True
+        # Only the commands using a constant or a value never computed, and the branches, have to be rewritten
+        sites = {self.block_offset[block.index] + len(block.cmds) - 1
+                 for block in self.blocks if isinstance(block.cmds[-1], IRBranch)}
+        for var in range(self.num_variables):
+            value = self.lattice[var]
+            if value is UNKNOWN or type(value) is int:
+                sites.update(self.users[var])
+        for site in sites:
+            block = self.blocks[self.site_block[site]]
+            if self.update_value(block.cmds[site - self.block_offset[block.index]], block):
                 block.unreachable_mark = True
-            for cmd in block.cmds:
-                if self.update_value(cmd, block):
-                    block.unreachable_mark = True
 
     def update_value(self, cmd: IRCmdBase, block: IRBlock) -> bool:
         for i, var_use in enumerate(cmd.var_use):
-            if var_use in self.lattice_cell:
-                literal = self.lattice_cell[var_use]
-                if literal is None:
+            var = self.value_id.get(var_use) if not isinstance(var_use, IRUndefinedValue) else None
+            if var is not None and var < self.num_variables:
+                literal = self.lattice[var]
+                if literal is None or isinstance(literal, Range):
                     continue
-                if isinstance(literal, Unknown):
+                if literal is UNKNOWN:
                     if not isinstance(cmd, IRPhi):
                         return True # Unreachable
                     else:
                         self.function.edge_to_remove.add((cmd.sources[i], block))
                         continue
-                cmd.var_use[i] = to_imm(literal, self.type_map[var_use])
-            # elif isinstance(var_use, IRUndefinedValue):
-            #     if not isinstance(cmd, IRPhi):
-            #         return True  # Unreachable
-            #     else:
-            #         self.function.edge_to_remove.add((cmd.sources[i], block))
-            #         continue
+                cmd.var_use[i] = to_imm(literal, self.types[var])
         if isinstance(cmd, IRBranch):
             if cmd.cond in ['true', 'false']:
                 unreachable_dest = cmd.true_dest.get_dest() if cmd.cond == 'false' else cmd.false_dest.get_dest()
                 self.function.edge_to_remove.add((block, unreachable_dest))
+        return False
 
-    def visit_block(self, from_: int, to: int):
-        cmds = self.blocks[to].cmds
-        for i, phi in enumerate(self.blocks[to].cmds):
-            if not isinstance(phi, IRPhi):
-                break
-            self.visit_phi(to, i)
-        if to in self.block_visited:
+    def push_edge(self, edge: int):
+        if not self.edge_executable[edge] and not self.edge_queued[edge]:
+            self.edge_queued[edge] = 1
+            self.cfg_work_list.append(edge)
+
+    def push_site(self, site: int):
+        if not self.site_queued[site]:
+            self.site_queued[site] = 1
+            self.ssa_work_list.append(site)
+
+    def visit_block(self, block_id: int):
+        offset = self.block_offset[block_id]
+        num_phis = self.num_phis[block_id]
+        for site in range(offset, offset + num_phis):
+            self.visit_phi(site)
+        if self.block_visited[block_id]:
             return
-        self.block_visited.add(to)
-        # print(f"Visiting block {self.blocks[to].name}")
+        self.block_visited[block_id] = 1
+        for site in range(offset + num_phis, offset + len(self.blocks[block_id].cmds)):
+            self.visit_expr(site)
 
-        for i, cmd in enumerate(cmds):
-            if isinstance(cmd, IRPhi):
-                continue
-            self.visit_expr(to, i)
+    def get_operand(self, var: int, block_id: int) -> Value:
+        """The value of `var` narrowed by the branch conditions dominating the block"""
+        value = self.lattice[var]
+        if value is UNKNOWN or type(value) is int or var >= self.num_variables or not self.is_guard_operand[var]:
+            return value
+        ind = block_id
+        for _ in range(REFINEMENT_DEPTH):
+            if ind < 0:
+                break
+            pred = self.single_predecessor[ind]
+            if pred >= 0:
+                value = self.narrow_on_edge(var, value, pred, ind)
+            ind = self.immediate_dominator[ind]
+        return value
 
-    def get_value(self, var: str | IRUndefinedValue) -> Unknown | int | None:
-        if isinstance(var, IRUndefinedValue):
-            return Unknown()
-        if not var.startswith("%"):
-            if var.startswith('@.str'):
-                return None
-            return parse_imm(var)
-        return self.lattice_cell.get(var)
-
-    def visit_phi(self, block_id: int, cmd_id: int):
-        cmd = self.blocks[block_id].cmds[cmd_id]
-        cmd = cast(IRPhi, cmd)
-        new_value = Unknown()
-        for var_use, source in zip(cmd.var_use, cmd.sources):
-            if (source.index, block_id) not in self.edge_visited:
-                continue
-            new_value = meet(new_value, self.get_value(var_use))
-        self.try_update(cmd.dest, new_value)
-
-    def try_update(self, var: str, value: Unknown | int | None):
-        if self.lattice_cell[var] != value:
-            self.lattice_cell[var] = value
-            self.ssa_work_list.extend(self.use_sites[var])
-
-    def visit_cmd(self, block: IRBlock, cmd_id: int):
-        cmd = block.cmds[cmd_id]
-        block_id = block.index
-        if isinstance(cmd, IRPhi):
-            self.visit_phi(block_id, cmd_id)
+    def get_edge_operand(self, var: int, source: int, block_id: int) -> Value:
+        """The value of `var` flowing along the edge, for phis"""
+        value = self.get_operand(var, source)
+        if value is UNKNOWN or type(value) is int or var >= self.num_variables or not self.is_guard_operand[var]:
+            return value
+        return self.narrow_on_edge(var, value, source, block_id)
+
+    def narrow_on_edge(self, var: int, value: Range | None, source: int, target: int) -> Value:
+        guard = self.guards[source]
+        if guard is None:
+            return value
+        lhs, rhs, op, true_dest = guard
+        if var != lhs and var != rhs:
+            return value
+        if target != true_dest:
+            op = NEGATED[op]
+        if var == lhs:
+            other = rhs
         else:
-            self.visit_expr(block_id, cmd_id)
-
-    def visit_expr(self, block_id: int, cmd_id: int):
-        block = self.blocks[block_id]
-        cmd = block.cmds[cmd_id]
-        # print(f"Visiting command {cmd}")
-
-        if isinstance(cmd, IRLoad) or isinstance(cmd, IRCall) or isinstance(cmd, IRGetElementPtr):
-            # The result of these commands is considered not a constant
-            if cmd.dest:
-                self.try_update(cmd.dest, None)
-        elif isinstance(cmd, IRIcmp):
-            lhs_value, rhs_value = self.get_value(cmd.lhs), self.get_value(cmd.rhs)
-            if isinstance(lhs_value, Unknown) or isinstance(rhs_value, Unknown):
-                return
-            if cmd.lhs == cmd.rhs:
-                if cmd.op in ['eq', 'sle', 'sge']:
-                    return self.try_update(cmd.dest, 1)
-                else:
-                    return self.try_update(cmd.dest, 0)
-            if lhs_value is None or rhs_value is None:
-                return self.try_update(cmd.dest, None)
-            if cmd.op == 'eq':
-                return self.try_update(cmd.dest, int(lhs_value == rhs_value))
-            elif cmd.op == 'ne':
-                return self.try_update(cmd.dest, int(lhs_value != rhs_value))
-            elif cmd.op == 'slt':
-                return self.try_update(cmd.dest, int(lhs_value < rhs_value))
-            elif cmd.op == 'sgt':
-                return self.try_update(cmd.dest, int(lhs_value > rhs_value))
-            elif cmd.op == 'sle':
-                return self.try_update(cmd.dest, int(lhs_value <= rhs_value))
-            elif cmd.op == 'sge':
-                return self.try_update(cmd.dest, int(lhs_value >= rhs_value))
-            else:
-                assert False, "Unknown icmp operator"
-        elif isinstance(cmd, IRBinOp):
-            lhs_value, rhs_value = self.get_value(cmd.lhs), self.get_value(cmd.rhs)
-            if isinstance(lhs_value, Unknown) or isinstance(rhs_value, Unknown):
-                return
-            if lhs_value is None or rhs_value is None:
-                if cmd.lhs == cmd.rhs:
-                    if cmd.op in ['sub', 'xor', 'ashr']:
-                        return self.try_update(cmd.dest, 0)
-                return self.try_update(cmd.dest, None)
-            if cmd.op == 'add':
-                return self.try_update(cmd.dest, to_int32(lhs_value + rhs_value))
-            elif cmd.op == 'sub':
-                return self.try_update(cmd.dest, to_int32(lhs_value - rhs_value))
-            elif cmd.op == 'mul':
-                return self.try_update(cmd.dest, to_int32(lhs_value * rhs_value))
-            elif cmd.op == 'sdiv':
-                if rhs_value == 0:
-                    return  # remain `Unknown` for undefined behavior
-                quotient = lhs_value // rhs_value
-                if (lhs_value * rhs_value < 0) and (lhs_value % rhs_value != 0):
-                    quotient += 1
-                return self.try_update(cmd.dest, to_int32(quotient))
-            elif cmd.op == 'srem':
-                if rhs_value == 0:
-                    return
-                remainder = lhs_value % rhs_value
-                if (lhs_value * rhs_value < 0) and remainder != 0:
-                    remainder -= rhs_value
-                return self.try_update(cmd.dest, to_int32(remainder))
-            elif cmd.op == 'and':
-                return self.try_update(cmd.dest, to_int32(lhs_value & rhs_value))
-            elif cmd.op == 'or':
-                return self.try_update(cmd.dest, to_int32(lhs_value | rhs_value))
-            elif cmd.op == 'xor':
-                return self.try_update(cmd.dest, to_int32(lhs_value ^ rhs_value))
-            elif cmd.op == 'shl':
-                shift = rhs_value & 0x1F
-                result = lhs_value << shift
-                return self.try_update(cmd.dest, to_int32(result))
-            elif cmd.op == 'ashr':
-                shift = rhs_value & 0x1F
-                result = lhs_value >> shift
-                return self.try_update(cmd.dest, to_int32(result))
-            else:
-                assert False, "Unknown binop operator"
-        elif isinstance(cmd, IRJump):
-            self.cfg_work_list.append((block_id, cmd.jump_dest.get_dest().index))
+            other, op = lhs, SWAPPED[op]
+        if other < self.num_variables and self.current_site >= 0:
+            self.guard_users.setdefault(other, set()).add(self.current_site)
+        other_value = self.lattice[other]
+        if other_value is UNKNOWN:
+            return value
+
+        lo, hi = bounds(value)
+        other_lo, other_hi = bounds(other_value)
+        if op == "slt":
+            hi = min(hi, other_hi - 1)
+        elif op == "sle":
+            hi = min(hi, other_hi)
+        elif op == "sgt":
+            lo = max(lo, other_lo + 1)
+        elif op == "sge":
+            lo = max(lo, other_lo)
+        elif op == "eq":
+            lo, hi = max(lo, other_lo), min(hi, other_hi)
+        elif other_lo == other_hi:  # ne
+            lo += lo == other_lo
+            hi -= hi == other_hi
+        if lo > hi:
+            return value  # the edge is never taken
+        return make_range(lo, hi)
+
+    def widen(self, var: int, old: Value, new: Value) -> Value:
+        """Makes a growing interval jump to the next threshold, then to the full range,
+        so that loops reach a fixed point quickly"""
+        if old is UNKNOWN or new is UNKNOWN or old is None or new is None:
+            return new
+        new = meet(old, new)
+        if new == old or new is None:
+            return new
+        self.growth[var] += 1
+        if self.growth[var] <= WIDENING_DELAY:
+            return new
+        (old_lo, old_hi), (lo, hi) = bounds(old), bounds(new)
+        if self.growth[var] > WIDENING_DELAY + WIDENING_STEPS:
+            return make_range(INT_MIN if lo < old_lo else lo, INT_MAX if hi > old_hi else hi)
+        if lo < old_lo:
+            lo = self.thresholds[bisect_right(self.thresholds, lo) - 1]
+        if hi > old_hi:
+            hi = self.thresholds[bisect_left(self.thresholds, hi)]
+        return make_range(lo, hi)
+
+    def visit_phi(self, site: int):
+        block_id = self.site_block[site]
+        self.current_site = site
+        new_value = UNKNOWN
+        for var, edge, source in self.phi_incoming[site]:
+            if not self.edge_executable[edge]:
+                continue
+            new_value = meet(new_value, self.get_edge_operand(var, source, block_id))
+        dest = self.site_dest[site]
+        if self.is_i32[dest]:
+            new_value = self.widen(dest, self.lattice[dest], new_value)
+        self.try_update(dest, new_value)
+
+    def try_update(self, var: int, value: Value):
+        if isinstance(value, Range) and not self.is_i32[var]:
+            value = None
+        if self.lattice[var] != value:
+            self.lattice[var] = value
+            for site in self.users[var]:
+                self.push_site(site)
+            for site in self.guard_users.get(var, ()):
+                self.push_site(site)
+
+    def visit_expr(self, site: int):
+        kind = self.site_kind[site]
+        if kind == OTHER:
             return
-        elif isinstance(cmd, IRBranch):
-            cond_value = self.get_value(cmd.cond)
-            # print(f"Branch condition: {cond_value}")
+        self.current_site = site
+        block_id = self.site_block[site]
 
-            if isinstance(cond_value, Unknown):
+        if kind == OPAQUE:
+            if self.site_dest[site] >= 0:
+                self.try_update(self.site_dest[site], None)
+        elif kind == ICMP or kind == BINOP:
+            lhs, rhs, op, dest = self.site_lhs[site], self.site_rhs[site], self.site_op[site], self.site_dest[site]
+            lhs_value, rhs_value = self.get_operand(lhs, block_id), self.get_operand(rhs, block_id)
+            if lhs_value is UNKNOWN or rhs_value is UNKNOWN:
                 return
-            if cond_value is None:
-                self.cfg_work_list.append((block_id, cmd.false_dest.get_dest().index))
-                self.cfg_work_list.append((block_id, cmd.true_dest.get_dest().index))
+            if kind == ICMP:
+                if lhs == rhs:
+                    return self.try_update(dest, int(op in ['eq', 'sle', 'sge']))
+                if type(lhs_value) is not int or type(rhs_value) is not int:
+                    if not self.site_i32[site]:
+                        return self.try_update(dest, None)
+                    return self.try_update(dest, compare_ranges(op, lhs_value, rhs_value))
+                return self.try_update(dest, int(ICMP_FOLDING[op](lhs_value, rhs_value)))
+            if type(lhs_value) is not int or type(rhs_value) is not int:
+                if lhs == rhs and op in ['sub', 'xor']:
+                    return self.try_update(dest, 0)
+                if not self.site_i32[site]:
+                    return self.try_update(dest, None)
+                return self.try_update(dest, range_binop(op, lhs_value, rhs_value))
+            result = BINOP_FOLDING[op](lhs_value, rhs_value)
+            if result is not None:
+                self.try_update(dest, to_int32(result))
+        elif kind == JUMP:
+            self.push_edge(self.site_edges[site][0])
+        else:
+            cond_value = self.lattice[self.site_lhs[site]]
+            if cond_value is UNKNOWN:
                 return
-            if cond_value:
-                self.cfg_work_list.append((block_id, cmd.true_dest.get_dest().index))
+            true_edge, false_edge = self.site_edges[site]
+            if cond_value is None or isinstance(cond_value, Range):
+                self.push_edge(false_edge)
+                self.push_edge(true_edge)
+            elif cond_value:
+                self.push_edge(true_edge)
             else:
-                self.cfg_work_list.append((block_id, cmd.false_dest.get_dest().index))
+                self.push_edge(false_edge)
 
 
 def sparse_conditional_constant_propagation(function: IRFunction):
-    SparseConditionalConstantPropagation(function).run()
\ No newline at end of file
+    SparseConditionalConstantPropagation(function).run()
@@ -0,0 +1,87 @@
+"""Scalar replacement of aggregates.
+
+An object allocated by `IRMalloc` does not escape if its pointer is only used to compute member addresses,
+and those addresses are only used to load from or store to the member. Such an object is replaced by one
+alloca per accessed member, which mem2reg then promotes to SSA values.
+
+The pointer escapes as soon as it is stored, passed to a call (including the constructor), returned,
+merged by a phi or compared.
+"""
+from mxc.common.renamer import renamer
+from mxc.common.ir_repr import IRFunction, IRCmdBase, IRMalloc, IRGetElementPtr, IRLoad, IRStore, IRAlloca
+from mxc.middle_end.mem2reg import mem2reg
+
+ZERO_VALUES = {"i32": "0", "i1": "false", "ptr": "null"}
+
+
+def collect_use_sites(function: IRFunction) -> dict[str, list[tuple[IRCmdBase, int]]]:
+    """Every use of every variable, as (command, operand index)"""
+    use_sites: dict[str, list[tuple[IRCmdBase, int]]] = {}
+    for block in function.blocks:
+        for cmd in block:
+            for ind, use in enumerate(cmd.var_use):
+                use_sites.setdefault(use, []).append((cmd, ind))
+    return use_sites
+
+
+def get_member_accesses(obj: str, use_sites: dict[str, list[tuple[IRCmdBase, int]]]) \
+        -> dict[str, list[IRGetElementPtr]] | None:
+    """Member address computations of the object grouped by member, or None if the object escapes"""
+    members: dict[str, list[IRGetElementPtr]] = {}
+    for cmd, ind in use_sites.get(obj, []):
+        if not (isinstance(cmd, IRGetElementPtr) and ind == 0 and len(cmd.var_use) == 1 and cmd.member):
+            return None
+        for member_cmd, member_ind in use_sites.get(cmd.dest, []):
+            # the member address must only be dereferenced, never stored or passed around
+            if not (isinstance(member_cmd, IRLoad) or isinstance(member_cmd, IRStore)) or member_ind != 0:
+                return None
+        members.setdefault(cmd.member, []).append(cmd)
+    return members
+
+
+def replace_object(function: IRFunction, malloc: IRMalloc, members: dict[str, list[IRGetElementPtr]],
+                   use_sites: dict[str, list[tuple[IRCmdBase, int]]]):
+    allocas = []
+    init_stores = []
+    member_ptrs: dict[str, str] = {}  # member address -> alloca
+    removed: set[int] = {id(malloc)}
+    for member, geps in members.items():
+        accesses = [cmd for gep in geps for cmd, _ in use_sites.get(gep.dest, [])]
+        if not accesses:
+            removed.update(id(gep) for gep in geps)
+            continue
+        typ = accesses[0].typ
+        local_ptr_name = renamer.get_name(malloc.dest.removesuffix(".ptr") + "." + member) + ".ptr"
+        allocas.append(IRAlloca(local_ptr_name, typ))
+        init_stores.append(IRStore(local_ptr_name, ZERO_VALUES[typ], typ))
+        for gep in geps:
+            member_ptrs[gep.dest] = local_ptr_name
+            removed.add(id(gep))
+
+    for block in function.blocks:
+        new_cmds = []
+        for cmd in block.cmds:
+            if cmd is malloc:
+                new_cmds.extend(init_stores)
+            elif (isinstance(cmd, IRLoad) or isinstance(cmd, IRStore)) and cmd.addr in member_ptrs:
+                cmd.addr = member_ptrs[cmd.addr]
+            if id(cmd) not in removed:
+                new_cmds.append(cmd)
+        block.cmds = new_cmds
+    function.blocks[0].cmds = allocas + function.blocks[0].cmds
+
+
+def scalar_replacement_of_aggregates(function: IRFunction):
+    mallocs = [cmd for block in function.blocks for cmd in block if isinstance(cmd, IRMalloc) and cmd.var_def]
+    if not mallocs:
+        return
+    use_sites = collect_use_sites(function)
+    replaced = False
+    for malloc in mallocs:
+        members = get_member_accesses(malloc.dest, use_sites)
+        if members is not None:
+            replace_object(function, malloc, members, use_sites)
+            replaced = True
+    if replaced:
+        # the control flow graph is unchanged, so the cached analyses mem2reg needs are still valid
+        mem2reg(function)
@@ -0,0 +1,143 @@
+"""Accumulator introduction for recursive functions.
+
+A return of the form `ret (f(args) op x)`, where `op` is associative and commutative, is rewritten into a tail call
+`ret f(args, acc op x)` by passing the partial result down in a new accumulator parameter. Every other return of `v`
+becomes `ret acc op v`, and every other call passes the identity of `op`. The self tail calls are then turned into
+loops by the MIR construction.
+
+Before that, returns of a phi are duplicated into the predecessors that jump to them with the result of a call,
+so that the call ends up directly before a `ret`.
+"""
+from mxc.common.ir_repr import IRModule, IRFunction, IRBlock, IRCmdBase, IRBinOp, IRIcmp, IRCall, IRRet, IRPhi, \
+    IRJump
+from mxc.common.renamer import renamer
+from mxc.middle_end.cfg_transform import remove_edge
+from mxc.middle_end.mem2reg import IRUndefinedValue
+from mxc.middle_end.utils import mark_blocks
+
+IDENTITIES = {
+    "i32": {"add": "0", "mul": "1", "and": "-1", "or": "0", "xor": "0"},
+    "i1": {"and": "true", "or": "false", "xor": "false"},
+}
+
+
+def fold_return_phis(function: IRFunction) -> bool:
+    """Replaces the jump to a block returning a phi by a `ret` of the incoming value,
+    when that value is computed by a call right before the jump"""
+    changed = False
+    for block in function.blocks:
+        if len(block.cmds) != 2 or not isinstance(block.cmds[0], IRPhi) or not isinstance(block.cmds[1], IRRet):
+            continue
+        phi, ret = block.cmds
+        if ret.value != phi.dest:
+            continue
+        for pred, value in list(zip(phi.sources, phi.var_use)):
+            if not isinstance(pred.cmds[-1], IRJump) or len(pred.cmds) < 2:
+                continue
+            call = pred.cmds[-2]
+            if not isinstance(call, IRCall) or call.dest != value:
+                continue
+            remove_edge(pred, block)
+            pred.cmds[-1] = IRRet(ret.typ, value)
+            pred.successors = []
+            changed = True
+    if changed:
+        function.blocks = [block for block in function.blocks
+                           if block is function.blocks[0] or block.predecessors]
+        mark_blocks(function.blocks)
+    return changed
+
+
+def is_self_call(cmd: IRCmdBase, function: IRFunction) -> bool:
+    return isinstance(cmd, IRCall) and cmd.func.ir_name == function.info.ir_name
+
+
+def match_accumulation(block: IRBlock, function: IRFunction, use_count: dict[str, int]) \
+        -> tuple[IRBinOp, int, str] | None:
+    """Matches `r = call f(...); <pure commands not using r>; v = op r, x; ret v`.
+    Returns the operation, the index of the call and the other operand x."""
+    cmds = block.cmds
+    ret = cmds[-1]
+    if not isinstance(ret, IRRet) or not ret.value or len(cmds) < 3:
+        return None
+    op_cmd = cmds[-2]
+    if (not isinstance(op_cmd, IRBinOp) or op_cmd.dest != ret.value
+            or op_cmd.op not in IDENTITIES.get(op_cmd.typ, {})):
+        return None
+    for result, other in ((op_cmd.lhs, op_cmd.rhs), (op_cmd.rhs, op_cmd.lhs)):
+        if result == other or use_count.get(result, 0) != 1:
+            continue
+        for ind in range(len(cmds) - 3, -1, -1):
+            cmd = cmds[ind]
+            if is_self_call(cmd, function) and cmd.dest == result:
+                return op_cmd, ind, other
+            if not (isinstance(cmd, IRBinOp) or isinstance(cmd, IRIcmp)):
+                break
+    return None
+
+
+def introduce_accumulator(function: IRFunction, ir: IRModule) -> bool:
+    info = function.info
+    use_count: dict[str, int] = {}
+    for block in function.blocks:
+        for cmd in block:
+            for var in cmd.var_use:
+                use_count[var] = use_count.get(var, 0) + 1
+
+    matches = {}
+    for block in function.blocks:
+        match = match_accumulation(block, function, use_count)
+        if match is not None:
+            matches[block] = match
+    if not matches or len({op_cmd.op for op_cmd, _, _ in matches.values()}) != 1:
+        return False
+    op = next(iter(matches.values()))[0].op
+    typ = info.ret_type.ir_name
+    identity = IDENTITIES[typ][op]
+
+    acc_name = renamer.get_name("%.acc")
+    acc = acc_name + ".param"
+    info.param_ir_names.append(acc_name)
+    info.param_types.append(info.ret_type)
+
+    passing_calls: set[int] = set()  # self calls that get the accumulator of the caller
+    for block in function.blocks:
+        cmds = block.cmds
+        ret = cmds[-1]
+        if block in matches:
+            op_cmd, call_ind, other = matches[block]
+            call = cmds[call_ind]
+            new_acc = renamer.get_name("%.acc")
+            call.var_use.append(new_acc)
+            passing_calls.add(id(call))
+            ret.var_use[1] = call.dest
+            block.cmds = (cmds[:call_ind] + cmds[call_ind + 1:-2]
+                          + [IRBinOp(new_acc, op, acc, other, typ), call, ret])
+        elif isinstance(ret, IRRet):
+            if len(cmds) >= 2 and is_self_call(cmds[-2], function) and cmds[-2].dest == ret.value:
+                cmds[-2].var_use.append(acc)
+                passing_calls.add(id(cmds[-2]))
+            elif ret.value == identity:
+                ret.var_use[1] = acc
+            elif not isinstance(ret.value, IRUndefinedValue):
+                result = renamer.get_name("%.acc.ret")
+                cmds.insert(-1, IRBinOp(result, op, acc, ret.value, typ))
+                ret.var_use[1] = result
+
+    for caller in ir.functions:
+        if caller.is_declare():
+            continue
+        for block in caller.blocks:
+            for cmd in block:
+                if isinstance(cmd, IRCall) and cmd.func.ir_name == info.ir_name and id(cmd) not in passing_calls:
+                    cmd.var_use.append(identity)
+    return True
+
+
+def accumulator_introduction(ir: IRModule):
+    for function in ir.functions:
+        if function.is_declare():
+            continue
+        fold_return_phis(function)
+        if function.info.ir_name != "@main" and function.info.ret_type.ir_name in IDENTITIES:
+            introduce_accumulator(function, ir)
@@ -1,5 +1,9 @@
-from mxc.common import dominator
-from mxc.common.ir_repr import IRBlock, IRCmdBase, IRFunction, IRIcmp
+from array import array
+from typing import Callable, Iterable, TypeVar
+
+from mxc.common.ir_repr import IRBlock, IRCmdBase, IRFunction, IRIcmp, UnreachableBlock
+
+T = TypeVar('T')
 
 
 def mark_blocks(blocks: list[IRBlock]):
@@ -7,14 +11,18 @@ def mark_blocks(blocks: list[IRBlock]):
         block.index = ind
 
 
-def build_control_flow_graph(blocks: list[IRBlock]) -> dominator.graph_type:
-    return [[s.index for s in block.successors] for block in blocks]
+def to_csr(rows: Iterable[Iterable[int]]) -> tuple[array, array]:
+    """Returns the offsets and targets of the rows in CSR format, as the native dominator module expects them"""
+    offsets, targets = array("i", [0]), array("i")
+    for row in rows:
+        targets.extend(row)
+        offsets.append(len(targets))
+    return offsets, targets
 
-def build_reverse_control_flow_graph(blocks: list[IRBlock]) -> tuple[dominator.graph_type, int]:
-    rcfg = [[s.index for s in block.predecessors] for block in blocks]
-    end_node = len(rcfg)
-    rcfg.append([block.index for block in blocks if not block.successors])
-    return rcfg, end_node
+
+def build_control_flow_graph(blocks: list[IRBlock]) -> tuple[array, array]:
+    """Returns the offsets and targets of the control flow graph in CSR format"""
+    return to_csr((s.index for s in block.successors) for block in blocks)
 
 
 def collect_commands(blocks: list[IRBlock]) -> list:
@@ -28,20 +36,61 @@ def collect_var_use(cmds: list[IRCmdBase]) -> set[str]:
     return set(use for cmd in cmds for use in cmd.var_use)
 
 
-def rearrange_in_rpo(function: IRFunction):
-    """Rearrange blocks in reverse post order"""
-    blocks = function.blocks
-    visited = set()
-    new_blocks = []
+# The traversals below keep their own stack instead of recursing,
+# so that functions with thousands of blocks do not hit the recursion limit
+
+def post_order(entry: T, successors: Callable[[T], Iterable[T]]) -> list[T]:
+    """Nodes reachable from `entry` in the post order of a depth-first search visiting successors in order"""
+    visited = {entry}
+    order = []
+    stack = [(entry, iter(successors(entry)))]
+    while stack:
+        node, remaining = stack[-1]
+        for succ in remaining:
+            if succ not in visited:
+                visited.add(succ)
+                stack.append((succ, iter(successors(succ))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    return order
+
+
+def reverse_post_order(entry: T, successors: Callable[[T], Iterable[T]]) -> list[T]:
+    return post_order(entry, successors)[::-1]
+
+
+def walk_tree(root: T, children: Callable[[T], Iterable[T]],
+              enter: Callable[[T], None], exit: Callable[[T], None] | None = None):
+    """Calls `enter` on every node in preorder, and `exit` once all of its descendants have been exited"""
+    enter(root)
+    stack = [(root, iter(children(root)))]
+    while stack:
+        node, remaining = stack[-1]
+        child = next(remaining, None)
+        if child is None:
+            stack.pop()
+            if exit is not None:
+                exit(node)
+        else:
+            enter(child)
+            stack.append((child, iter(children(child))))
+
+
+def walk_dominator_tree(immediate_dominator: list[int],
+                        enter: Callable[[int], None], exit: Callable[[int], None] | None = None):
+    """walk_tree over the dominator tree rooted at block 0, given the immediate dominator of every block"""
+    children: list[list[int]] = [[] for _ in immediate_dominator]
+    for ind, idom in enumerate(immediate_dominator):
+        if idom >= 0 and ind != 0:
+            children[idom].append(ind)
+    walk_tree(0, children.__getitem__, enter, exit)
 
-    def dfs(index: int):
-        visited.add(index)
-        for succ in blocks[index].successors:
-            if succ.index not in visited:
-                dfs(succ.index)
-        new_blocks.append(blocks[index])
 
-    dfs(0)
+def rearrange_in_rpo(function: IRFunction):
+    """Rearrange blocks in reverse post order"""
+    new_blocks = post_order(function.blocks[0], lambda block: block.successors)
     function.blocks = new_blocks[::-1]
     return new_blocks
 
@@ -55,6 +104,13 @@ def collect_defs(function: IRFunction) -> set[str]:
     return defs
 
 
+def collect_def_sites(function: IRFunction) -> dict[str, tuple[IRBlock, int]]:
+    return {var: (block, cmd_ind)
+            for block in function.blocks
+            for cmd_ind, cmd in enumerate(block.cmds)
+            for var in cmd.var_def}
+
+
 def collect_uses(defs: set[str], blocks: list[IRBlock]) -> dict[str, list[tuple[IRBlock, int]]]:
     use_sites = {def_: [] for def_ in defs}
     for block in blocks:
@@ -72,3 +128,67 @@ def collect_type_map(function: IRFunction) -> dict[str, str]:
                 for cmd in block
                 for var in cmd.var_def}
     return type_map
+
+
+class NaturalLoop:
+    header: IRBlock
+    latches: list[IRBlock]  # sources of the back edges
+    body: set[IRBlock]  # the header included
+
+    def __init__(self, header: IRBlock, latches: list[IRBlock], body: set[IRBlock]):
+        self.header = header
+        self.latches = latches
+        self.body = body
+
+    def exiting_blocks(self) -> list[IRBlock]:
+        """Blocks that may leave the loop, returning blocks included"""
+        return [block for block in self.body
+                if not block.successors
+                or any(succ not in self.body and not isinstance(succ, UnreachableBlock) for succ in block.successors)]
+
+
+def find_natural_loops(blocks: list[IRBlock]) -> list[NaturalLoop]:
+    """Loops of the blocks reachable from the entry, back edges sharing a header form a single loop.
+    Loops are identified by the back edges of a DFS, which is exact for reducible control flow graphs."""
+    entry = blocks[0]
+    visited = {entry}
+    on_stack = {entry}
+    latches: dict[IRBlock, list[IRBlock]] = {}  # loop header -> sources of its back edges
+    stack = [(entry, iter(entry.successors))]
+    while stack:
+        block, successors = stack[-1]
+        for succ in successors:
+            if isinstance(succ, UnreachableBlock):
+                continue
+            if succ in on_stack:
+                latches.setdefault(succ, []).append(block)
+            elif succ not in visited:
+                visited.add(succ)
+                on_stack.add(succ)
+                stack.append((succ, iter(succ.successors)))
+                break
+        else:
+            stack.pop()
+            on_stack.remove(block)
+
+    loops = []
+    for header, sources in latches.items():
+        # the loop body consists of the blocks that reach a latch without passing through the header
+        body = {header}
+        worklist = list(sources)
+        while worklist:
+            block = worklist.pop()
+            if block not in body:
+                body.add(block)
+                worklist.extend(pred for pred in block.predecessors if pred in visited)
+        loops.append(NaturalLoop(header, sources, body))
+    return loops
+
+
+def compute_loop_depths(blocks: list[IRBlock]) -> dict[IRBlock, int]:
+    """Loop nesting depth of every block reachable from the entry"""
+    depths = {block: 0 for block in blocks}
+    for loop in find_natural_loops(blocks):
+        for block in loop.body:
+            depths[block] += 1
+    return depths
@@ -0,0 +1,137 @@
+from main import OPTIMIZATION_PRESETS
+from mxc.common.ir_repr import IRBlock, IRBranch, IRFunction, IRJump, BBExit, IRPhi, IRRet, IRIcmp, IRBinOp
+from mxc.frontend.semantic.syntax_recorder import FunctionInfo
+from mxc.middle_end.analysis import get_analysis, BLOCK_INDEX, DOMINATOR_TREE, POST_DOMINATOR_TREE
+from mxc.middle_end.cfg_transform import remove_critical_edge, jump_threading, simplify_cfg
+
+
+def make_function(blocks: list[IRBlock]) -> IRFunction:
+    function = IRFunction(FunctionInfo("f", "@f"))
+    function.blocks = blocks
+    return function
+
+
+def link(block: IRBlock, *successors: IRBlock, cond: str = "%c.param"):
+    block.successors = list(successors)
+    for succ in successors:
+        succ.predecessors.append(block)
+    if len(successors) == 1:
+        block.cmds.append(IRJump(BBExit(block, 0)))
+    elif len(successors) == 2:
+        block.cmds.append(IRBranch(cond, BBExit(block, 0), BBExit(block, 1)))
+
+
+def immediate_dominators(function: IRFunction, name: str) -> dict[str, str]:
+    tree = get_analysis(function, name)
+    if name == POST_DOMINATOR_TREE:
+        tree = tree[0]
+    blocks = function.blocks + [IRBlock("end")]
+    return {block.name: blocks[idom].name
+            for block, idom in zip(function.blocks, tree.get_immediate_dominators()) if 0 <= idom != block.index}
+
+
+def test_split_critical_edge_with_unreachable_blocks():
+    # entry -> join is critical, and the unreachable cycle between dead1 and dead2 is dropped by the split
+    entry, dead1, dead2, mid, join = (IRBlock(name) for name in ["entry", "dead1", "dead2", "mid", "join"])
+    link(entry, join, mid)
+    link(dead1, dead2)
+    link(dead2, dead1)
+    link(mid, join)
+    join.cmds = [IRPhi("%p", "i32", [(entry, "1"), (mid, "2")]), IRRet("i32", "%p")]
+    function = make_function([entry, dead1, dead2, mid, join])
+    for analysis in [DOMINATOR_TREE, POST_DOMINATOR_TREE]:
+        get_analysis(function, analysis)
+
+    critical_edge_pass = next(opt_pass for opt_pass in OPTIMIZATION_PRESETS["gvn_pre"]
+                              if opt_pass.func is remove_critical_edge)
+    critical_edge_pass.prepare(function)
+    critical_edge_pass.func(function)
+    critical_edge_pass.finish(function)
+
+    split = entry.successors[0]
+    assert split.successors == [join] and join.cmds[0].sources == [split, mid]
+    assert {block.name for block in function.blocks} == {"entry", split.name, "mid", "join"}
+    assert get_analysis(function, BLOCK_INDEX) == 4
+    assert [block.index for block in function.blocks] == [0, 1, 2, 3]
+    assert immediate_dominators(function, DOMINATOR_TREE) == {split.name: "entry", "mid": "entry", "join": "entry"}
+    assert immediate_dominators(function, POST_DOMINATOR_TREE) == {
+        "entry": "join", split.name: "join", "mid": "join", "join": "end"}
+
+
+def make_short_circuit():
+    """`a && b` branching on the merged value: entry -> rhs -> merge, entry -> merge, merge -> then / else"""
+    entry, rhs, merge, then, else_ = (IRBlock(name) for name in ["entry", "rhs", "merge", "then", "else"])
+    link(entry, rhs, merge, cond="%a.param")
+    rhs.cmds = [IRIcmp("%b", "slt", "i32", "%x.param", "10")]
+    link(rhs, merge)
+    merge.cmds = [IRPhi("%p", "i1", [(entry, "false"), (rhs, "%b")])]
+    link(merge, then, else_, cond="%p")
+    then.cmds = [IRRet("i1", "true")]
+    return entry, rhs, merge, then, else_
+
+
+def test_thread_constant_boolean_phi():
+    entry, rhs, merge, then, else_ = make_short_circuit()
+    # the merged value also reaches a phi in the successor it decides
+    else_.cmds = [IRPhi("%r", "i1", [(merge, "%p")]), IRRet("i1", "%r")]
+    function = make_function([entry, rhs, merge, then, else_])
+    jump_threading(function)
+
+    # entry goes to else directly, and the phi left with a single entry is propagated
+    assert entry.successors == [rhs, else_] and merge.predecessors == [rhs]
+    assert else_.predecessors == [merge, entry]
+    assert else_.cmds[0].sources == [merge, entry] and else_.cmds[0].var_use == ["%b", "false"]
+    assert merge.cmds == [merge.cmds[-1]] and merge.cmds[-1].cond == "%b"
+    assert [block.index for block in function.blocks] == [0, 1, 2, 3, 4]
+
+
+def test_phi_used_elsewhere_is_not_threaded():
+    entry, rhs, merge, then, else_ = make_short_circuit()
+    else_.cmds = [IRBinOp("%q", "xor", "%p", "true", "i1"), IRRet("i1", "%q")]
+    function = make_function([entry, rhs, merge, then, else_])
+    jump_threading(function)
+    assert entry.successors == [rhs, merge] and merge.predecessors == [entry, rhs]
+    assert merge.cmds[0].var_use == ["false", "%b"]
+
+
+def test_bypass_chains_of_empty_blocks():
+    entry, empty1, empty2, other, join = (IRBlock(name) for name in ["entry", "empty1", "empty2", "other", "join"])
+    link(entry, empty1, other)
+    link(empty1, empty2)
+    link(empty2, join)
+    link(other, join)
+    join.cmds = [IRPhi("%p", "i32", [(empty2, "%x.param"), (other, "0")]), IRRet("i32", "%p")]
+    function = make_function([entry, empty1, empty2, other, join])
+    simplify_cfg(function)
+
+    # other is empty as well, but bypassing it would make entry reach join on both edges
+    assert function.blocks == [entry, other, join]
+    assert entry.successors == [join, other] and join.predecessors == [other, entry]
+    assert join.cmds[0].sources == [other, entry] and join.cmds[0].var_use == ["0", "%x.param"]
+    assert [block.index for block in function.blocks] == [0, 1, 2]
+
+
+def test_branch_to_the_same_block_twice():
+    entry, body, empty, exit_ = (IRBlock(name) for name in ["entry", "body", "empty", "exit"])
+    link(entry, body, body)
+    body.cmds = [IRPhi("%p", "i32", [(entry, "%x.param"), (entry, "%x.param")]),
+                 IRBinOp("%s", "add", "%p", "1", "i32")]
+    link(body, empty)
+    link(empty, exit_)
+    exit_.cmds = [IRRet("i32", "%s")]
+    function = make_function([entry, body, empty, exit_])
+    simplify_cfg(function)
+
+    # the branch becomes a jump, and the rest of the chain is merged into the entry block
+    assert function.blocks == [entry] and not entry.successors
+    assert [type(cmd) for cmd in entry.cmds] == [IRBinOp, IRRet]
+    assert entry.cmds[0].var_use == ["%x.param", "1"] and entry.cmds[1].var_use == ["ret_addr", "%s"]
+
+
+if __name__ == "__main__":
+    test_split_critical_edge_with_unreachable_blocks()
+    test_thread_constant_boolean_phi()
+    test_phi_used_elsewhere_is_not_threaded()
+    test_bypass_chains_of_empty_blocks()
+    test_branch_to_the_same_block_twice()
+    print("All CFG transformation tests passed")
@@ -0,0 +1,40 @@
+from mxc.common.ir_repr import IRBinOp, IRBlock, IRFunction, IRPhi, IRRet
+from mxc.frontend.semantic.syntax_recorder import FunctionInfo
+from mxc.middle_end.cfg_transform import copy_propagation
+
+
+def make_function(blocks: list[IRBlock]) -> IRFunction:
+    function = IRFunction(FunctionInfo("f", "@f"))
+    function.blocks = blocks
+    return function
+
+
+def test_copy_chains_and_trivial_phis():
+    # the copy in the body comes before the phi it copies, and the phi only merges the copy of itself with %b
+    entry, body, header, exit_ = IRBlock("entry"), IRBlock("body"), IRBlock("header"), IRBlock("exit")
+    entry.cmds = [IRBinOp("%a", "add", "%x.param", "0", "i32"), IRBinOp("%b", "add", "%a", "0", "i32")]
+    body.cmds = [IRBinOp("%q", "add", "%p", "0", "i32")]
+    header.cmds = [IRPhi("%p", "i32", [(entry, "%b"), (body, "%q")])]
+    exit_.cmds = [IRPhi("%r", "i32", [(header, "%p")]),
+                  IRBinOp("%s", "add", "%r", "%a", "i32"),
+                  IRRet("i32", "%s")]
+    copy_propagation(make_function([entry, body, header, exit_]))
+    assert not entry.cmds and not body.cmds and not header.cmds
+    assert [cmd.var_use for cmd in exit_.cmds] == [["%x.param", "%x.param"], ["ret_addr", "%s"]]
+
+
+def test_phis_of_different_values_are_kept():
+    entry, header, body = IRBlock("entry"), IRBlock("header"), IRBlock("body")
+    entry.cmds = [IRBinOp("%a", "add", "%x.param", "0", "i32")]
+    phi = IRPhi("%p", "i32", [(entry, "%a"), (body, "%t")])
+    header.cmds = [phi]
+    body.cmds = [IRBinOp("%t", "add", "%p", "1", "i32"), IRBinOp("%u", "add", "%t", "0", "i32"), IRRet("i32", "%u")]
+    copy_propagation(make_function([entry, header, body]))
+    assert header.cmds == [phi] and phi.var_use == ["%x.param", "%t"]
+    assert [cmd.var_use for cmd in body.cmds] == [["%p", "1"], ["ret_addr", "%t"]]
+
+
+if __name__ == "__main__":
+    test_copy_chains_and_trivial_phis()
+    test_phis_of_different_values_are_kept()
+    print("All copy propagation tests passed")
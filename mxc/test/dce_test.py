@@ -0,0 +1,100 @@
+from main import OPTIMIZATION_PRESETS
+from mxc.common.ir_repr import IRFunction, IRBinOp, IRBranch, IRCall, IRPhi, IRCmdBase
+from mxc.middle_end.dce import aggressive_dce
+from mxc.middle_end.mem2reg import mem2reg
+from mxc.middle_end.pass_manager import PassManager
+from mxc.test.utils import build_ir
+
+
+def optimize(source: str) -> IRFunction:
+    """Runs mem2reg and the aggressive dead code elimination after it on the program and returns its function f"""
+    passes = [opt_pass for opt_pass in OPTIMIZATION_PRESETS["sccp"] if opt_pass.func in (mem2reg, aggressive_dce)]
+    ir = build_ir(source)
+    PassManager(passes[:2]).run(ir)
+    return next(function for function in ir.functions if function.info.ir_name == "@f")
+
+
+def count(function: IRFunction, kind: type[IRCmdBase]) -> int:
+    return sum(isinstance(cmd, kind) for block in function.blocks for cmd in block.cmds)
+
+
+def test_dead_diamond():
+    # neither the values computed on the two paths nor the branch choosing between them are used
+    function = optimize("""
+int f(int x, bool c) {
+    int y;
+    if (c) y = x + 1; else y = x * 2;
+    return x;
+}
+int main() { return f(getInt(), getInt() > 0); }
+""")
+    assert count(function, IRBranch) == 0 and count(function, IRPhi) == 0 and count(function, IRBinOp) == 0
+    # the branch jumps to its post dominator, and the blocks of the two paths are removed
+    entry, join = function.blocks
+    assert entry.successors == [join] and join.predecessors == [entry] and (entry.index, join.index) == (0, 1)
+
+
+def test_dead_phi_cycle():
+    # s only feeds itself around the loop, while i decides whether the loop goes on (the guard and the latch)
+    function = optimize("""
+int f(int n) {
+    int s = 0;
+    int i;
+    for (i = 0; i < n; i++) s = s + i * 3;
+    return n;
+}
+int main() { return f(getInt()); }
+""")
+    assert count(function, IRPhi) == 1 and count(function, IRBranch) == 2
+    assert [cmd.op for block in function.blocks for cmd in block.cmds if isinstance(cmd, IRBinOp)] == ["add"]
+
+
+def test_infinite_loops_are_kept():
+    # nothing computed in the loops is used after them, but removing them would make f return
+    function = optimize("""
+int f(int x) {
+    while (x != 1) {
+        if (x % 2 == 0) x = x / 2; else x = 3 * x + 1;
+    }
+    return 0;
+}
+int main() { return f(getInt()); }
+""")
+    assert count(function, IRBranch) == 3 and count(function, IRPhi) == 2
+    assert sorted(cmd.op for block in function.blocks for cmd in block.cmds if isinstance(cmd, IRBinOp)) == \
+           ["add", "mul", "sdiv", "srem"]
+
+    function = optimize("""
+int f(int x) {
+    int y = 0;
+    while (true) y = y + x;
+    return y;
+}
+int main() { return f(getInt()); }
+""")
+    assert count(function, IRPhi) == 0 and count(function, IRBinOp) == 0
+    assert any(block in block.successors for block in function.blocks)
+
+
+def test_unused_call_result():
+    # the call has side effects and stays, but its result is only used by dead code
+    function = optimize("""
+int g(int x) { println(toString(x)); return x + 1; }
+int f(int x) {
+    int y = g(x);
+    int z = y * 2;
+    return x;
+}
+int main() { return f(getInt()); }
+""")
+    calls = [cmd for block in function.blocks for cmd in block.cmds if isinstance(cmd, IRCall)]
+    assert len(calls) == 1 and calls[0].func.ir_name == "@g" and not calls[0].var_def
+    assert count(function, IRBinOp) == 0
+
+
+if __name__ == "__main__":
+    test_dead_diamond()
+    test_dead_phi_cycle()
+    test_infinite_loops_are_kept()
+    test_unused_call_result()
+    print("All aggressive dead code elimination tests passed")
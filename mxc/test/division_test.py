@@ -0,0 +1,82 @@
+import random
+
+from mxc.common.ir_repr import IRBinOp
+from mxc.middle_end.mir import division_by_invariant_integer, remainder_by_invariant_integer, is_imm, parse_imm
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+def to_int32(value: int) -> int:
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def evaluate(cmds: list[IRBinOp], n: int) -> int:
+    """Interprets the generated commands with the dividend %n"""
+    values = {"%n": n}
+
+    def get(var: str) -> int:
+        return parse_imm(var) if is_imm(var) else values[var]
+
+    for cmd in cmds:
+        lhs, rhs = get(cmd.lhs), get(cmd.rhs)
+        if cmd.op == "add":
+            result = lhs + rhs
+        elif cmd.op == "sub":
+            result = lhs - rhs
+        elif cmd.op == "mul":
+            result = lhs * rhs
+        elif cmd.op == "smulh":
+            result = (lhs * rhs) >> 32
+        elif cmd.op == "and":
+            result = lhs & rhs
+        elif cmd.op == "shl":
+            result = lhs << (rhs & 31)
+        elif cmd.op == "ashr":
+            result = lhs >> (rhs & 31)
+        else:
+            assert False, f"Unexpected operator {cmd.op}"
+        values[cmd.dest] = to_int32(result)
+    return values[cmds[-1].dest]
+
+
+def expected_div(n: int, d: int) -> int:
+    quotient = abs(n) // abs(d)
+    return to_int32(quotient if (n < 0) == (d < 0) else -quotient)
+
+
+def expected_rem(n: int, d: int) -> int:
+    return to_int32(n - expected_div(n, d) * d)
+
+
+def divisors(rng: random.Random) -> list[int]:
+    result = [1, -1, 2, -2, 3, 7, 10, -10, 16, -16, 641, 1000, 2048, 4096, 1 << 30, -(1 << 30),
+              10007, 998244353, 1000000007, INT_MAX, -INT_MAX, INT_MIN + 1]
+    result += [rng.randint(2, 5000) for _ in range(100)]
+    result += [rng.randint(2, INT_MAX) * rng.choice([1, -1]) for _ in range(100)]
+    return result
+
+
+def dividends(rng: random.Random, d: int) -> list[int]:
+    result = [0, 1, -1, INT_MIN, INT_MIN + 1, INT_MAX, INT_MAX - 1, d, -d, d - 1, d + 1, -d + 1, -d - 1]
+    result += [rng.randint(INT_MIN, INT_MAX) for _ in range(300)]
+    result += [rng.randint(-3 * abs(d), 3 * abs(d)) for _ in range(100)]
+    return [to_int32(n) for n in result]
+
+
+def main():
+    rng = random.Random(20240101)
+    checked = 0
+    for d in divisors(rng):
+        for n in dividends(rng, d):
+            for non_negative in ([False, True] if n >= 0 else [False]):
+                cmds = division_by_invariant_integer("%n", d, non_negative)
+                assert evaluate(cmds, n) == expected_div(n, d), f"{n} / {d} (non-negative: {non_negative})"
+                cmds = remainder_by_invariant_integer("%n", d, non_negative)
+                assert evaluate(cmds, n) == expected_rem(n, d), f"{n} % {d} (non-negative: {non_negative})"
+                checked += 1
+    print(f"Checked {checked} divisions and remainders by constants")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from mxc.common import dominator
+from mxc.middle_end.utils import to_csr
 
 input = [
     [1],
@@ -16,4 +17,14 @@ input = [
 result = dominator.get_reverse_dominance_frontier(input)
 
 for i, frontier in enumerate(result):
-    print(f"Node {i}: {frontier}")
\ No newline at end of file
+    print(f"Node {i}: {frontier}")
+
+analysis = dominator.CFGAnalysis(*to_csr(input))
+frontiers = dominator.rows(analysis.dominance_frontiers())
+for i, frontier in enumerate(result):
+    assert all(i in frontiers[j] for j in frontier)
+assert sum(len(frontier) for frontier in frontiers) == sum(len(frontier) for frontier in result)
+expected_pred = dominator.get_indirect_predecessor_set_of_dominator_frontier(input)
+for actual, expected in zip(dominator.rows(analysis.dominance_frontier_predecessors()), expected_pred):
+    assert sorted(actual) == sorted(expected)
+print(f"Loop depths: {list(memoryview(analysis.loop_depths()))}")
@@ -2,13 +2,16 @@ import sys
 from pathlib import Path
 
 from main import OPTIMIZATION_PRESETS, OptimizationPass
-from mxc.common.ir_repr import IRBlock, IRFunction, IRCall, IRJump, BBExit, IRPhi, IRBinOp, IRBranch, IRRet, IRModule
+from mxc.common.ir_repr import IRBlock, IRFunction, IRCall, IRJump, BBExit, IRPhi, IRBinOp, IRBranch, IRRet, IRModule, \
+    IRLoad, IRStore, IRGetElementPtr, IRIcmp, IRCmdBase
 from mxc.common.renamer import renamer
 from mxc.frontend.semantic.syntax_recorder import FunctionInfo
 from mxc.frontend.semantic.type import builtin_types, builtin_functions
 from mxc.middle_end.cfg_transform import copy_propagation
 from mxc.middle_end.dce import naive_dce
 from mxc.middle_end.gvn_pre import gvn_pre
+from mxc.middle_end.pass_manager import PassManager
+from mxc.test.utils import build_ir
 
 
 def build_ir_module():
@@ -113,6 +116,82 @@ def build_ir_module():
     ir_module.functions = [main_function, IRFunction(info=func_foo), IRFunction(info=func_getcond)]
     return ir_module
 
+def optimize(source: str) -> IRFunction:
+    """Runs the gvn_pre preset on the program and returns its function f"""
+    ir = build_ir(source)
+    PassManager(OPTIMIZATION_PRESETS["gvn_pre"]).run(ir)
+    return next(function for function in ir.functions if function.info.ir_name == "@f")
+
+
+def return_block(function: IRFunction) -> IRBlock:
+    return next(block for block in function.blocks if isinstance(block.cmds[-1], IRRet))
+
+
+def count(function: IRFunction, kind: type[IRCmdBase]) -> int:
+    return sum(isinstance(cmd, kind) for block in function.blocks for cmd in block.cmds)
+
+
+def test_load_redundant_across_join():
+    # a[0] is loaded on one path only, a load is inserted on the other one and merged by a phi
+    function = optimize("""
+int f(int[] a, bool c) {
+    int x;
+    if (c) x = a[0] + 1; else x = 2;
+    return x + a[0];
+}
+int main() { return f(new int[1], getInt() > 0); }
+""")
+    assert not any(isinstance(cmd, IRLoad) for cmd in return_block(function).cmds)
+    assert count(function, IRLoad) == 2
+
+
+def test_load_killed_on_one_path():
+    # the store or the call writes a[0] on one path, so the load after the join is not replaced by the first one
+    for kill, source in [(IRStore, "if (c) a[0] = x + 5;"), (IRCall, "if (c) g(a);")]:
+        function = optimize(f"""
+void g(int[] a) {{ a[0] = 7; }}
+int f(int[] a, bool c) {{
+    int x = a[0];
+    {source}
+    return x * a[0];
+}}
+int main() {{ return f(new int[1], getInt() > 0); }}
+""")
+        block, position = next((block, ind) for block in function.blocks
+                               for ind, cmd in enumerate(block.cmds) if isinstance(cmd, kill))
+        later = block.cmds[position + 1:] + return_block(function).cmds
+        assert any(isinstance(cmd, IRLoad) for cmd in later), kill.__name__
+
+
+def test_pointer_and_boolean_phis():
+    # the address of a[i] and x < 5 are computed on one path only, the inserted phis have their types
+    function = optimize("""
+int f(int[] a, int i, bool c) {
+    if (c) a[i] = 1; else a[0] = 2;
+    a[i] = 3;
+    return 0;
+}
+int main() { return f(new int[2], 1, getInt() > 0); }
+""")
+    join = return_block(function)
+    assert not any(isinstance(cmd, IRGetElementPtr) for cmd in join.cmds)
+    assert [cmd.typ for cmd in join.cmds if isinstance(cmd, IRPhi)] == ["ptr"]
+
+    function = optimize("""
+int f(int x, bool c) {
+    int s = 0;
+    if (c) { if (x < 5) s = 1; } else s = 2;
+    if (x < 5) s = s + 3;
+    return s;
+}
+int main() { return f(getInt(), getInt() > 0); }
+""")
+    join = next(block for block in function.blocks
+                if any(isinstance(cmd, IRPhi) and cmd.typ == "i1" for cmd in block.cmds))
+    assert not any(isinstance(cmd, IRIcmp) for cmd in join.cmds)
+    assert count(function, IRIcmp) == 2
+
+
 OPTIMIZATION_PRESETS["gvn_pre_test"] = [
     OptimizationPass(gvn_pre, "Global Value Numbering - Partial Redundancy Elimination"),
     OptimizationPass(copy_propagation, "Copy Propagation"),
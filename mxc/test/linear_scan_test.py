@@ -0,0 +1,51 @@
+import sys
+
+from main import OPTIMIZATION_PRESETS
+from mxc.backend.linear_scan import build_intervals, linear_scan_allocation
+from mxc.backend.regalloc import K, AllocationRegister, AllocationStack
+from mxc.common.ir_repr import IRCall
+from mxc.middle_end.pass_manager import PassManager
+from mxc.test.utils import build_ir
+
+N = 40  # more variables live at once than there are registers
+
+
+def prepare(source: str):
+    """Runs the fast preset up to the register allocation"""
+    ir = build_ir(source)
+    PassManager(OPTIMIZATION_PRESETS["fast"][:-1]).run(ir)
+    return ir
+
+
+def test_overlapping_intervals_get_different_registers():
+    lines = ["int f(int n) {", "    int s = 0;", "    int i;"]
+    lines += [f"    int v{i} = n * {i + 1};" for i in range(N)]
+    lines += ["    for (i = 0; i < n; i++) {"] + [f"        s = s + v{i};" for i in range(N)] + ["    }"]
+    lines += ["    printlnInt(s);", "    return s + v0;", "}"]
+    lines += ["int main() {", "    return f(getInt());", "}"]
+    ir = prepare("\n".join(lines) + "\n")
+    function = next(function for function in ir.functions if function.info.ir_name == "@f")
+    intervals, calls = build_intervals(function)
+    allocation_table = linear_scan_allocation(function)
+
+    assert set(allocation_table) == set(intervals)
+    in_registers = [var for var in intervals if isinstance(allocation_table[var], AllocationRegister)]
+    assert len({allocation_table[var].logical_id for var in in_registers}) == K
+    assert any(isinstance(allocation_table[var], AllocationStack) for var in intervals)
+    for ind, var in enumerate(in_registers):
+        start, end = intervals[var]
+        for other in in_registers[ind + 1:]:
+            if allocation_table[var].logical_id == allocation_table[other].logical_id:
+                other_start, other_end = intervals[other]
+                assert end < other_start or other_end < start, f"{var} and {other} share a register"
+
+    # v0, s and the return address are used after the call, so their registers are saved around it
+    (position, call), = calls
+    assert isinstance(call, IRCall) and len(call.live_out) == 3 and "ret_addr" in call.live_out
+    assert all(intervals[var][0] < position < intervals[var][1] for var in call.live_out)
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    test_overlapping_intervals_get_different_registers()
+    print("All linear scan tests passed")
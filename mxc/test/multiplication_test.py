@@ -0,0 +1,29 @@
+import random
+
+from mxc.middle_end.mir import multiplication_by_invariant_integer
+from mxc.test.division_test import INT_MIN, INT_MAX, to_int32, evaluate
+
+
+def main():
+    rng = random.Random(20240102)
+    multipliers = list(range(-300, 301)) + [INT_MIN, INT_MIN + 1, INT_MAX, 1 << 30, (1 << 30) + 1, 0x7fff0001]
+    multipliers += [rng.randint(INT_MIN, INT_MAX) for _ in range(300)]
+    decomposed = 0
+    for c in multipliers:
+        for budget in [1, 2, 3, 5, 8, 32]:
+            cmds = multiplication_by_invariant_integer("%n", c, budget)
+            assert len(cmds) <= budget, f"{len(cmds)} commands for * {c} over the budget of {budget}"
+            if not cmds:
+                continue
+            decomposed += 1
+            for n in [0, 1, -1, INT_MIN, INT_MAX] + [rng.randint(INT_MIN, INT_MAX) for _ in range(50)]:
+                assert evaluate(cmds, n) == to_int32(n * c), f"{n} * {c} (budget: {budget})"
+    # the non-adjacent form of a 32-bit multiplier has at most 17 non-zero digits
+    assert all(multiplication_by_invariant_integer("%n", c, 64) for c in multipliers if c != 0)
+    assert len(multiplication_by_invariant_integer("%n", 10)) == 3  # ((x << 2) + x) << 1
+    assert len(multiplication_by_invariant_integer("%n", 7)) == 2  # (x << 3) - x
+    print(f"Checked {decomposed} decompositions of multiplications by constants")
+
+
+if __name__ == "__main__":
+    main()
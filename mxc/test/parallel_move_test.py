@@ -0,0 +1,68 @@
+import random
+
+from mxc.backend.asm_repr import ASMCmd, ASMCmdBase, ASMMemOp
+from mxc.backend.operand import OperandBase, OperandImm, OperandReg, OperandStack, rearrange_operands
+
+REGISTERS = ["a0", "a1", "a2", "s0", "s1", "s2"]
+OFFSETS = [0, 4, 8, 12, 16, 20]
+
+
+def describe(operands: list[OperandBase]) -> str:
+    return ", ".join(f"{operand.offset}(sp)" if isinstance(operand, OperandStack) else str(operand)
+                     for operand in operands)
+
+
+def execute(cmds: list[ASMCmdBase], state: dict[str | int, int]):
+    """Interprets the moves, with registers keyed by name and stack slots by offset"""
+    for cmd in cmds:
+        if isinstance(cmd, ASMMemOp):
+            assert cmd.relative == "sp"
+            if cmd.op == "lw":
+                state[cmd.reg] = state[cmd.addr]
+            else:
+                assert cmd.op == "sw"
+                state[cmd.addr] = 0 if cmd.reg == "zero" else state[cmd.reg]
+        else:
+            assert isinstance(cmd, ASMCmd)
+            if cmd.op == "mv":
+                state[cmd.dest] = state[cmd.operands[0]]
+            elif cmd.op == "li":
+                state[cmd.dest] = int(cmd.operands[0])
+            elif cmd.op == "xor":
+                state[cmd.dest] = state[cmd.operands[0]] ^ state[cmd.operands[1]]
+            else:
+                assert False, f"Unexpected command {cmd.op}"
+
+
+def test_random_parallel_moves():
+    rng = random.Random(2024)
+    locations: list[OperandReg | OperandStack] = ([OperandReg(reg) for reg in REGISTERS]
+                                                  + [OperandStack(offset) for offset in OFFSETS])
+    for _ in range(2000):
+        var_to = rng.sample(locations, rng.randint(1, len(locations)))
+        var_from: list[OperandBase] = [rng.choice(locations) if rng.random() < 0.9 else OperandImm(rng.randint(0, 3))
+                                       for _ in var_to]
+        state: dict[str | int, int] = {}
+        for ind, operand in enumerate(locations):
+            state[operand.reg if isinstance(operand, OperandReg) else operand.offset] = 100 + ind
+        before = dict(state)
+        execute(rearrange_operands(var_from, var_to, "t0", "t1"), state)
+
+        def value(operand: OperandBase) -> int:
+            if isinstance(operand, OperandImm):
+                return operand.imm
+            return before[operand.reg if isinstance(operand, OperandReg) else operand.offset]
+
+        written = set()
+        for f, t in zip(var_from, var_to):
+            key = t.reg if isinstance(t, OperandReg) else t.offset
+            written.add(key)
+            assert state[key] == value(f), f"{describe(var_from)} -> {describe(var_to)}"
+        for key, old in before.items():
+            if key not in written:
+                assert state[key] == old
+
+
+if __name__ == "__main__":
+    test_random_parallel_moves()
+    print("All parallel move tests passed")
@@ -0,0 +1,83 @@
+"""Times single optimization passes on generated functions of growing size, to check that they scale linearly.
+
+Usage: python -m mxc.test.pass_benchmark [sccp|gvn_pre|mem2reg|critical_edge] [instructions ...]
+The exit status is 1 if the time per instruction grows too much between the smallest and the largest size.
+"""
+import gc
+import sys
+import time
+
+from main import OPTIMIZATION_PRESETS
+from mxc.common.ir_repr import IRModule, IRPhi
+from mxc.middle_end.cfg_transform import remove_critical_edge
+from mxc.middle_end.gvn_pre import gvn_pre
+from mxc.middle_end.mem2reg import mem2reg
+from mxc.middle_end.pass_manager import OptimizationPass, PassManager
+from mxc.middle_end.sccp import sparse_conditional_constant_propagation
+from mxc.test.utils import build_ir
+
+SIZES = [12500, 25000, 50000, 100000]  # number of IR instructions in the generated function
+INSTRUCTIONS_PER_UNIT = 32  # approximately, after the passes preceding the benchmarked one
+MAX_SLOWDOWN = 4  # allowed growth of the time per instruction, a quadratic pass grows as much as the sizes
+BENCHMARKS = {  # name -> (preset, pass function)
+    "sccp": ("O1", sparse_conditional_constant_propagation),
+    "gvn_pre": ("gvn_pre", gvn_pre),
+    "mem2reg": ("O1", mem2reg),
+    "critical_edge": ("gvn_pre", remove_critical_edge),
+}
+
+
+def generate_source(units: int) -> str:
+    """A function mixing foldable constants, branches decided by constants or value ranges, and loops"""
+    lines = ["int work(int n) {", "    int s = 0;", "    int c;", "    int d;", "    int j;"]
+    for i in range(units):
+        lines += [
+            f"    c = {i % 13 + 1};",
+            f"    d = c * 4 + {i};",
+            f"    if (n > {i}) s = s + d; else s = s - n;",
+            f"    for (j = 0; j < n; j++) {{ s = s + (j & 7); if (j < 0) s = 0; }}",
+            f"    if (c > 13) s = s ^ d; else s = s + c;",
+        ]
+    lines += ["    return s;", "}", "int main() {", "    printlnInt(work(getInt()));", "    return 0;", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def count_instructions(ir: IRModule, kind: type = object) -> int:
+    return sum(isinstance(cmd, kind)
+               for function in ir.functions if not function.is_declare()
+               for block in function.blocks for cmd in block.cmds)
+
+
+def benchmark(target: OptimizationPass, preset: str, sizes: list[int]) -> bool:
+    """Runs the passes of the preset that come before `target`, then times `target` alone with the collector off,
+    and counts the phis in the result. Returns whether the pass scaled linearly"""
+    passes = OPTIMIZATION_PRESETS[preset]
+    prefix = passes[:next(ind for ind, opt_pass in enumerate(passes) if opt_pass.func is target.func)]
+    print(f"{'Instructions':>12}{'Time (s)':>10}{'us/instr':>10}{'Phis':>8}")
+    rates = []
+    for size in sizes:
+        ir = build_ir(generate_source(max(1, size // INSTRUCTIONS_PER_UNIT)))
+        PassManager(prefix).run(ir)
+        instructions = count_instructions(ir)
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        PassManager([target]).run(ir)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        rates.append(elapsed / instructions * 1e6)
+        print(f"{instructions:>12}{elapsed:>10.3f}{rates[-1]:>10.2f}{count_instructions(ir, IRPhi):>8}")
+    if max(rates) > MAX_SLOWDOWN * rates[0]:
+        print(f"The time per instruction grew from {rates[0]:.2f} us to {max(rates):.2f} us")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    args = sys.argv[1:]
+    name = args.pop(0) if args and args[0] in BENCHMARKS else "sccp"
+    preset, func = BENCHMARKS[name]
+    target = next(opt_pass for opt_pass in OPTIMIZATION_PRESETS[preset] if opt_pass.func is func)
+    if not benchmark(target, preset, [int(arg) for arg in args] or SIZES):
+        sys.exit(1)
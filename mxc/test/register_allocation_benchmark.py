@@ -0,0 +1,53 @@
+"""Compares the register allocation of O0, the liveness analysis followed by `allocate_registers`, with the linear
+scan of the fast preset on the codegen tests. Reports the time spent allocating and the number of assembly lines.
+
+Usage: python -m mxc.test.register_allocation_benchmark [test name ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+from main import OPTIMIZATION_PRESETS
+from mxc.backend.asm_builder import ASMBuilder
+from mxc.backend.regalloc import allocate_registers
+from mxc.common.ir_repr import IRModule
+from mxc.middle_end.pass_manager import PassManager
+from mxc.test.utils import build_ir
+
+TESTCASES = Path("testcases/codegen")
+PRESETS = ["O0", "fast"]  # both end with the pass preparing the register allocation
+
+
+def allocate(ir: IRModule, preset: str) -> float:
+    """Runs the preset, and returns the time spent in its last pass and in the allocation of the registers"""
+    passes = OPTIMIZATION_PRESETS[preset]
+    PassManager(passes[:-1]).run(ir)
+    start = time.perf_counter()
+    PassManager(passes[-1:]).run(ir)
+    for function in ir.functions:
+        if not function.is_declare() and function.allocation_table is None:
+            allocate_registers(function)
+    return time.perf_counter() - start
+
+
+def benchmark(paths: list[Path]):
+    print(f"{'Test':<12}" + "".join(f"{preset + ' (ms)':>12}{preset + ' lines':>12}" for preset in PRESETS))
+    total_time, total_lines = dict.fromkeys(PRESETS, 0.0), dict.fromkeys(PRESETS, 0)
+    for path in paths:
+        row = f"{path.stem:<12}"
+        for preset in PRESETS:
+            ir = build_ir(path.read_text(encoding="utf-8"))
+            elapsed = allocate(ir, preset)
+            lines = ASMBuilder(ir).build().riscv().count("\n")
+            total_time[preset] += elapsed
+            total_lines[preset] += lines
+            row += f"{elapsed * 1e3:>12.1f}{lines:>12}"
+        print(row)
+    print(f"{'Total':<12}" + "".join(f"{total_time[preset] * 1e3:>12.1f}{total_lines[preset]:>12}"
+                                     for preset in PRESETS))
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    names = sys.argv[1:]
+    benchmark([TESTCASES / f"{name}.mx" for name in names] or sorted(TESTCASES.glob("*.mx")))
@@ -0,0 +1,84 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from main import CompilerOptions, compile
+from mxc.middle_end.utils import post_order, reverse_post_order, walk_tree, walk_dominator_tree
+
+N = 10000  # number of nodes in the stress tests, well above the recursion limit
+
+
+def recursive_post_order(graph: list[list[int]]) -> list[int]:
+    visited = set()
+    order = []
+
+    def dfs(node: int):
+        visited.add(node)
+        for succ in graph[node]:
+            if succ not in visited:
+                dfs(succ)
+        order.append(node)
+
+    dfs(0)
+    return order
+
+
+def test_small_graph():
+    # a loop around a diamond, with an edge skipping the diamond
+    graph = [[1], [2, 3, 5], [4], [4], [1, 5], []]
+    assert post_order(0, graph.__getitem__) == recursive_post_order(graph)
+    assert reverse_post_order(0, graph.__getitem__) == recursive_post_order(graph)[::-1]
+
+    # dominator tree of the graph above
+    immediate_dominator = [-1, 0, 1, 1, 1, 1]
+    events = []
+    walk_dominator_tree(immediate_dominator, lambda node: events.append(("enter", node)),
+                        lambda node: events.append(("exit", node)))
+    assert events == [("enter", 0), ("enter", 1),
+                      ("enter", 2), ("exit", 2), ("enter", 3), ("exit", 3),
+                      ("enter", 4), ("exit", 4), ("enter", 5), ("exit", 5),
+                      ("exit", 1), ("exit", 0)]
+
+
+def test_long_chain():
+    # a chain of diamonds: the depth of the search is about the number of nodes
+    graph = [[] for _ in range(N)]
+    for node in range(0, N - 3, 3):
+        graph[node] = [node + 1, node + 2]
+        graph[node + 1] = [node + 3]
+        graph[node + 2] = [node + 3]
+    order = reverse_post_order(0, graph.__getitem__)
+    assert len(order) == N and order[0] == 0
+    position = {node: ind for ind, node in enumerate(order)}
+    assert all(position[node] < position[succ] for node in order for succ in graph[node])
+
+    depth = []
+    walk_tree(0, lambda node: [node + 1] if node + 1 < N else [], lambda node: depth.append(node))
+    assert depth == list(range(N))
+
+
+def test_compile_long_function():
+    # every if-else statement adds three blocks to main
+    statements = [f"    if (n % {i % 7 + 2} == {i % 3}) s = s + {i}; else s = s ^ n;" for i in range(N // 3 + 1)]
+    source = "int main() {\n    int n = getInt();\n    int s = 0;\n" + "\n".join(statements) + \
+             "\n    printlnInt(s);\n    return 0;\n}\n"
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = Path(directory) / "long.mx"
+        input_file.write_text(source)
+        for level in ["O0", "O1"]:
+            start = time.perf_counter()
+            options = CompilerOptions(
+                input_file=str(input_file), output_file=str(Path(directory) / "long.s"), dump_ir=False,
+                dump_mir=False, dump_asm=False, optimization_level=level, syntax_only=False, emit_llvm=False,
+                judge_mode=False, time_passes=False, memoize=False)
+            assert compile(options) == 0, f"Compilation of a {N}-block function failed at {level}"
+            print(f"Compiled a {N}-block function at {level} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(1000)
+    test_small_graph()
+    test_long_chain()
+    test_compile_long_function()
+    print("All traversal tests passed")
@@ -0,0 +1,15 @@
+"""Helpers shared by the tests and benchmarks that compile Mx* source held in a string."""
+import antlr4
+
+from mxc.common.ir_repr import IRModule
+from mxc.frontend.ir_generation.ir_builder import IRBuilder
+from mxc.frontend.parser.MxLexer import MxLexer
+from mxc.frontend.parser.MxParser import MxParser
+from mxc.frontend.semantic.syntax_checker import SyntaxChecker
+
+
+def build_ir(source: str) -> IRModule:
+    """Parses and checks the program, and returns its IR before any optimization"""
+    parser = MxParser(antlr4.CommonTokenStream(MxLexer(antlr4.InputStream(source))))
+    tree = parser.file_Input()
+    return IRBuilder(SyntaxChecker().visit(tree)).visit(tree)